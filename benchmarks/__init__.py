@@ -0,0 +1,3 @@
+from .generators import LANGUAGE_EXTENSIONS, generate_lines, generate_text
+from .suite import BENCHMARKS, SIZES, run_benchmarks
+from .report import compare_with_baseline, get_environment
@@ -0,0 +1,65 @@
+"""Runs the benchmarks of the editing, lexing and rendering hot paths in the headless editor:
+
+    python -m benchmarks [--filter parse_code] [--sizes 1000,10000] [--repeat 5]
+                         [--output benchmarks/results.json] [--baseline benchmarks/baseline.json]
+                         [--update-baseline] [--threshold 0.1]
+
+The results are written as JSON and compared with the baseline when there is one, the exit code is 1
+when any of the benchmarks has got slower than the threshold allows. The benchmarks whose runs are spread
+more than that are allowed a few times their spread instead, so the noise of the machine isn't a regression.
+
+The baseline is committed along with the code, its "environment" tells the machine and the commit it was measured
+on. The times are only comparable on the same machine, so after a change that is meant to change them (or when
+the benchmarks are run on another machine) the baseline is measured again there with --update-baseline, with the
+default sizes, and the new file is committed along with the change"""
+import argparse
+import os
+import sys
+
+from .report import DEFAULT_THRESHOLD, compare_with_baseline, format_comparison, get_environment, load_report, save_report
+from .suite import DEFAULT_REPEAT, run_benchmarks
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def log(text):
+    # The standard output is shared with the editor, which prints e.g. the arguments of the terminals
+    print(text, file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks of the editor hot paths")
+    parser.add_argument("--filter", help="only run the benchmarks whose names contain this")
+    parser.add_argument("--sizes", help="comma separated sizes of the generated files (in lines)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIRECTORY, "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARKS_DIRECTORY, "baseline.json"))
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+    arguments = parser.parse_args()
+
+    sizes = [int(size) for size in arguments.sizes.split(",")] if arguments.sizes else None
+    report = {
+        "environment": get_environment(),
+        "results": run_benchmarks(arguments.filter, sizes, arguments.repeat, log),
+    }
+
+    is_regressed = False
+    if os.path.isfile(arguments.baseline) and not arguments.update_baseline:
+        baseline = load_report(arguments.baseline)
+        report["baseline_environment"] = baseline["environment"]
+        report["comparison"] = compare_with_baseline(report["results"], baseline["results"], arguments.threshold)
+        log(format_comparison(report["comparison"]))
+        is_regressed = any(entry["is_regression"] for entry in report["comparison"].values())
+
+    save_report(arguments.output, report)
+    log(f"Results written to {arguments.output}")
+    if arguments.update_baseline:
+        save_report(arguments.baseline, report)
+        log(f"Baseline written to {arguments.baseline}")
+    return 1 if is_regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import os
+
+from .generators import LANGUAGE_BLOCKS, generate_lines
+
+# The inputs every highlighter is run over. The realistic ones are the generated sources and the files of the
+# repository, the adversarial ones are what the lexers are the most likely to get wrong or be slow at. Every case
+# is a function returning the lines (without the line breaks), the same lines every time
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The lines of the generated sources
+GENERATED_LINES = 10_000
+# The length of the huge lines, the boundaries of the tokens past 0xFFFF need the wide columns of the token lines
+HUGE_LINE_LENGTH = 1_000_000
+# How deep the brackets, the quotes, etc. are nested
+NESTING_DEPTH = 50_000
+
+
+def read_repository_lines(extension):
+    lines = []
+    for directory, directories, filenames in os.walk(REPOSITORY_DIRECTORY):
+        directories[:] = sorted(i for i in directories if not i.startswith(".") and i != "__pycache__")
+        for filename in sorted(filenames):
+            if filename.endswith(extension):
+                with open(os.path.join(directory, filename), "r", encoding="utf-8") as file:
+                    lines += file.read().split("\n")
+    return lines
+
+
+def generate_huge_line():
+    # The python code on a single line, over and over. Without the comments, which would take the rest of the line
+    line = " ".join(i for i in generate_lines("python", 200) if "#" not in i)
+    return [(line * (HUGE_LINE_LENGTH // len(line) + 1))[:HUGE_LINE_LENGTH]]
+
+
+def generate_huge_tokens():
+    # Single tokens longer than the short columns can hold, and the tokens that end past them
+    return [
+        "a" * 70_000,
+        "7" * 70_000,
+        '"' + "s" * 70_000 + '"',
+        "# " + "c" * 70_000,
+        "x" * 65_535 + " = 1",
+        " " * 65_534 + "ab",
+    ]
+
+
+def generate_unterminated_strings():
+    # The strings left open at the end of the line continue on the next ones, until their quote is met
+    return [
+        'x = "never closed',
+        "the next line is still inside of the string",
+        "",
+        'the string ends here" and the code goes on',
+        "y = 'single quoted, unterminated",
+        '"double quote inside of the single quoted one',
+        "closed ' then 'opened again",
+        '"""triple quoted docstring',
+        "with the text in between",
+        '"""',
+        'escaped \\" quote that does not escape anything for the lexers',
+        '\\',
+        '"',
+        "'",
+        '"\'"\'"\'',
+        "ends with a backslash \\",
+        'unterminated "at the end',
+    ] * 200
+
+
+def generate_quotes():
+    return ['"' * 1000, "'" * 1001, "\"'" * 500, '""' * 500 + '"', ""] * 20
+
+
+def generate_deep_nesting():
+    return [
+        "(" * NESTING_DEPTH + ")" * NESTING_DEPTH,
+        "[" * NESTING_DEPTH + "]" * NESTING_DEPTH,
+        "{" * NESTING_DEPTH,
+        "}" * NESTING_DEPTH,
+        "> " * NESTING_DEPTH + "quoted",
+        "f(" * (NESTING_DEPTH // 2) + "x" + ")" * (NESTING_DEPTH // 2),
+    ] + [" " * (i * 2) + ("[" if i % 2 else "{") for i in range(2000)] \
+      + [" " * (i * 2) + "- nested list item" for i in range(2000)]
+
+
+def generate_empty_lines():
+    return [""] * 5_000 + [" ", "\t", "    ", " \t \t", "\r", "", "\f", "\v"] * 500 + [""] * 5_000
+
+
+def generate_comments():
+    return [
+        "#" * 10_000,
+        "/" * 10_001,
+        "// " + "/* " * 1000,
+        "/* the block comment that never ends",
+        "*/",
+        "# \"the quote in the comment",
+        "code  # 'another quote",
+        "<!-- html comment",
+        "```",
+        "```python",
+        "## heading # with ## hashes",
+    ] * 200
+
+
+def generate_unicode():
+    # The letters, digits and numeric characters str.isalpha()/str.isdigit() disagree with the regexes on
+    return [
+        "naïve = café + résumé",
+        "числа = [1, 2, 3]  # комментарий",
+        "変数 = '文字列'",
+        "x² + y³ = z½ + ¼",
+        "٣٤٥ + १२३ + 𝟙𝟚𝟛",
+        "emoji = '\U0001F600' + \U0001F642 + \U0001F469\u200d\U0001F469\u200d\U0001F467",
+        "e\u0301 combined a\u030a letters",
+        "שלום = 'עולם'",
+        "\x00\x01\x1b[31mcontrol characters\x7f",
+        "zero\u200bwidth\u200dspace\ufeff",
+        "line\u2028separator\u2029paragraph",
+        "ſtraße ǅ ǈ ᾈ",
+    ] * 500
+
+
+def generate_crlf():
+    # The files with the windows line breaks keep the carriage returns at the ends of the lines
+    return [line + "\r" for line in generate_lines("c", 2000)]
+
+
+CORPUS = {
+    **{f"generated_{language}": (lambda language=language: generate_lines(language, GENERATED_LINES))
+       for language in LANGUAGE_BLOCKS},
+    "repository_python": lambda: read_repository_lines(".py"),
+    "repository_markdown": lambda: read_repository_lines(".md"),
+    "huge_line": generate_huge_line,
+    "huge_tokens": generate_huge_tokens,
+    "unterminated_strings": generate_unterminated_strings,
+    "quotes": generate_quotes,
+    "deep_nesting": generate_deep_nesting,
+    "empty_lines": generate_empty_lines,
+    "comments": generate_comments,
+    "unicode": generate_unicode,
+    "crlf": generate_crlf,
+}
@@ -0,0 +1,124 @@
+import random
+
+# The synthetic sources are made of the blocks of realistic code repeated with the random names and numbers,
+# the same seed always generates the same text
+
+PYTHON_BLOCK = '''\
+class {Name}Model(BaseModel):
+    """The {name} records, loaded lazily from the storage"""
+    LIMIT = {number}
+
+    def __init__(self, name, values=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name  # shown in the {name} list
+        self.values = values or [1, 2.5, {number}, 0x{hex}]
+
+    @property
+    def {name}_count(self):
+        return len([value for value in self.values if value is not None])
+
+    def compute(self, x, y={number}):
+        if x > self.LIMIT and not self.values or x in (None, True):
+            return f"{{self.name}}: {{x * y}}"
+        for i in range(x):
+            print('value of {name}', i * {number}, "escaped \\"quote\\"")
+        # TODO: cache the {name} results
+        return None
+
+'''
+
+C_BLOCK = '''\
+#include <stdio.h>
+#define {NAME}_LIMIT {number}
+
+/* Walks the {name} table and sums the matching entries */
+static int sum_{name}(const struct {name}_entry *entries, size_t count, int limit)
+{{
+    int total = 0;
+    for (size_t i = 0; i < count; i++) {{
+        if (entries[i].value > limit && entries[i].flags & 0x{hex}) {{
+            total += entries[i].value * {number};
+        }} else {{
+            printf("skipped %s at %zu\\n", "{name}", i);
+        }}
+    }}
+    // The total is clamped to the limit of the table
+    return total < {NAME}_LIMIT ? total : {NAME}_LIMIT;
+}}
+
+'''
+
+JSON_BLOCK = '''\
+  {{
+    "id": {number},
+    "name": "{name}",
+    "enabled": true,
+    "ratio": {number}.{hex_digits},
+    "tags": ["{name}", "generated", "item-{number}"],
+    "owner": {{"login": "{name}_{number}", "email": "{name}@example.com", "manager": null}},
+    "history": [{number}, {number2}, -{number}]
+  }},
+'''
+
+MARKDOWN_BLOCK = '''\
+## The {Name} section
+
+Some *emphasized* and **strong** text about `{name}`, with a [link](https://example.com/{name}/{number}).
+The paragraph continues on the next line with the number {number}.
+
+- First item of the {name} list
+- Second item with `inline code`
+  1. Nested item number {number}
+
+```python
+print("{name}", {number})
+```
+
+> Quoted note about the {name} records.
+
+'''
+
+LANGUAGE_BLOCKS = {
+    "python": PYTHON_BLOCK,
+    "c": C_BLOCK,
+    "json": JSON_BLOCK,
+    "markdown": MARKDOWN_BLOCK,
+}
+
+# The extensions the highlighters are picked by
+LANGUAGE_EXTENSIONS = {
+    "python": ".py",
+    "c": ".c",
+    "json": ".json",
+    "markdown": ".md",
+}
+
+WORDS = [
+    "user", "order", "invoice", "session", "token", "buffer", "widget", "report", "channel", "payload",
+    "account", "cache", "record", "entry", "metric", "stream", "socket", "vertex", "sample", "layer",
+]
+
+
+def generate_lines(language, line_count, seed=0):
+    """Returns line_count lines of a synthetic source in the language"""
+    block = LANGUAGE_BLOCKS[language]
+    generator = random.Random(seed)
+    lines = []
+    if language == "json":
+        lines.append("[")
+    while len(lines) < line_count:
+        name = f"{generator.choice(WORDS)}_{generator.choice(WORDS)}"
+        lines += block.format(
+            name=name,
+            Name=name.title().replace("_", ""),
+            NAME=name.upper(),
+            number=generator.randrange(1, 100000),
+            number2=generator.randrange(1, 100000),
+            hex=f"{generator.randrange(0x10000):04X}",
+            hex_digits=generator.randrange(1000),
+        ).splitlines()
+    return lines[:line_count]
+
+
+def generate_text(language, line_count, seed=0):
+    return "\n".join(generate_lines(language, line_count, seed))
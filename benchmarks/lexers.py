@@ -0,0 +1,118 @@
+"""Runs every highlighter over the corpus of the realistic and the adversarial inputs, checks that the tokens
+make up the lines they were lexed from and measures how fast parse_code is:
+
+    python -m benchmarks.lexers [--filter unicode] [--repeat 5] [--output benchmarks/lexers.json]
+                                [--baseline benchmarks/lexers_baseline.json] [--threshold 0.1]
+
+The exit code is 1 when any of the tokens are wrong, or when any of the lexers has got slower than the threshold
+allows compared with the baseline"""
+import argparse
+import os
+import sys
+
+# The shell is imported first, the highlighters import its token lines while it imports them
+from engine.shell.token_line import TOKEN_STYLES, TokenLine
+from engine.lang import get_syntax_highlighter_for_filename
+
+from .corpus import CORPUS
+from .report import DEFAULT_THRESHOLD, compare_with_baseline, format_comparison, get_environment, load_report, save_report
+from .suite import DEFAULT_REPEAT, measure
+
+# The highlighters by the extensions of the files they're picked for, "text" is the plain text one
+HIGHLIGHTER_EXTENSIONS = {"text": ".txt", "python": ".py", "c": ".c", "json": ".json", "markdown": ".md"}
+# The amount of the errors reported per highlighter and case
+REPORTED_ERRORS = 5
+
+
+def verify_tokens(lines, token_lines, line_states):
+    """Returns the descriptions of what's wrong with the tokens of the lines: every line has to be made of its tokens,
+    in order, with no gaps, overlaps or empty tokens, and every line has to have the state it ends in"""
+    errors = []
+    if len(token_lines) != len(lines):
+        errors.append(f"{len(token_lines)} token lines for {len(lines)} lines")
+    if len(line_states) != len(lines):
+        errors.append(f"{len(line_states)} line states for {len(lines)} lines")
+
+    for index, (line, tokens) in enumerate(zip(lines, token_lines)):
+        if not isinstance(tokens, TokenLine):
+            errors.append(f"line {index + 1}: {type(tokens).__name__} instead of the tokens")
+            continue
+        for start, end, style in tokens.iter_spans():
+            if end <= start:
+                errors.append(f"line {index + 1}: the token ending at {end} starts at {start}")
+                break
+            if not 0 <= style < len(TOKEN_STYLES):
+                errors.append(f"line {index + 1}: the token at {start} has unknown style {style}")
+                break
+        # The values of the tokens are the slices of the line between their boundaries
+        text = "".join(line[start:end] for start, end, _ in tokens.iter_spans())
+        if text != line:
+            errors.append(f"line {index + 1}: the tokens make {text[:40]!r} ({len(text)} characters) "
+                          f"out of {line[:40]!r} ({len(line)} characters)")
+    return errors
+
+
+def run_corpus(name_filter=None, repeat=DEFAULT_REPEAT, log=None):
+    """Lexes the cases of the corpus whose "language/case" names contain name_filter with every highlighter.
+    Returns the metrics by the "parse_code/language/case" names, along with the errors of the tokens"""
+    results = {}
+    for case, generate in CORPUS.items():
+        lines = None
+        for language, extension in HIGHLIGHTER_EXTENSIONS.items():
+            if name_filter and name_filter not in f"{language}/{case}":
+                continue
+            if lines is None:
+                lines = generate()
+            highlighter, _ = get_syntax_highlighter_for_filename(f"corpus{extension}")
+            errors = verify_tokens(lines, highlighter.parse_code(lines), highlighter.line_states)
+
+            metrics = measure(lambda: highlighter.parse_code(lines), repeat)
+            size = sum(len(line) + 1 for line in lines)
+            metrics["lines"] = len(lines)
+            metrics["mb_per_second"] = size / metrics["seconds"] / 1024 / 1024
+            metrics["errors"] = errors[:REPORTED_ERRORS]
+            metrics["error_count"] = len(errors)
+
+            name = f"parse_code/{language}/{case}"
+            results[name] = metrics
+            if log:
+                log(f"{name}: {metrics['mb_per_second']:.2f} MB/s" + (f", {len(errors)} ERRORS" if errors else ""))
+                for error in metrics["errors"]:
+                    log(f"    {error}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.lexers", description="Lexers correctness and throughput")
+    parser.add_argument("--filter", help="only run the language/case names containing this")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare the times with the results written before")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+    arguments = parser.parse_args()
+
+    def log(text):
+        print(text, file=sys.stderr)
+
+    report = {"environment": get_environment(), "results": run_corpus(arguments.filter, arguments.repeat, log)}
+    failed = [name for name, metrics in report["results"].items() if metrics["error_count"]]
+    if failed:
+        log(f"The tokens don't make up the lines in {len(failed)} of {len(report['results'])} runs")
+
+    is_regressed = False
+    if arguments.baseline and os.path.isfile(arguments.baseline):
+        report["comparison"] = compare_with_baseline(
+            report["results"], load_report(arguments.baseline)["results"], arguments.threshold
+        )
+        log(format_comparison(report["comparison"]))
+        is_regressed = any(entry["is_regression"] for entry in report["comparison"].values())
+
+    if arguments.output:
+        save_report(arguments.output, report)
+        log(f"Results written to {arguments.output}")
+    return 1 if failed or is_regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
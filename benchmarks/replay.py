@@ -0,0 +1,79 @@
+"""Replays the input recorded by the editor (see the "record_file" of the "main" config) in the headless editor
+and reports how long the frames and the inputs took:
+
+    python -m benchmarks.replay RECORDING [--realtime] [--output replay.json]
+
+The editor starts with the config the recording was made with, so the same files have to be at the same paths"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pygame
+
+from utils import InputRecording, replay_recording
+
+from .report import get_environment, save_report
+from .suite import summarize_samples
+
+# The amount of the slowest sections of the frames reported
+PROFILER_SECTIONS = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.replay", description="Replays the recorded input")
+    parser.add_argument("recording")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded speed, not as fast as possible")
+    parser.add_argument("--output", help="write the results as JSON")
+    arguments = parser.parse_args()
+
+    from main import EditorApplication
+
+    recording = InputRecording.load(arguments.recording)
+    with tempfile.TemporaryDirectory(prefix="thee-editor-replay-") as directory:
+        config_path = os.path.join(directory, "config.json")
+        with open(config_path, "w") as file:
+            json.dump(recording.config, file)
+        application = EditorApplication(config_path=config_path, headless=True)
+
+    # Neither of them changes what's drawn
+    application.store_config_value("main", "profiler", True)
+    application.store_config_value("main", "latency_tracing", True)
+    start = time.perf_counter()
+    frame_seconds = replay_recording(application, recording, arguments.realtime)
+    seconds = time.perf_counter() - start
+    for i in application.components:
+        i.cleanup()
+
+    results = {
+        "environment": get_environment(),
+        "recording": os.path.abspath(arguments.recording),
+        "recorded_seconds": recording.get_duration(),
+        "replay_seconds": seconds,
+        "frames": summarize_samples(frame_seconds) if frame_seconds else {},
+        "latency": application.get_latency_tracker().get_report(),
+        "sections": [
+            {"section": name, "samples": samples, "p50": p50, "p95": p95, "p99": p99}
+            for name, samples, p50, p95, p99 in application.get_profiler().get_report()
+        ],
+    }
+    pygame.quit()
+
+    print(f"Replayed {len(frame_seconds)} frames ({recording.get_duration():.2f} s recorded) in {seconds:.2f} s", file=sys.stderr)
+    if frame_seconds:
+        frames = results["frames"]
+        print(f"Frames: median {frames['seconds'] * 1000:.2f} ms, p95 {frames['p95_seconds'] * 1000:.2f} ms, "
+              f"max {frames['max_seconds'] * 1000:.2f} ms", file=sys.stderr)
+    for line in application.get_latency_tracker().format_report() + [""] + \
+            application.get_profiler().format_report(PROFILER_SECTIONS):
+        print(line, file=sys.stderr)
+    if arguments.output:
+        save_report(arguments.output, results)
+        print(f"Results written to {arguments.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import pygame
+
+# How much slower (relative to the baseline) a benchmark can get before it's reported as a regression
+DEFAULT_THRESHOLD = 0.1
+# The benchmarks whose runs are spread more than the threshold are allowed to get slower by this many of their
+# spreads, a noisy benchmark would be reported as a regression on every other run otherwise
+SPREAD_TOLERANCE = 3
+
+
+def get_environment():
+    # What the numbers were measured on, they're only comparable on the same machine
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(map(str, pygame.get_sdl_version())),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def load_report(path):
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def save_report(path, report):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def get_tolerance(metrics, baseline_metrics, threshold=DEFAULT_THRESHOLD):
+    # The relative change that is still taken for the noise: the threshold, or more for the benchmarks whose runs
+    # are spread more in either of the results. The results measured before the spread was recorded have none
+    spread = max(metrics.get("spread", 0.0), baseline_metrics.get("spread", 0.0))
+    return max(threshold, SPREAD_TOLERANCE * spread)
+
+
+def compare_with_baseline(results, baseline_results, threshold=DEFAULT_THRESHOLD):
+    """Compares the seconds of the benchmarks present in both of the results. Returns the comparison by the name,
+    with the ratio of the current time to the baseline one and the tolerance it was judged with"""
+    comparison = {}
+    for name, metrics in results.items():
+        baseline_metrics = baseline_results.get(name)
+        if not baseline_metrics:
+            continue
+        ratio = metrics["seconds"] / baseline_metrics["seconds"] if baseline_metrics["seconds"] else float("inf")
+        tolerance = get_tolerance(metrics, baseline_metrics, threshold)
+        comparison[name] = {
+            "baseline_seconds": baseline_metrics["seconds"],
+            "seconds": metrics["seconds"],
+            "ratio": ratio,
+            "tolerance": tolerance,
+            "is_regression": ratio > 1 + tolerance,
+            "is_improvement": ratio < 1 / (1 + tolerance),
+        }
+    return comparison
+
+
+def format_comparison(comparison):
+    lines = []
+    name_width = max((len(name) for name in comparison), default=0)
+    for name, entry in comparison.items():
+        status = "REGRESSION" if entry["is_regression"] else "improved" if entry["is_improvement"] else ""
+        lines.append(
+            f"{name.ljust(name_width)}  {entry['baseline_seconds'] * 1000:10.3f} ms -> {entry['seconds'] * 1000:10.3f} ms"
+            f"  x{entry['ratio']:.2f} (±{entry['tolerance']:.0%})  {status}"
+        )
+    return "\n".join(lines)
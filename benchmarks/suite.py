@@ -0,0 +1,253 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pygame
+
+# The shell is imported first, the highlighters import its token lines while it imports them
+from engine.shell import EditorViewportComponent, TerminalViewportComponent
+from engine.lang import get_syntax_highlighter_for_filename
+from engine.document import DocumentType, MappedFileDocument, create_document
+from utils import percentile
+
+from .generators import LANGUAGE_EXTENSIONS, generate_lines
+
+# The sizes (in lines) of the generated files
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+# The runs of every benchmark, the more of them the less the fastest one is disturbed by the rest of the machine
+DEFAULT_REPEAT = 5
+# The size of the viewport the frames are drawn into
+VIEWPORT_SIZE = (900, 540)
+# The frames drawn per run of the draw benchmark, half scrolling and half typing
+DRAWN_FRAMES = 200
+# Placed on the last line only, so the search goes through the whole document
+SEARCH_PATTERN = "needle_of_the_benchmark"
+# The go-to-line commands per run of the go_to_line benchmark, to the lines spread over the whole document
+GO_TO_LINE_JUMPS = 1000
+
+
+def measure(function, repeat, setup=None):
+    """Times the function repeat times, setup() is called untimed before every run and its result is passed to the function.
+    The fastest of the runs is the least disturbed by the rest of the machine, so it's the one compared"""
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        if setup:
+            function(argument)
+        else:
+            function()
+        times.append(time.perf_counter() - start)
+    fastest = min(times)
+    return {
+        "seconds": fastest,
+        "mean_seconds": statistics.mean(times),
+        "repeat": repeat,
+        # How far the typical run is from the fastest one, relative to it
+        "spread": (statistics.median(times) - fastest) / fastest if fastest else 0.0,
+    }
+
+
+def summarize_samples(samples):
+    # The metrics of the many short runs (e.g. of the frames), the median is the one compared
+    median = statistics.median(samples)
+    return {
+        "seconds": median,
+        "mean_seconds": statistics.mean(samples),
+        "p95_seconds": percentile(samples, 0.95),
+        "max_seconds": max(samples),
+        "samples": len(samples),
+        # How far the typical sample is from the median, relative to it
+        "spread": statistics.median(abs(sample - median) for sample in samples) / median if median else 0.0,
+    }
+
+
+class BenchmarkContext:
+    # The headless application the benchmarks run in, along with the generated sources shared between them
+
+    def __init__(self, application, directory):
+        self.application = application
+        self.directory = directory
+        self.sources = {}
+
+    def get_lines(self, language, size):
+        key = (language, size)
+        if key not in self.sources:
+            # Only the sources of the current size are kept, the largest ones take hundreds of megabytes
+            self.sources = {
+                source_key: lines for source_key, lines in self.sources.items() if source_key[1] == size
+            }
+            self.sources[key] = generate_lines(language, size)
+        return self.sources[key]
+
+    def get_file(self, language, size):
+        filename = os.path.join(self.directory, f"{language}_{size}{LANGUAGE_EXTENSIONS[language]}")
+        if not os.path.isfile(filename):
+            with open(filename, "w") as file:
+                file.write("\n".join(self.get_lines(language, size)))
+        return filename
+
+    def create_viewport(self, text=""):
+        viewport = EditorViewportComponent(self.application)
+        viewport.base_lines = viewport.create_document(text)
+        # Not lexed, the lines are drawn as plain text
+        viewport.token_lines = []
+        viewport.update_dimensions(VIEWPORT_SIZE, (0, 0))
+        viewport.is_focused = True
+        return viewport
+
+
+def benchmark_parse_code(context, size, repeat):
+    # Lexing of the whole file by every highlighter, "text" is the plain text one
+    results = {}
+    for language, extension in [("text", ".txt")] + list(LANGUAGE_EXTENSIONS.items()):
+        lines = context.get_lines("python" if language == "text" else language, size)
+        highlighter, _ = get_syntax_highlighter_for_filename(f"benchmark{extension}")
+        metrics = measure(lambda: highlighter.parse_code(lines), repeat)
+        metrics["lines_per_second"] = size / metrics["seconds"]
+        metrics["mb_per_second"] = sum(len(line) + 1 for line in lines) / metrics["seconds"] / 1024 / 1024
+        results[language] = metrics
+    return results
+
+
+def benchmark_insert_paste(context, size, repeat):
+    # A paste of size lines into the middle of a document of the same size
+    text = "\n".join(context.get_lines("python", size))
+
+    def setup():
+        viewport = context.create_viewport(text)
+        viewport.caret_position = [4, size // 2]
+        return viewport
+
+    return {"python": measure(lambda viewport: viewport.insert_at_current_caret(text), repeat, setup)}
+
+
+def benchmark_find_first_pattern(context, size, repeat):
+    # The pattern is only on the last line, so every line is searched from the caret at the beginning
+    lines = context.get_lines("python", size)
+    viewport = context.create_viewport("\n".join(lines[:-1] + [SEARCH_PATTERN]))
+
+    def setup():
+        viewport.caret_position = [0, 0]
+        return viewport
+
+    return {"python": measure(lambda viewport: viewport.find_first_pattern(SEARCH_PATTERN), repeat, setup)}
+
+
+def benchmark_go_to_line(context, size, repeat):
+    # The jumps of the go-to-line command, which moves the caret to the end of the line, by every kind of document
+    lines = context.get_lines("python", size)
+    # Every line a prime number of lines after the previous one, so the jumps are spread in no particular order
+    targets = [jump * 7919 % size + 1 for jump in range(GO_TO_LINE_JUMPS)]
+    viewport = context.create_viewport()
+
+    def go_to_lines():
+        for line in targets:
+            viewport.set_caret_line(line)
+
+    results = {}
+    for document_type in DocumentType:
+        viewport.base_lines = create_document(document_type, "\n".join(lines))
+        results[document_type.value] = measure(go_to_lines, repeat)
+    viewport.base_lines = MappedFileDocument(context.get_file("python", size))
+    # Only the jumps are measured, not the indexing of the file
+    viewport.base_lines.index_thread.join()
+    results["mapped_file"] = measure(go_to_lines, repeat)
+    viewport.base_lines.close()
+    return results
+
+
+def benchmark_draw(context, size, repeat):
+    # The frames of the file opened the way the editor opens it, while scrolling through it and while typing
+    viewport = context.create_viewport()
+    viewport.open_file(context.get_file("python", size))
+    # Wait for the background highlighting, so the frames draw the highlighted lines
+    viewport.apply_highlight_results(wait=True)
+
+    samples = []
+    for _ in range(repeat):
+        viewport.caret_position = [0, 0]
+        for frame in range(DRAWN_FRAMES):
+            if frame < DRAWN_FRAMES // 2:
+                viewport.caret_position[1] += 1
+            else:
+                viewport.insert_at_current_caret("x")
+                viewport.token_lines = viewport.generate_tokens()
+            viewport.update(1 / 60)
+            start = time.perf_counter()
+            viewport.draw()
+            samples.append(time.perf_counter() - start)
+    viewport.stop_highlight_job()
+    return {"python": summarize_samples(samples)}
+
+
+def benchmark_terminal_update(context, size, repeat):
+    # The updates appending the output of a process printing size lines, as fast as they come
+    script = f"for i in range({size}): print('line', i, 'of the terminal output with some more text')"
+    samples = []
+    drain_times = []
+    for _ in range(repeat):
+        terminal = TerminalViewportComponent(context.application, [sys.executable, "-c", script])
+        start = time.perf_counter()
+        while terminal.exit_code == -1:
+            has_output = not terminal.read_queue.empty()
+            update_start = time.perf_counter()
+            terminal.update(0)
+            if has_output:
+                samples.append(time.perf_counter() - update_start)
+            else:
+                time.sleep(0.0005)
+        drain_times.append(time.perf_counter() - start)
+        terminal.cleanup()
+
+    metrics = summarize_samples(samples)
+    # The updates with the output add up to the time the output takes to appear
+    metrics["seconds"] = sum(samples) / repeat
+    metrics["drain_seconds"] = min(drain_times)
+    return {"output": metrics}
+
+
+class Benchmark:
+    def __init__(self, name, function, sizes=SIZES):
+        self.name = name
+        self.function = function
+        # The sizes it's run with by default
+        self.sizes = sizes
+
+
+BENCHMARKS = [
+    Benchmark("parse_code", benchmark_parse_code),
+    Benchmark("insert_paste", benchmark_insert_paste),
+    Benchmark("find_first_pattern", benchmark_find_first_pattern),
+    Benchmark("go_to_line", benchmark_go_to_line),
+    Benchmark("draw", benchmark_draw),
+    # The whole output is split into lines on every update, so a million lines takes minutes
+    Benchmark("terminal_update", benchmark_terminal_update, SIZES[:3]),
+]
+
+
+def run_benchmarks(name_filter=None, sizes=None, repeat=DEFAULT_REPEAT, log=None):
+    """Runs the benchmarks whose names contain name_filter with the sizes (or their default ones).
+    Returns the metrics by the "benchmark/case/size" names"""
+    from main import EditorApplication
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="thee-editor-benchmarks-") as directory:
+        # The headless application doesn't read nor write the config of the user
+        application = EditorApplication(config_path=os.devnull, headless=True)
+        context = BenchmarkContext(application, directory)
+        for size in sorted(set(sizes or SIZES)):
+            for benchmark in BENCHMARKS:
+                if sizes is None and size not in benchmark.sizes:
+                    continue
+                if name_filter and name_filter not in benchmark.name:
+                    continue
+                for case, metrics in benchmark.function(context, size, repeat).items():
+                    name = f"{benchmark.name}/{case}/{size}"
+                    results[name] = metrics
+                    if log:
+                        log(f"{name}: {metrics['seconds'] * 1000:.3f} ms")
+        pygame.quit()
+    return results
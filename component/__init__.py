@@ -1,3 +1,3 @@
 
-from .component import Component
+from .component import Component, get_earliest_timeout
 from .vstack_component import VStackComponent
@@ -2,19 +2,40 @@ import pygame
 from typing import List
 
 
+def get_earliest_timeout(*timeouts):
+    # The shortest of the timeouts, None stands for no timeout at all
+    return min((timeout for timeout in timeouts if timeout is not None), default=None)
+
+
 class Component:
+    # The components that keep the content of their surface between the frames and report the areas
+    # they've changed with add_damage(). Others are cleared and drawn from scratch every frame
+    TRACKS_DAMAGE = False
+
     def __init__(self, app, position=(0, 0), is_headless=False):
         self.application = app
         self.position = position
         self.is_headless = is_headless
         if not is_headless:
-            self.surface = pygame.Surface((1, 1), pygame.SRCALPHA)
+            self.surface = app.get_render_backend().create_canvas((1, 1))
         self.is_focused = False
         self.children: List[Component] = []
+        # The areas of the surface that have changed since the previous frame
+        self.damage = []
+        # Something the component draws has changed since the previous frame, see invalidate()
+        self.is_dirty = True
 
     def get_cursor(self):
         return pygame.SYSTEM_CURSOR_ARROW
 
+    def get_profile_name(self):
+        # The name the timings of the component are reported under
+        return type(self).__name__
+
+    def get_memory_parts(self):
+        """Returns the objects the memory of the component is reported by, e.g. its document or its caches"""
+        return {} if self.is_headless else {"surface": self.surface}
+
     def get_mouse_focused_component(self):
         # This function exists for cases when the children components
         # might gain the focus of this parent component (e.g. in stack components)
@@ -25,8 +46,15 @@ class Component:
             i.propagate_event(event)
 
     def update(self, dt):
+        profiler = self.application.get_profiler()
         for i in self.children:
-            i.update(dt)
+            with profiler.measure_component("update", i):
+                i.update(dt)
+
+    def get_update_timeout(self):
+        """Returns how long (in seconds) the component can go without being updated when there's no input,
+        None if it only changes on the events"""
+        return get_earliest_timeout(*(i.get_update_timeout() for i in self.children))
 
     def reload(self):
         for i in self.children:
@@ -69,8 +97,10 @@ class Component:
     def draw(self):
         if self.is_headless:
             return
+        profiler = self.application.get_profiler()
         for i in self.children:
-            i.draw_frame(self.surface)
+            with profiler.measure_component("draw", i):
+                i.draw_frame(self.surface)
 
     def cleanup(self):
         for i in self.children:
@@ -97,16 +127,49 @@ class Component:
         if self.is_headless:
             return
         if size != (self.surface.get_width(), self.surface.get_height()):
-            self.surface = pygame.Surface(size, pygame.SRCALPHA)
+            self.surface = self.application.get_render_backend().create_canvas(size)
             self.current_size = size
+            # The children have to be blitted again onto the new surface
+            self.add_damage()
+            for i in self.children:
+                i.add_damage()
         self.position = position
 
-    def draw_frame(self, surface):
+    def invalidate(self):
+        # Makes the component and its children to be drawn on the next frame
+        self.is_dirty = True
+        for i in self.children:
+            i.invalidate()
+
+    def is_clean(self):
+        # Nothing in the component has changed since the previous frame, so its surface is reused as it is
+        return self.TRACKS_DAMAGE and not self.is_dirty and not self.damage and all(i.is_clean() for i in self.children)
+
+    def add_damage(self, rect=None):
+        # Marks the area of the surface (or the whole surface) to be presented on the next frame
         if self.is_headless:
             return
+        self.damage.append(self.surface.get_rect() if rect is None else pygame.Rect(rect))
+
+    def draw_frame(self, surface):
+        """Draws the component onto the surface of its parent. Returns the areas of the parent surface that have changed"""
+        if self.is_headless or self.is_clean():
+            return []
+        self.is_dirty = False
+        render_backend = self.application.get_render_backend()
+        if not self.TRACKS_DAMAGE:
+            render_backend.fill(self.surface, (0, 0, 0))
+            self.add_damage()
         self.draw()
-        surface.blit(self.surface, self.position)
-        self.surface.fill((0, 0, 0))
+
+        damage = [rect.clip(self.surface.get_rect()) for rect in self.damage]
+        self.damage = []
+        result = []
+        for rect in damage:
+            if rect:
+                render_backend.blit(surface, self.surface, (rect.x + self.position[0], rect.y + self.position[1]), rect)
+                result.append(rect.move(self.position))
+        return result
     
     def get_application(self):
         return self.application
@@ -4,12 +4,15 @@ from .component import Component
 
 
 class VStackComponent(Component):
+    TRACKS_DAMAGE = True
+
     def __init__(self, app, position):
         super().__init__(app, position)
         self.focused_component = None
         self.mouse_focused_component = None
         self.current_focused_index = 0
         self.height_modifier = []
+        self.previous_borders = None
 
     def get_mouse_focused_component(self):
         return self.mouse_focused_component
@@ -98,12 +101,29 @@ class VStackComponent(Component):
             y_offset += component_height
 
     def draw(self):
+        borders = []
         for i in self.children:
-            i.draw_frame(self.surface)
             border_color = (120, 120, 120)
             if i.is_focused:
                 border_color = (255, 255, 255)
-            pygame.draw.rect(self.surface, border_color, (*i.position, i.get_width(), i.get_height()), 1)
+            borders.append((border_color, pygame.Rect(*i.position, i.get_width(), i.get_height())))
+
+        render_backend = self.application.get_render_backend()
+        # Clear the areas left by the removed or moved children
+        if borders != self.previous_borders:
+            render_backend.fill(self.surface, (0, 0, 0))
+            self.add_damage()
+            for i in self.children:
+                i.add_damage()
+
+        profiler = self.application.get_profiler()
+        for i in self.children:
+            with profiler.measure_component("draw", i):
+                self.damage += i.draw_frame(self.surface)
+        # The borders overlap the edges of the children, so they're drawn again after every child
+        for border_color, rect in borders:
+            render_backend.draw_rect(self.surface, border_color, rect, 1)
+        self.previous_borders = borders
 
     def get_mouse_focused_component(self):
         return self.focused_component
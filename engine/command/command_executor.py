@@ -1,6 +1,8 @@
 import pygame
 import shlex
+import json
 import os
+import tracemalloc
 
 from utils import *
 from component import Component
@@ -141,6 +143,197 @@ class SplitCommand(Command):
         self.application.buffers_stack.add_child_component(EditorViewportComponent(self.application))
        
 
+class ProfileCommand(Command):
+    def usage(self):
+        return {
+            "description": "Reports the percentiles of the frame times of the components, lexers, etc.",
+            "usage": [
+                'To print the report into the logs: profile',
+                'To start or stop the profiling: profile on/off',
+                'To forget the collected timings: profile reset',
+                'To save the report as JSON: profile save FILENAME',
+            ]
+        }
+
+    def execute(self, cmd, args):
+        profiler = self.application.get_profiler()
+        if not args:
+            if not profiler.sections:
+                self.status_bar.display_text("Nothing is profiled yet, start it with 'profile on'", background=(255, 0, 0))
+                return
+            for line in profiler.format_report():
+                print(line)
+            self.status_bar.display_text(f"Printed the timings of {len(profiler.sections)} sections into the logs")
+        elif args[0] in ('on', 'off'):
+            self.application.store_config_value("main", "profiler", args[0] == 'on')
+            self.status_bar.display_text(f"Profiler is {args[0]}")
+        elif args[0] == 'reset':
+            profiler.reset()
+            self.status_bar.display_text("Profiler timings are reset")
+        elif args[0] == 'save' and len(args) == 2:
+            report = [
+                {"section": name, "samples": samples, "p50": p50, "p95": p95, "p99": p99}
+                for name, samples, p50, p95, p99 in profiler.get_report()
+            ]
+            with open(args[1], "w") as file:
+                json.dump(report, file, indent=2)
+            self.status_bar.display_text(f"Saved the timings of {len(report)} sections to '{args[1]}'")
+        else:
+            self.status_bar.display_text("Usage: 'profile [on/off/reset/save FILENAME]'", background=(255, 0, 0))
+
+
+class LatencyCommand(Command):
+    def usage(self):
+        return {
+            "description": "Reports the latencies from the inputs to the frames showing them, by the kind of the input",
+            "usage": [
+                'To print the report into the logs: latency',
+                'To start or stop the tracing: latency on/off',
+                'To forget the collected latencies: latency reset',
+                'To save the report with the histograms as JSON: latency save FILENAME',
+            ]
+        }
+
+    def execute(self, cmd, args):
+        latency_tracker = self.application.get_latency_tracker()
+        if not args:
+            report = latency_tracker.get_report()
+            if not report:
+                self.status_bar.display_text("No latencies are traced yet, start it with 'latency on'", background=(255, 0, 0))
+                return
+            for line in latency_tracker.format_report():
+                print(line)
+            self.status_bar.display_text(f"Printed the latencies of {sum(i['inputs'] for i in report.values())} inputs into the logs")
+        elif args[0] in ('on', 'off'):
+            self.application.store_config_value("main", "latency_tracing", args[0] == 'on')
+            self.status_bar.display_text(f"Latency tracing is {args[0]}")
+        elif args[0] == 'reset':
+            latency_tracker.reset()
+            self.status_bar.display_text("Latencies are reset")
+        elif args[0] == 'save' and len(args) == 2:
+            report = latency_tracker.get_report()
+            with open(args[1], "w") as file:
+                json.dump(report, file, indent=2)
+            self.status_bar.display_text(f"Saved the latencies of {len(report)} kinds of inputs to '{args[1]}'")
+        else:
+            self.status_bar.display_text("Usage: 'latency [on/off/reset/save FILENAME]'", background=(255, 0, 0))
+
+
+class TraceCommand(Command):
+    def usage(self):
+        return {
+            "description": "Records the frames, the events, the lexing, etc. as a trace for chrome://tracing or Perfetto",
+            "usage": [
+                'To start or stop the tracing: trace on/off',
+                'To forget the recorded spans: trace reset',
+                'To save the trace as JSON: trace save FILENAME',
+                'The trace is also saved on exit, when the "trace_file" is set in the "main" config',
+            ]
+        }
+
+    def execute(self, cmd, args):
+        trace_recorder = self.application.get_trace_recorder()
+        if args and args[0] in ('on', 'off'):
+            self.application.store_config_value("main", "tracing", args[0] == 'on')
+            self.status_bar.display_text(f"Tracing is {args[0]}")
+        elif args and args[0] == 'reset':
+            trace_recorder.reset()
+            self.status_bar.display_text("Trace is reset")
+        elif len(args) == 2 and args[0] == 'save':
+            trace_recorder.save(args[1])
+            self.status_bar.display_text(f"Saved {len(trace_recorder.spans)} spans to '{args[1]}'")
+        else:
+            self.status_bar.display_text("Usage: 'trace [on/off/reset/save FILENAME]'", background=(255, 0, 0))
+
+
+class MemoryCommand(Command):
+    # The amount of the allocation sites reported
+    TOP_ALLOCATIONS = 10
+
+    def usage(self):
+        return {
+            "description": "Reports the memory taken by every viewport (its text, tokens, caches, etc.) and by the fonts",
+            "usage": [
+                'To print the report into the logs: memory',
+                'To start or stop tracing the allocation sites: memory trace on/off',
+                'To save the report as JSON: memory save FILENAME',
+            ]
+        }
+
+    def get_report(self):
+        # The objects shared with the rest of the application aren't counted as a part of the viewports
+        shared_objects = [self.application, self.application.get_render_backend(), self.application.window]
+        seen = {id(i): i for i in shared_objects}
+        report = {}
+        if tracemalloc.is_tracing():
+            # Before the report itself has allocated anything
+            report["traced"], report["traced_peak"] = tracemalloc.get_traced_memory()
+            report["top_allocations"] = [
+                {"site": site, "size": size, "count": count}
+                for site, size, count in get_top_allocations(MemoryCommand.TOP_ALLOCATIONS)
+            ]
+
+        viewports = {}
+        for index, viewport in enumerate(self.application.buffers_stack.children):
+            parts = get_parts_sizes(viewport.get_memory_parts(), seen)
+            viewports[f"{index + 1}. {viewport.get_profile_name()}"] = {"total": sum(parts.values()), "parts": parts}
+        font_parts = get_parts_sizes(self.application.get_font_driver().get_memory_parts(), seen)
+        viewports["FontDriver"] = {"total": sum(font_parts.values()), "parts": font_parts}
+
+        return {"total": sum(i["total"] for i in viewports.values()), "viewports": viewports, **report}
+
+    def format_report(self, report):
+        lines = [f"Memory of {len(report['viewports']) - 1} viewports and the fonts: {format_size(report['total'])}"]
+        for name, entry in sorted(report["viewports"].items(), key=lambda i: i[1]["total"], reverse=True):
+            lines.append(f"{name}: {format_size(entry['total'])}")
+            lines.append("  " + ", ".join(f"{part} {format_size(size)}" for part, size in entry["parts"].items()))
+        if "top_allocations" in report:
+            lines.append(f"Traced {format_size(report['traced'])}, at most {format_size(report['traced_peak'])}, allocated by:")
+            for i in report["top_allocations"]:
+                lines.append(f"  {format_size(i['size']).rjust(9)} in {i['count']:7} blocks at {i['site']}")
+        return lines
+
+    def execute(self, cmd, args):
+        if not args:
+            for line in self.format_report(self.get_report()):
+                print(line)
+            self.status_bar.display_text("Printed the memory report into the logs")
+        elif len(args) == 2 and args[0] == 'trace' and args[1] in ('on', 'off'):
+            # Only the allocations made while tracing are known, and the tracing slows everything down
+            if args[1] == 'on':
+                tracemalloc.start()
+            else:
+                tracemalloc.stop()
+            self.status_bar.display_text(f"Tracing of the allocations is {args[1]}")
+        elif len(args) == 2 and args[0] == 'save':
+            with open(args[1], "w") as file:
+                json.dump(self.get_report(), file, indent=2)
+            self.status_bar.display_text(f"Saved the memory report to '{args[1]}'")
+        else:
+            self.status_bar.display_text("Usage: 'memory [trace on/off/save FILENAME]'", background=(255, 0, 0))
+
+
+class RecordCommand(Command):
+    def usage(self):
+        return {
+            "description": "Saves the input recorded since the start, when the \"record_file\" is set in the \"main\" config",
+            "usage": [
+                'To save the input recorded so far: record save FILENAME',
+                'To replay it: python -m benchmarks.replay FILENAME [--realtime]',
+            ]
+        }
+
+    def execute(self, cmd, args):
+        recording = self.application.get_input_recorder().recording
+        if len(args) != 2 or args[0] != 'save':
+            self.status_bar.display_text("Usage: 'record save FILENAME'", background=(255, 0, 0))
+        elif recording is None:
+            self.status_bar.display_text("Nothing is recorded, set the 'main.record_file' config and restart", background=(255, 0, 0))
+        else:
+            recording.save(args[1])
+            self.status_bar.display_text(f"Saved {len(recording.frames)} frames of input to '{args[1]}'")
+
+
 class HelpCommand(Command):
     def usage(self):
         return {
@@ -182,6 +375,11 @@ class CommandExecutor(Component):
             ('config',): ConfigCommand(self),
             ('eval',): EvalCommand(self),
             ('split',): SplitCommand(self),
+            ('profile',): ProfileCommand(self),
+            ('latency',): LatencyCommand(self),
+            ('trace',): TraceCommand(self),
+            ('memory',): MemoryCommand(self),
+            ('record',): RecordCommand(self),
             ('help', 'info'): HelpCommand(self),
         }
     
@@ -0,0 +1,4 @@
+from .document import Document, OffsetDocument, DocumentType, create_document
+from .piece_table import PieceTableDocument
+from .rope import RopeDocument
+from .mapped_file import MappedFileDocument
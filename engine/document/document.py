@@ -0,0 +1,196 @@
+from enum import Enum
+
+
+class DocumentType(Enum):
+    PIECE_TABLE: str = 'piece_table'
+    ROPE: str = 'rope'
+
+
+class Document:
+    # Base class for the text storage of a buffer. The text is exposed as a sequence of lines
+    # (without the trailing new line characters), so the renderer and the highlighters can keep
+    # indexing it like a list of strings, while the edits go through insert()/delete().
+
+    def __init__(self):
+        # Incremented on every edit, so the consumers can cheaply tell if the text has changed
+        self.version = 0
+        # The lines changed since the last take_edited_range() call, as the index of the first line,
+        # the amount of lines it has replaced and the amount of lines it consists of now
+        self.edited_range = None
+
+    def __len__(self):
+        return self.get_line_count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get_line(i) for i in range(*index.indices(self.get_line_count()))]
+        if index < 0:
+            index += self.get_line_count()
+        if not 0 <= index < self.get_line_count():
+            raise IndexError("line index out of range")
+        return self.get_line(index)
+
+    def __iter__(self):
+        return self.iter_lines()
+
+    def mark_edited(self, first_line, removed_count, added_count):
+        self.version += 1
+        if self.edited_range is None:
+            self.edited_range = (first_line, removed_count, added_count)
+            return
+
+        # Merge with the previous edits, the lines outside of the range are unchanged
+        start, old_count, new_count = self.edited_range
+        end = max(start + new_count, first_line + removed_count)
+        start = min(start, first_line)
+        old_end = end - (new_count - old_count)
+        new_end = end + added_count - removed_count
+        self.edited_range = (start, old_end - start, new_end - start)
+
+    def take_edited_range(self):
+        edited_range = self.edited_range
+        self.edited_range = None
+        return edited_range
+
+    def get_line_count(self) -> int: ...
+
+    def get_line(self, index) -> str: ...
+
+    def get_line_length(self, index) -> int:
+        return len(self.get_line(index))
+
+    def iter_lines(self, start=0):
+        for index in range(start, self.get_line_count()):
+            yield self.get_line(index)
+
+    def get_text(self) -> str:
+        return "\n".join(self.iter_lines())
+
+    def insert(self, line, column, text):
+        """Inserts text at the given position and returns the position right after the inserted text"""
+        ...
+
+    def delete(self, line, column, length) -> str:
+        """Deletes length characters (a line break counts as one) starting at the given position"""
+        ...
+
+    def write_to(self, file):
+        file.write(self.get_text())
+
+    def close(self):
+        # Releases the resources held by the document (e.g. the mapped file)
+        ...
+
+    def pop_line(self, index) -> str:
+        text = self.get_line(index)
+        if index + 1 < self.get_line_count():
+            self.delete(index, 0, len(text) + 1)
+        elif index > 0:
+            # The last line has no line break after it, so remove the one before it
+            self.delete(index - 1, self.get_line_length(index - 1), len(text) + 1)
+        else:
+            self.delete(0, 0, len(text))
+        return text
+
+    @staticmethod
+    def get_end_position(line, column, text):
+        line_breaks = text.count("\n")
+        if line_breaks == 0:
+            return line, column + len(text)
+        return line + line_breaks, len(text) - text.rfind("\n") - 1
+
+
+class OffsetDocument(Document):
+    # Base class for the documents that address the text by character offsets. Subclasses
+    # provide the offset primitives, and the line/column interface is implemented on top of them.
+
+    # How many characters iter_lines() reads at a time
+    ITER_LINES_WINDOW = 64 * 1024
+
+    def __init__(self):
+        super().__init__()
+        self.cached_line = (None, None)
+
+    def get_length(self) -> int: ...
+
+    def get_line_start(self, line) -> int: ...
+
+    def iter_chunks(self, start=0, end=None): ...
+
+    def insert_text(self, offset, text): ...
+
+    def delete_text(self, offset, length) -> str: ...
+
+    def get_offset(self, line, column):
+        return self.get_line_start(line) + column
+
+    def get_line_end(self, line):
+        if line + 1 >= self.get_line_count():
+            return self.get_length()
+        return self.get_line_start(line + 1) - 1
+
+    def get_text_range(self, start, end):
+        return "".join(self.iter_chunks(start, end))
+
+    def get_line(self, index):
+        cached_index, cached_text = self.cached_line
+        if cached_index == index:
+            return cached_text
+        text = self.get_text_range(self.get_line_start(index), self.get_line_end(index))
+        self.cached_line = (index, text)
+        return text
+
+    def get_line_length(self, index):
+        return self.get_line_end(index) - self.get_line_start(index)
+
+    def iter_lines(self, start=0):
+        if start >= self.get_line_count():
+            return
+        # The text is read a window at a time, a chunk might be the rest of the document and
+        # only a few of the lines are read most of the time
+        offset = self.get_line_start(start)
+        length = self.get_length()
+        line_parts = []
+        while offset < length:
+            chunk = self.get_text_range(offset, offset + OffsetDocument.ITER_LINES_WINDOW)
+            offset += len(chunk)
+            *lines, line_tail = chunk.split("\n")
+            if lines:
+                line_parts.append(lines[0])
+                lines[0] = "".join(line_parts)
+                line_parts = []
+                yield from lines
+            line_parts.append(line_tail)
+        yield "".join(line_parts)
+
+    def get_text(self):
+        return "".join(self.iter_chunks())
+
+    def insert(self, line, column, text):
+        if text:
+            self.mark_edited(line, 1, text.count("\n") + 1)
+            self.cached_line = (None, None)
+            self.insert_text(self.get_offset(line, column), text)
+        return self.get_end_position(line, column, text)
+
+    def delete(self, line, column, length):
+        offset = self.get_offset(line, column)
+        length = min(length, self.get_length() - offset)
+        if length <= 0:
+            return ""
+        self.cached_line = (None, None)
+        deleted = self.delete_text(offset, length)
+        self.mark_edited(line, deleted.count("\n") + 1, 1)
+        return deleted
+
+
+def create_document(document_type: DocumentType = DocumentType.PIECE_TABLE, text: str = ""):
+    from .piece_table import PieceTableDocument
+    from .rope import RopeDocument
+
+    if document_type == DocumentType.PIECE_TABLE:
+        return PieceTableDocument(text)
+    elif document_type == DocumentType.ROPE:
+        return RopeDocument(text)
+
+    raise ValueError(f"Unknown document type: {document_type}")
@@ -0,0 +1,253 @@
+import mmap
+import os
+import time
+
+from array import array
+from collections import OrderedDict
+from threading import Thread
+
+from .document import Document
+
+
+class BlockLineCounts:
+    # Fenwick tree over the amount of lines in every block, so a line can be located
+    # and a block can grow or shrink in O(log n) in the amount of blocks
+
+    def __init__(self, counts):
+        self.size = len(counts)
+        self.total = sum(counts)
+        self.tree = array('q', [0]) + array('q', counts)
+        for index in range(1, self.size + 1):
+            parent = index + (index & -index)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[index]
+        self.high_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+    def append(self, count):
+        # Adds the block after the last one, its node sums the blocks of the nodes right below it
+        self.size += 1
+        self.total += count
+        self.tree.append(count)
+        child = self.size - 1
+        while child > self.size - (self.size & -self.size):
+            self.tree[self.size] += self.tree[child]
+            child -= child & -child
+        self.high_bit = 1 << (self.size.bit_length() - 1)
+
+    def add(self, block, delta):
+        self.total += delta
+        block += 1
+        while block <= self.size:
+            self.tree[block] += delta
+            block += block & -block
+
+    def find(self, line):
+        # Returns the block that contains the line and the index of the line inside that block
+        block = 0
+        step = self.high_bit
+        while step:
+            if block + step <= self.size and self.tree[block + step] <= line:
+                block += step
+                line -= self.tree[block]
+            step >>= 1
+        return block, line
+
+
+class MappedFileDocument(Document):
+    # Lazily loaded document for huge files. The file is memory mapped and a background thread
+    # builds the index of the line offsets, then only the blocks of lines that are actually
+    # accessed get decoded (and kept in a LRU cache). When a block is edited, it's promoted into
+    # a plain list of lines, while the rest of the file stays on the disk.
+
+    BLOCK_SIZE = 256
+    CACHED_BLOCKS = 64
+    # The amount of bytes scanned for line breaks before letting other threads run
+    INDEX_STEP = 4 * 1024 * 1024
+
+    def __init__(self, filename, encoding="utf-8"):
+        super().__init__()
+        self.filename = filename
+        self.encoding = encoding
+        self.file = open(filename, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # Empty files can't be mapped
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+        self.line_offsets = array('Q', [0])
+        self.indexed_size = 0
+        self.is_indexed = False
+        self.is_closed = False
+
+        self.cached_blocks = OrderedDict()
+        self.edited_blocks = {}
+        self.block_line_counts = None
+
+        self.index_thread = Thread(target=self.build_index, daemon=True)
+        self.index_thread.start()
+
+    def build_index(self):
+        position = 0
+        while position < self.size and not self.is_closed:
+            step_end = min(position + MappedFileDocument.INDEX_STEP, self.size)
+            line_break = self.mapping.find(b"\n", position, step_end)
+            while line_break != -1:
+                self.line_offsets.append(line_break + 1)
+                line_break = self.mapping.find(b"\n", line_break + 1, step_end)
+            position = self.indexed_size = step_end
+            time.sleep(0)
+        self.is_indexed = True
+
+    def is_block_indexed(self, block):
+        # The block is complete once the line after its last one is found
+        return self.is_indexed or (block + 1) * MappedFileDocument.BLOCK_SIZE < len(self.line_offsets)
+
+    def get_block_line_counts(self, block):
+        """Returns the line counts of the blocks, once they're kept up to the given block. Only the blocks
+        up to the edited ones are kept, while the file is still being indexed after them"""
+        while not self.is_block_indexed(block):
+            # Only the lines at the end of the scanned part of the file are waited for
+            time.sleep(0.001)
+        if self.block_line_counts is None:
+            self.block_line_counts = BlockLineCounts([MappedFileDocument.BLOCK_SIZE] * block)
+        while self.block_line_counts.size <= block:
+            first_line = self.block_line_counts.size * MappedFileDocument.BLOCK_SIZE
+            self.block_line_counts.append(min(len(self.line_offsets) - first_line, MappedFileDocument.BLOCK_SIZE))
+        return self.block_line_counts
+
+    def get_block_count(self):
+        mapped_block_count = -(-len(self.line_offsets) // MappedFileDocument.BLOCK_SIZE)
+        if self.block_line_counts:
+            return max(self.block_line_counts.size, mapped_block_count)
+        return mapped_block_count
+
+    def close(self):
+        self.is_closed = True
+        self.index_thread.join()
+        if self.size:
+            self.mapping.close()
+        self.file.close()
+
+    def get_line_count(self):
+        if self.block_line_counts:
+            # The blocks after the kept ones are never edited, they're only read from the file
+            mapped_line_count = len(self.line_offsets) - self.block_line_counts.size * MappedFileDocument.BLOCK_SIZE
+            return self.block_line_counts.total + max(mapped_line_count, 0)
+        return len(self.line_offsets)
+
+    def locate_line(self, index):
+        if self.block_line_counts:
+            if index < self.block_line_counts.total:
+                return self.block_line_counts.find(index)
+            block, line = divmod(index - self.block_line_counts.total, MappedFileDocument.BLOCK_SIZE)
+            return self.block_line_counts.size + block, line
+        return divmod(index, MappedFileDocument.BLOCK_SIZE)
+
+    def get_mapped_block(self, block):
+        if block in self.cached_blocks:
+            self.cached_blocks.move_to_end(block)
+            return self.cached_blocks[block]
+
+        first_line = block * MappedFileDocument.BLOCK_SIZE
+        last_line = first_line + MappedFileDocument.BLOCK_SIZE
+        start = self.line_offsets[first_line]
+        is_complete = last_line < len(self.line_offsets) or self.is_indexed
+        if last_line < len(self.line_offsets):
+            end = self.line_offsets[last_line] - 1
+        else:
+            end = self.size if self.is_indexed else self.indexed_size
+        text = self.mapping[start:end].decode(self.encoding, errors="replace")
+        if "\r" in text:
+            # The windows line breaks are read as the plain ones, the same as the files opened in the text mode
+            text = text.replace("\r\n", "\n")
+            if text.endswith("\r") and self.mapping[end:end + 1] == b"\n":
+                text = text[:-1]
+        lines = text.split("\n")
+
+        # The block at the end of the scanned part of the file may get more lines later
+        if is_complete:
+            self.cached_blocks[block] = lines
+            if len(self.cached_blocks) > MappedFileDocument.CACHED_BLOCKS:
+                self.cached_blocks.popitem(last=False)
+        return lines
+
+    def get_block(self, block):
+        if block in self.edited_blocks:
+            return self.edited_blocks[block]
+        return self.get_mapped_block(block)
+
+    def promote_block(self, block):
+        if block not in self.edited_blocks:
+            self.edited_blocks[block] = list(self.get_mapped_block(block))
+            self.cached_blocks.pop(block, None)
+        return self.edited_blocks[block]
+
+    def get_line(self, index):
+        block, line = self.locate_line(index)
+        return self.get_block(block)[line]
+
+    def iter_lines(self, start=0):
+        index = start
+        while index < self.get_line_count():
+            block, line = self.locate_line(index)
+            lines = self.get_block(block)
+            yield from lines[line:]
+            index += len(lines) - line
+
+    def insert(self, line, column, text):
+        if not text:
+            return self.get_end_position(line, column, text)
+        self.mark_edited(line, 1, text.count("\n") + 1)
+        block, block_line = self.locate_line(line)
+        block_line_counts = self.get_block_line_counts(block)
+        lines = self.promote_block(block)
+        current = lines[block_line]
+        new_lines = (current[:column] + text + current[column:]).split("\n")
+        lines[block_line:block_line + 1] = new_lines
+        block_line_counts.add(block, len(new_lines) - 1)
+        return self.get_end_position(line, column, text)
+
+    def delete(self, line, column, length):
+        deleted = []
+        while length > 0:
+            block, block_line = self.locate_line(line)
+            self.get_block_line_counts(block)
+            lines = self.promote_block(block)
+            current = lines[block_line]
+            deleted_text = current[column:column + length]
+            lines[block_line] = current[:column] + current[column + len(deleted_text):]
+            length -= len(deleted_text)
+            deleted.append(deleted_text)
+
+            if length <= 0 or line + 1 >= self.get_line_count():
+                break
+            # Remove the line break by joining the next line, which might be in the next block
+            next_block, next_block_line = self.locate_line(line + 1)
+            block_line_counts = self.get_block_line_counts(next_block)
+            next_line = self.promote_block(next_block).pop(next_block_line)
+            block_line_counts.add(next_block, -1)
+            lines[block_line] += next_line
+            length -= 1
+            deleted.append("\n")
+
+        deleted = "".join(deleted)
+        if deleted:
+            self.mark_edited(line, deleted.count("\n") + 1, 1)
+        return deleted
+
+    def pop_line(self, index):
+        # The line at the end of the scanned part of the file is only read whole once the index gets past it
+        self.get_block_line_counts(self.locate_line(index)[0])
+        return super().pop_line(index)
+
+    def write_to(self, file):
+        self.index_thread.join()
+        is_first_block = True
+        for block in range(self.get_block_count()):
+            lines = self.get_block(block)
+            # The blocks might be left without lines after the edits
+            if not lines:
+                continue
+            if not is_first_block:
+                file.write("\n")
+            file.write("\n".join(lines))
+            is_first_block = False
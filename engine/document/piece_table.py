@@ -0,0 +1,214 @@
+import random
+
+from array import array
+from bisect import bisect_left
+
+from .document import OffsetDocument
+
+
+def find_line_breaks(text, offset=0):
+    line_breaks = array('q')
+    position = text.find("\n")
+    while position != -1:
+        line_breaks.append(position + offset)
+        position = text.find("\n", position + 1)
+    return line_breaks
+
+
+class Piece:
+    __slots__ = ("buffer", "start", "length", "line_breaks", "priority", "left", "right", "total_length", "total_line_breaks")
+
+    def __init__(self, buffer, start, length, line_breaks, priority=None):
+        self.buffer = buffer
+        self.start = start
+        self.length = length
+        self.line_breaks = line_breaks
+        self.priority = random.random() if priority is None else priority
+        self.left = None
+        self.right = None
+        self.total_length = length
+        self.total_line_breaks = line_breaks
+
+    def update(self):
+        self.total_length = self.length
+        self.total_line_breaks = self.line_breaks
+        if self.left:
+            self.total_length += self.left.total_length
+            self.total_line_breaks += self.left.total_line_breaks
+        if self.right:
+            self.total_length += self.right.total_length
+            self.total_line_breaks += self.right.total_line_breaks
+
+
+class PieceTableDocument(OffsetDocument):
+    # The text is never modified in place. It lives in the original buffer (the loaded file) and in
+    # the append buffer (everything typed afterwards), and the document is a list of pieces pointing
+    # into those buffers. The piece list is kept in a treap ordered by text offset, where every node
+    # caches the length and the amount of line breaks of its subtree, so locating a line, inserting
+    # and deleting are O(log n) in the amount of pieces, regardless of the file or the line size.
+
+    # The append buffer is split into blocks, so extending it doesn't copy everything typed before
+    APPEND_BLOCK_SIZE = 4096
+
+    def __init__(self, text=""):
+        super().__init__()
+        # buffers[0] is the original buffer, the rest are the blocks of the append buffer
+        self.buffers = [text]
+        self.buffers_line_breaks = [find_line_breaks(text)]
+        self.root = Piece(0, 0, len(text), len(self.buffers_line_breaks[0])) if text else None
+
+    def count_line_breaks(self, buffer, start, length):
+        line_breaks = self.buffers_line_breaks[buffer]
+        return bisect_left(line_breaks, start + length) - bisect_left(line_breaks, start)
+
+    def merge(self, left, right):
+        if not left or not right:
+            return left or right
+        if left.priority > right.priority:
+            left.right = self.merge(left.right, right)
+            left.update()
+            return left
+        right.left = self.merge(left, right.left)
+        right.update()
+        return right
+
+    def split(self, node, offset):
+        # Splits the subtree into the pieces before the offset and the pieces after it,
+        # cutting the piece that contains the offset in two if needed
+        if not node:
+            return None, None
+        left_length = node.left.total_length if node.left else 0
+        if offset <= left_length:
+            left, right = self.split(node.left, offset)
+            node.left = right
+            node.update()
+            return left, node
+        offset -= left_length
+        if offset >= node.length:
+            left, right = self.split(node.right, offset - node.length)
+            node.right = left
+            node.update()
+            return node, right
+
+        line_breaks = self.count_line_breaks(node.buffer, node.start, offset)
+        tail = Piece(node.buffer, node.start + offset, node.length - offset, node.line_breaks - line_breaks, node.priority)
+        tail.right = node.right
+        tail.update()
+        node.right = None
+        node.length = offset
+        node.line_breaks = line_breaks
+        node.update()
+        return node, tail
+
+    def append_to_buffer(self, text):
+        # Returns the buffer index and the start of the appended text
+        buffer = len(self.buffers) - 1
+        block = self.buffers[buffer]
+        if buffer == 0 or len(block) + len(text) > PieceTableDocument.APPEND_BLOCK_SIZE:
+            buffer += 1
+            block = ""
+            self.buffers.append(block)
+            self.buffers_line_breaks.append(array('q'))
+        self.buffers[buffer] = block + text
+        self.buffers_line_breaks[buffer].extend(find_line_breaks(text, len(block)))
+        return buffer, len(block)
+
+    def extend_last_piece(self, node, buffer, start, length, line_breaks):
+        # Typing usually appends right after the previously typed text,
+        # so grow that piece instead of adding a new one for every character
+        if not node:
+            return False
+        if node.right:
+            if self.extend_last_piece(node.right, buffer, start, length, line_breaks):
+                node.update()
+                return True
+            return False
+        if node.buffer != buffer or node.start + node.length != start:
+            return False
+        node.length += length
+        node.line_breaks += line_breaks
+        node.update()
+        return True
+
+    def get_line_start(self, line):
+        if line <= 0:
+            return 0
+        node = self.root
+        offset = 0
+        while node:
+            left_line_breaks = node.left.total_line_breaks if node.left else 0
+            if line <= left_line_breaks:
+                node = node.left
+                continue
+            line -= left_line_breaks
+            if node.left:
+                offset += node.left.total_length
+            if line <= node.line_breaks:
+                line_breaks = self.buffers_line_breaks[node.buffer]
+                line_break = line_breaks[bisect_left(line_breaks, node.start) + line - 1]
+                return offset + line_break - node.start + 1
+            line -= node.line_breaks
+            offset += node.length
+            node = node.right
+        return self.get_length()
+
+    def get_length(self):
+        return self.root.total_length if self.root else 0
+
+    def get_line_count(self):
+        return (self.root.total_line_breaks if self.root else 0) + 1
+
+    def iter_chunks(self, start=0, end=None):
+        # Yields the text between the offsets piece by piece, in order
+        if end is None:
+            end = self.get_length()
+        stack = []
+        node = self.root
+        node_offset = 0
+        while stack or node:
+            if node:
+                stack.append((node, node_offset))
+                # Don't descend into the left subtree if it ends before the start offset
+                left_length = node.left.total_length if node.left else 0
+                node = node.left if node_offset + left_length > start else None
+                continue
+            node, node_offset = stack.pop()
+            piece_offset = node_offset + (node.left.total_length if node.left else 0)
+            if piece_offset >= end:
+                return
+            piece_start = max(start - piece_offset, 0)
+            piece_end = min(end - piece_offset, node.length)
+            if piece_start < piece_end:
+                yield self.buffers[node.buffer][node.start + piece_start:node.start + piece_end]
+            node_offset = piece_offset + node.length
+            node = node.right
+
+    def get_subtree_text(self, node):
+        chunks = []
+        stack = []
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left
+                continue
+            node = stack.pop()
+            chunks.append(self.buffers[node.buffer][node.start:node.start + node.length])
+            node = node.right
+        return "".join(chunks)
+
+    def get_text(self):
+        return self.get_subtree_text(self.root)
+
+    def insert_text(self, offset, text):
+        buffer, start = self.append_to_buffer(text)
+        line_breaks = self.count_line_breaks(buffer, start, len(text))
+        left, right = self.split(self.root, offset)
+        if not self.extend_last_piece(left, buffer, start, len(text), line_breaks):
+            left = self.merge(left, Piece(buffer, start, len(text), line_breaks))
+        self.root = self.merge(left, right)
+
+    def delete_text(self, offset, length):
+        left, right = self.split(self.root, offset)
+        deleted, right = self.split(right, length)
+        self.root = self.merge(left, right)
+        return self.get_subtree_text(deleted)
@@ -0,0 +1,164 @@
+from .document import OffsetDocument
+
+
+class RopeNode:
+    __slots__ = ("text", "children", "length", "line_breaks")
+
+    def __init__(self, text=None, children=None):
+        # Leaves hold a chunk of the text, inner nodes hold their children
+        self.text = text
+        self.children = children
+        self.update()
+
+    def is_leaf(self):
+        return self.children is None
+
+    def update(self):
+        if self.children is None:
+            self.length = len(self.text)
+            self.line_breaks = self.text.count("\n")
+        else:
+            self.length = sum(child.length for child in self.children)
+            self.line_breaks = sum(child.line_breaks for child in self.children)
+
+
+class RopeDocument(OffsetDocument):
+    # A B-tree of text chunks. Every node caches the amount of characters and line breaks
+    # below it, and all the leaves are on the same depth, so finding a line or an offset
+    # walks down a single path of the tree, even for multi-hundred-megabyte files.
+
+    CHUNK_SIZE = 2048
+    MAX_CHILDREN = 32
+
+    def __init__(self, text=""):
+        super().__init__()
+        self.root = self.build_tree(self.make_leaves(text)) if text else RopeNode("")
+
+    @staticmethod
+    def make_leaves(text):
+        chunk_size = RopeDocument.CHUNK_SIZE
+        return [RopeNode(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+
+    @staticmethod
+    def group_nodes(nodes):
+        # Packs the nodes of a single level into as few parents as possible
+        max_children = RopeDocument.MAX_CHILDREN
+        return [RopeNode(children=nodes[i:i + max_children]) for i in range(0, len(nodes), max_children)]
+
+    @staticmethod
+    def build_tree(nodes):
+        while len(nodes) > 1:
+            nodes = RopeDocument.group_nodes(nodes)
+        return nodes[0]
+
+    def get_length(self):
+        return self.root.length
+
+    def get_line_count(self):
+        return self.root.line_breaks + 1
+
+    def get_line_start(self, line):
+        if line <= 0:
+            return 0
+        if line > self.root.line_breaks:
+            return self.root.length
+        node = self.root
+        offset = 0
+        while not node.is_leaf():
+            for child in node.children:
+                if line <= child.line_breaks:
+                    node = child
+                    break
+                line -= child.line_breaks
+                offset += child.length
+        position = -1
+        for _ in range(line):
+            position = node.text.find("\n", position + 1)
+        return offset + position + 1
+
+    def iter_chunks(self, start=0, end=None):
+        if end is None:
+            end = self.root.length
+        stack = [(self.root, 0)]
+        while stack:
+            node, node_offset = stack.pop()
+            if node_offset >= end or node_offset + node.length <= start:
+                continue
+            if node.is_leaf():
+                yield node.text[max(start - node_offset, 0):end - node_offset]
+                continue
+            children = []
+            for child in node.children:
+                children.append((child, node_offset))
+                node_offset += child.length
+            stack.extend(reversed(children))
+
+    def insert_node(self, node, offset, text):
+        # Returns the nodes that replace the given one, they all have the same depth as the node
+        if node.is_leaf():
+            node.text = node.text[:offset] + text + node.text[offset:]
+            if len(node.text) <= RopeDocument.CHUNK_SIZE * 2:
+                node.update()
+                return [node]
+            return self.make_leaves(node.text)
+
+        for index, child in enumerate(node.children):
+            if offset <= child.length or index == len(node.children) - 1:
+                node.children[index:index + 1] = self.insert_node(child, offset, text)
+                break
+            offset -= child.length
+
+        if len(node.children) <= RopeDocument.MAX_CHILDREN:
+            node.update()
+            return [node]
+        return self.group_nodes(node.children)
+
+    def delete_node(self, node, start, end):
+        if node.is_leaf():
+            node.text = node.text[:start] + node.text[end:]
+            node.update()
+            return
+
+        children = []
+        offset = 0
+        for child in node.children:
+            child_start, child_end = max(start - offset, 0), min(end - offset, child.length)
+            offset += child.length
+            # Drop the children that are deleted as a whole
+            if child_start <= 0 and child_end >= child.length:
+                continue
+            if child_start < child_end:
+                self.delete_node(child, child_start, child_end)
+            children.append(child)
+
+        # Merge the neighbours that have shrunk, so the tree doesn't degrade into tiny nodes
+        node.children = []
+        for child in children:
+            if node.children and self.can_merge(node.children[-1], child):
+                previous = node.children[-1]
+                if previous.is_leaf():
+                    previous.text += child.text
+                else:
+                    previous.children += child.children
+                previous.update()
+            else:
+                node.children.append(child)
+        node.update()
+
+    @staticmethod
+    def can_merge(left, right):
+        if left.is_leaf():
+            return len(left.text) + len(right.text) <= RopeDocument.CHUNK_SIZE
+        return len(left.children) + len(right.children) <= RopeDocument.MAX_CHILDREN
+
+    def insert_text(self, offset, text):
+        nodes = self.insert_node(self.root, offset, text)
+        self.root = self.build_tree(nodes)
+
+    def delete_text(self, offset, length):
+        deleted = self.get_text_range(offset, offset + length)
+        self.delete_node(self.root, offset, offset + length)
+        # Drop the levels that were left with a single child
+        while not self.root.is_leaf() and len(self.root.children) <= 1:
+            self.root = self.root.children[0] if self.root.children else RopeNode("")
+        return deleted
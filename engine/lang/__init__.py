@@ -1,2 +1,2 @@
-
-from .syntax_highlighter import BaseSyntaxHighlighter, get_syntax_highlighter_for_filename
+from .syntax_highlighter import BaseSyntaxHighlighter, UNKNOWN_STATE, get_syntax_highlighter_for_filename
+from .highlight_worker import HighlightJob
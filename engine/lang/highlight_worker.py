@@ -0,0 +1,92 @@
+import time
+
+from contextlib import nullcontext
+from threading import Thread
+from queue import Queue
+
+
+class HighlightJob:
+    # Tokenizes the lines in a background thread. The visible lines, if given, are lexed first,
+    # assuming they don't start inside of a multi-line literal, so they get highlighted right away.
+    # Then the lines fed to the job are lexed in order, carrying the state between the lines, and
+    # these results replace the speculative ones. The lines are copied from the document and fed
+    # by the viewport in chunks, a few chunks ahead of the lexing, as the document can only be read
+    # on the UI thread. The results are put into the queue and applied by the viewport on the UI
+    # thread, between the frames.
+
+    CHUNK_SIZE = 1000
+    # How many lines are fed to the job ahead of the ones it has lexed
+    FEED_AHEAD = 4 * CHUNK_SIZE
+
+    def __init__(self, syntax_highlighter, first_line, initial_state, visible_start=0, visible_lines=(), on_result=None, profiler=None):
+        # The highlighter keeps the position of the lexer, so the job needs an instance of its own
+        self.syntax_highlighter = syntax_highlighter.__class__()
+        self.first_line = first_line
+        self.initial_state = initial_state
+        self.visible_start = visible_start
+        self.visible_lines = visible_lines
+        self.visible_end = visible_start + len(visible_lines)
+        # Items are the lists of the lines, None is put once all the lines have been fed
+        self.lines = Queue()
+        self.is_fed = False
+        # Items are (first line, token lines, line states) tuples, the line states
+        # are None for the speculative results. None is put when the job is done
+        self.results = Queue()
+        # Called from the thread of the job every time a result is put into the queue
+        self.on_result = on_result
+        # Times the lexing of the chunks, if given
+        self.profiler = profiler
+        self.profile_name = f"lex {type(self.syntax_highlighter).__name__} in background"
+        self.is_cancelled = False
+
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def feed(self, lines):
+        self.lines.put(lines)
+
+    def finish_feeding(self):
+        self.is_fed = True
+        self.lines.put(None)
+
+    def cancel(self):
+        self.is_cancelled = True
+        # Wake the job up if it's waiting for the lines
+        self.lines.put(None)
+
+    def lex_lines(self, lines, state):
+        tokens = []
+        states = []
+        with self.profiler.measure(self.profile_name) if self.profiler else nullcontext():
+            for line in lines:
+                line_tokens, state = self.syntax_highlighter.parse_line(line, state)
+                tokens.append(line_tokens)
+                states.append(state)
+        return tokens, states
+
+    def run(self):
+        if self.visible_lines:
+            tokens, _ = self.lex_lines(self.visible_lines, None)
+            self.put_result((self.visible_start, tokens, None))
+            self.visible_lines = ()
+
+        state = self.initial_state
+        start = self.first_line
+        while True:
+            lines = self.lines.get()
+            if self.is_cancelled:
+                return
+            if lines is None:
+                break
+            tokens, states = self.lex_lines(lines, state)
+            state = states[-1]
+            self.put_result((start, tokens, states))
+            start += len(lines)
+            # Let the UI thread run
+            time.sleep(0)
+        self.put_result(None)
+
+    def put_result(self, result):
+        self.results.put(result)
+        if self.on_result:
+            self.on_result()
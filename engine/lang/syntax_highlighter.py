@@ -1,4 +1,13 @@
-from ..shell.buffer_component import BufferToken
+import re
+import sys
+import unicodedata
+
+from array import array
+from itertools import accumulate, chain, compress, count, islice, repeat
+from operator import add, is_
+
+from ..shell.token_line import CHARACTER_RUN, MAX_SHORT_LINE_LENGTH, TokenLine, get_token_style
+from . import unicode_classes
 
 BASE_COLOR = (255, 255, 255)
 STRING_LITERAL_COLOR = (190, 140, 100)
@@ -7,101 +16,350 @@ KEYWORD1_LITERAL_COLOR = (190, 190, 100)
 NUMBER_LITERAL_COLOR = (100, 190, 150)
 COMMENT_COLOR = (130, 190, 100)
 
+STRING_LITERAL_STYLE = get_token_style(STRING_LITERAL_COLOR)
+EMPTY_TOKEN_LINE = TokenLine.plain(0)
+
+# Placeholder state of the lines that were never lexed, it's never equal to a real lexer state
+UNKNOWN_STATE = object()
+
+
+def to_character_ranges(characters):
+    # Builds the contents of a regex character class out of the sorted characters, a long list of single
+    # characters is much slower to match than the ranges, since the regex engine checks them one by one
+    ranges = []
+    for character in characters:
+        if ranges and ord(ranges[-1][1]) + 1 == ord(character):
+            ranges[-1][1] = character
+        else:
+            ranges.append([character, character])
+    return "".join(
+        re.escape(first) if first == last else f"{re.escape(first)}-{re.escape(last)}" for first, last in ranges
+    )
+
+
+def find_numeric_characters():
+    # \w matches the alphanumeric characters and \d the decimal ones, while the lexers follow str.isalpha()
+    # and str.isdigit(). Returns the characters these disagree on: the digits that aren't decimal (e.g. '²')
+    # and the numeric characters that are neither letters nor digits (e.g. '½'), each split into the ones
+    # of the Basic Multilingual Plane and the ones past it
+    byte_order = "utf-32-le" if sys.byteorder == "little" else "utf-32-be"
+    # All the code points except for the surrogates, which can't be decoded
+    characters = (
+        array('I', range(0xD800)).tobytes() + array('I', range(0xE000, sys.maxunicode + 1)).tobytes()
+    ).decode(byte_order)
+    digits = []
+    numeric = []
+    for character in "".join(re.findall(r'[^\W\d_]+', characters)):
+        if character.isdigit():
+            digits.append(character)
+        elif not character.isalpha():
+            numeric.append(character)
+    return tuple(
+        to_character_ranges([i for i in characters if (i > "\uffff") == is_astral])
+        for characters in (digits, numeric) for is_astral in (False, True)
+    )
+
+
+if unicodedata.unidata_version == unicode_classes.UNICODE_VERSION:
+    NON_DECIMAL_DIGITS, ASTRAL_NON_DECIMAL_DIGITS, NUMERIC_CHARACTERS, ASTRAL_NUMERIC_CHARACTERS = (
+        unicode_classes.NON_DECIMAL_DIGITS, unicode_classes.ASTRAL_NON_DECIMAL_DIGITS,
+        unicode_classes.NUMERIC_CHARACTERS, unicode_classes.ASTRAL_NUMERIC_CHARACTERS,
+    )
+else:
+    NON_DECIMAL_DIGITS, ASTRAL_NON_DECIMAL_DIGITS, NUMERIC_CHARACTERS, ASTRAL_NUMERIC_CHARACTERS = (
+        find_numeric_characters()
+    )
+
+# Character classes used by the rules, matching the same characters as str.isalpha(), str.isdigit() and
+# (str.isalpha() or str.isdigit() or '_') do. The regex engine can only check the characters past the Basic
+# Multilingual Plane against the ranges one by one, for every character, so these get the classes of their own
+# that are only tried once the ones of the Basic Multilingual Plane don't match
+ASTRAL = r'\U00010000-\U0010ffff'
+BMP_ALPHA = rf'[^\W\d_{NON_DECIMAL_DIGITS}{NUMERIC_CHARACTERS}{ASTRAL}]'
+ASTRAL_ALPHA = rf'[^\W\d\x00-\uffff{ASTRAL_NON_DECIMAL_DIGITS}{ASTRAL_NUMERIC_CHARACTERS}]'
+# The alternatives of single characters are merged by the regex engine into a single class
+DIGIT = rf'(?:[\d{NON_DECIMAL_DIGITS}]|[{ASTRAL_NON_DECIMAL_DIGITS}])'
+BMP_WORD = rf'[^\W{NUMERIC_CHARACTERS}{ASTRAL}]'
+ASTRAL_WORD = rf'[^\W\x00-\uffff{ASTRAL_NUMERIC_CHARACTERS}]'
+# The regex engine skips the alternatives of the rules that start with a character or a class at the characters
+# they can't start with, without trying them. The rules start with these rather than with a repetition or a group
+DIGITS = DIGIT + DIGIT + '*'
+
+
+def word_characters(other_characters=None):
+    # Pattern of any amount of the word characters, along with the characters matched by the given pattern. The
+    # characters of the Basic Multilingual Plane are matched by a single class, the others only where it stops
+    other_characters = ASTRAL_WORD if other_characters is None else f'(?:{ASTRAL_WORD}|{other_characters})'
+    return f'{BMP_WORD}*(?:{other_characters}{BMP_WORD}*)*'
+
+
+def words(other_characters=None):
+    # Pattern of a letter followed by any amount of the word characters, along with the characters matched by the
+    # given pattern. Its alternatives are at the top level, so it can only be used as the whole pattern of a rule
+    characters = word_characters(other_characters)
+    return f'{BMP_ALPHA}{characters}|{ASTRAL_ALPHA}{characters}'
+
+
+class LexerRule:
+    def __init__(self, pattern, color, keywords=None, is_unterminated_string=False):
+        self.pattern = pattern
+        self.color = color
+        # Colors of the specific words matched by the rule, e.g. of the keywords among the identifiers
+        self.keywords = keywords
+        # The token is a string literal that continues on the next line, until its quote is met
+        self.is_unterminated_string = is_unterminated_string
+
+
+class Lexer:
+    # Combines the rules of a language into a single regex, so a whole token is matched by the regex engine. The rules
+    # are tried in order, and the characters between two matches are added as a single run of the tokens of their own.
+    # Many lines are lexed at a time: their joined text is split into the tokens and the line breaks in a single pass
+    # of the regex, then the styles and the columns of the lines are built out of the tokens by the builtins, so no
+    # Python code runs per token. The empty and the blank lines are built without the regex at all. The rules must
+    # neither match the line breaks nor start with a whitespace.
+
+    # The amount of the token styles kept, the texts of the tokens are kept along with them
+    CACHED_TOKEN_STYLES = 64 * 1024
+
+    def __init__(self, rules):
+        self.rules = rules
+        # Splits the text into the tokens, the line breaks are the tokens of their own. The alternatives of the rules
+        # are kept at the top level of the regex, where the ones that can't start at a character are skipped
+        self.regex = re.compile("(" + "|".join(rule.pattern for rule in rules) + "|\n)")
+        # Tells the rule a token has been matched by, every rule is a group of its own
+        self.rules_regex = re.compile("|".join(f"({rule.pattern})" for rule in rules))
+        if self.rules_regex.groups != len(rules):
+            raise ValueError("Lexer rule patterns must not contain capturing groups")
+        self.base_style = get_token_style(BASE_COLOR)
+        self.character_run_style = self.base_style | CHARACTER_RUN
+        self.styles = [get_token_style(rule.color) for rule in rules]
+        self.keyword_styles = [
+            {keyword: get_token_style(color) for keyword, color in rule.keywords.items()} if rule.keywords else None
+            for rule in rules
+        ]
+        self.unterminated_string_styles = {
+            style for rule, style in zip(rules, self.styles) if rule.is_unterminated_string
+        }
+        # The styles of the tokens by their text, the same text is always matched by the same rule. The text between
+        # the matches is never matched by a rule, so the runs of characters are kept along with them
+        self.token_styles = {"\n": self.base_style}
+
+    def get_rule_index(self, token):
+        # The first rule that matches the whole token is the one it has been matched by, as a rule before it
+        # would've matched the token as well. The text between the matches isn't matched by any of the rules
+        match = self.rules_regex.fullmatch(token)
+        return match.lastindex - 1 if match else None
+
+    def get_token_style(self, token):
+        index = self.get_rule_index(token)
+        if index is None:
+            style = self.character_run_style
+        else:
+            keyword_styles = self.keyword_styles[index]
+            style = keyword_styles.get(token, self.styles[index]) if keyword_styles else self.styles[index]
+        if len(self.token_styles) >= Lexer.CACHED_TOKEN_STYLES:
+            self.token_styles.clear()
+        self.token_styles[token] = style
+        return style
+
+    def split(self, text):
+        """Splits the text into the tokens, the line breaks are the "\\n" tokens. Returns the tokens and their styles"""
+        # The parts are the text before every match, which might be empty, and the match itself
+        tokens = list(filter(None, self.regex.split(text)))
+        try:
+            styles = list(map(self.token_styles.__getitem__, tokens))
+        except KeyError:
+            styles = list(map(self.token_styles.get, tokens))
+            for index in compress(count(), map(is_, styles, repeat(None))):
+                styles[index] = self.get_token_style(tokens[index])
+        return tokens, styles
+
+    def lex_lines(self, lines):
+        # Lexes the lines that have any text besides the whitespace, each of them as if it didn't start inside of
+        # a string. Returns the token lines and the states they end in
+        tokens, styles = self.split("\n".join(lines) + "\n")
+
+        # The tokens of every line end right before its line break. Its length is replaced by the negated length
+        # of the line, so the columns the tokens end at are counted from the start of their lines
+        lengths = list(map(len, tokens))
+        line_breaks = []
+        line_break = -1
+        find_line_break = tokens.index
+        for line_length in map(len, lines):
+            line_break = find_line_break("\n", line_break + 1)
+            lengths[line_break] = -line_length
+            line_breaks.append(line_break)
+        long_lines = max(map(len, lines), default=0) > MAX_SHORT_LINE_LENGTH
+        ends = array('I' if long_lines else 'H', list(accumulate(lengths)))
+        style_column = array('H', styles)
+
+        token_lines = []
+        # The slices are made again for each column instead of being kept, so that they're freed right away
+        line_starts = list(chain((0,), map(add, line_breaks, repeat(1))))
+        for line_ends, line_styles in zip(
+            map(ends.__getitem__, map(slice, line_starts, line_breaks)),
+            map(style_column.__getitem__, map(slice, line_starts, line_breaks))
+        ):
+            token_line = TokenLine.__new__(TokenLine)
+            token_line.ends = line_ends
+            token_line.styles = line_styles
+            token_lines.append(token_line)
+        if long_lines:
+            for index in compress(count(), map(MAX_SHORT_LINE_LENGTH.__ge__, map(len, lines))):
+                token_lines[index].ends = array('H', token_lines[index].ends)
+
+        # Only a token that ends the line can leave a string unterminated
+        states = [None] * len(lines)
+        last_tokens = list(map(add, line_breaks, repeat(-1)))
+        last_styles = map(styles.__getitem__, last_tokens)
+        for index in compress(count(), map(self.unterminated_string_styles.__contains__, last_styles)):
+            token = tokens[last_tokens[index]]
+            if self.rules[self.get_rule_index(token)].is_unterminated_string:
+                states[index] = token[0]
+        return token_lines, states
+
+    def parse_lines(self, lines, state):
+        """Lexes the lines that follow each other, the first one starting in the state. Returns their token lines
+        and the states they end in"""
+        token_lines = [EMPTY_TOKEN_LINE] * len(lines)
+        states = [None] * len(lines)
+        # The empty lines have no tokens and the blank ones are a single run of characters, only the others are lexed
+        text_indices = list(compress(count(), map(str.strip, lines)))
+        for index in compress(count(), map(str.isspace, lines)):
+            token_lines[index] = TokenLine.plain(len(lines[index]), self.base_style)
+        text_lines = list(map(lines.__getitem__, text_indices))
+
+        # The lines that repeat (e.g. the closing brackets) are only lexed once, their token lines are shared
+        unique_lines = list(dict.fromkeys(text_lines))
+        lexed_token_lines, lexed_states = self.lex_lines(unique_lines)
+        unique_indices = list(map(dict(zip(unique_lines, count())).__getitem__, text_lines))
+
+        # The lines that start inside of a string are lexed on their own, the ones that repeat only once as well
+        continued_lines = {}
+        next_line = 0
+        for index, line, token_line, line_state in zip(
+            text_indices, text_lines,
+            map(lexed_token_lines.__getitem__, unique_indices), map(lexed_states.__getitem__, unique_indices)
+        ):
+            if state:
+                # The empty and the blank lines before it are inside of the string as well
+                for blank_index in range(next_line, index):
+                    token_lines[blank_index], states[blank_index] = self.parse_line(lines[blank_index], state)
+                # The tokens of the line were split as if it didn't start inside of a string
+                continued_line = continued_lines.get((line, state))
+                if continued_line is None:
+                    continued_line = continued_lines[line, state] = self.parse_line(line, state)
+                token_lines[index], state = continued_line
+            else:
+                token_lines[index] = token_line
+                state = line_state
+            states[index] = state
+            next_line = index + 1
+        if state:
+            for blank_index in range(next_line, len(lines)):
+                token_lines[blank_index], states[blank_index] = self.parse_line(lines[blank_index], state)
+        return token_lines, states
+
+    def parse_line(self, line, state):
+        if not state:
+            (token_line,), (state,) = self.parse_lines((line,), state)
+            return token_line, state
+
+        # The line starts inside of a string literal that wasn't terminated on the previous line
+        position = line.find(state) + 1
+        if position == 0:
+            # The whole line is inside of the string, an empty one has no tokens at all
+            if not line:
+                return EMPTY_TOKEN_LINE, state
+            return TokenLine.from_columns(len(line), (len(line),), (STRING_LITERAL_STYLE,)), state
+        # The rest of the line is lexed on its own, its columns are moved past the string
+        (rest,), (state,) = self.parse_lines((line[position:],), None)
+        ends = chain((position,), map(add, rest.ends, repeat(position)))
+        return TokenLine.from_columns(len(line), ends, chain((STRING_LITERAL_STYLE,), rest.styles)), state
+
+
+def keyword_colors(*keywords_with_colors):
+    # Maps each of the words to its color, the words given first take precedence
+    colors = {}
+    for keywords, color in reversed(keywords_with_colors):
+        colors.update((keyword, color) for keyword in keywords)
+    return colors
+
 
 class BaseSyntaxHighlighter:
+    # Plain text highlighter, the languages provide the lexer built from their rules
+    LEXER = None
+    # The amount of lines lexed at a time, their text and tokens are kept in memory until they're all lexed
+    BATCH_LINES = 1000
+
     def __init__(self):
-        self.position = [0, 0]
-        self.lines_of_code = []
-
-    def reset_code(self, lines_of_code):
-        self.position = [0, 0]
-        self.lines_of_code = lines_of_code
-    
-    def prev_char(self):
-        self.position[0] -= 1
-        if self.position[0] < 0:
-            self.position[0] = 0
-            self.position[1] -= 1
-            if self.position[1] < 0:
-                self.position[1] = 0
-            else:
-                self.position[0] = len(self.lines_of_code[self.position[1]]) - 1
-                if self.position[0] < 0:
-                    self.position[0] = 0
-
-    def next_char(self, step_further=True):
-        if not self.lines_of_code[self.position[1]]:
-            new_line = self.position[1] + 1 < len(self.lines_of_code)
-            if step_further:
-                self.position[1] += 1
-            return "", self.position[1] >= len(self.lines_of_code) or (self.position[1] >= len(self.lines_of_code) and self.position[0] + 1 >= len(self.lines_of_code[self.position[1]])), new_line
-
-        char = self.lines_of_code[self.position[1]][self.position[0]]
-        is_new_line = False
-        if step_further:
-            self.position[0] += 1
-            if self.position[0] >= len(self.lines_of_code[self.position[1]]):
-                self.position[0] = 0
-                self.position[1] += 1
-                if self.position[1] >= len(self.lines_of_code):
-                    return char, True, False
-                is_new_line = True
-
-        return char, self.position[1] >= len(self.lines_of_code) and self.position[0] + 1 >= len(self.lines_of_code[self.position[1]]), is_new_line
+        # The lexer state at the end of every line. Lexing of a line depends only on its text and
+        # the state the previous line has ended with (e.g. an unterminated string literal)
+        self.line_states = []
 
     def parse_code(self, lines_of_code):
-        return [list(i) for i in lines_of_code]
-
-    def parse_literal(self, checker, color, skip_last_character=False):
-        tokens = []
-        text, is_end, is_new_line = self.next_char()
-        if is_new_line:
-            tokens.append(BufferToken(text, color, is_new_line=True))
-            text = ""
-        elif is_end:
-            tokens.append(BufferToken(text, color))
-            return tokens, True
-        while True:
-            char, is_end, is_new_line = self.next_char()
-            text += char
-            if is_new_line:
-                tokens.append(BufferToken(text, color, is_new_line=True))
-                text = ""
-            if is_end or checker(char):
-                if skip_last_character and checker(char):
-                    if is_new_line:
-                        tokens[-1].value = tokens[-1].value[:-1]
-                        tokens[-1].is_new_line = False
-                    else:
-                        text = text[:-1]
-                    is_end = False
-                    is_new_line = False
-                    self.prev_char()
-                break
-        if text or is_end:
-            tokens.append(BufferToken(text, color, is_new_line=is_new_line))
-        return tokens, is_end
-
-    def parse_singleline_comment(self, comment_sign=''):
-        # TODO: add check for substrings like TODO, XXX, FIXME, HACK, etc.
-
-        tokens = []
-        text, is_end, is_new_line = self.next_char()
-        text = comment_sign + text
-        if is_new_line or is_end:
-            tokens.append(BufferToken(text, COMMENT_COLOR, is_new_line=True))
-            return tokens, is_end
-        while True:
-            char, is_end, is_new_line = self.next_char()
-            text += char
-            if is_new_line:
-                tokens.append(BufferToken(text, COMMENT_COLOR, is_new_line=True))
-                text = ""
-            if is_end or is_new_line:
+        result = []
+        self.line_states = []
+        state = None
+        lines_of_code = iter(lines_of_code)
+        while lines := list(islice(lines_of_code, BaseSyntaxHighlighter.BATCH_LINES)):
+            tokens, states = self.parse_lines(lines, state)
+            result += tokens
+            self.line_states += states
+            state = states[-1]
+        return result
+
+    def update_code(self, lines_of_code, token_lines, first_line, removed_count, added_count):
+        """Re-lexes the code after the lines first_line...first_line + removed_count were replaced
+        by added_count lines. The lines are lexed until the state converges with the cached one"""
+        self.update_lines(lines_of_code, token_lines, first_line, removed_count, added_count)
+        return token_lines
+
+    def update_lines(self, lines_of_code, token_lines, first_line, removed_count, added_count, stop_line=None):
+        """Same as update_code, but the lexing stops at stop_line even if the state hasn't converged yet.
+        Returns the first line that wasn't lexed then, None if the state has converged or the code has ended"""
+        token_lines[first_line:first_line + removed_count] = [None] * added_count
+        self.line_states[first_line:first_line + removed_count] = [UNKNOWN_STATE] * added_count
+
+        state = self.line_states[first_line - 1] if first_line > 0 else None
+        line_index = first_line
+        # The added lines are all lexed, so they're lexed in batches, the lines after them one at a time
+        added_end = first_line + added_count if stop_line is None else min(first_line + added_count, stop_line)
+        while line_index < added_end:
+            batch_size = min(added_end - line_index, BaseSyntaxHighlighter.BATCH_LINES)
+            lines = list(islice(lines_of_code.iter_lines(line_index), batch_size))
+            tokens, states = self.parse_lines(lines, state)
+            token_lines[line_index:line_index + len(lines)] = tokens
+            self.line_states[line_index:line_index + len(lines)] = states
+            state = states[-1]
+            line_index += len(lines)
+
+        for line in lines_of_code.iter_lines(line_index):
+            if line_index == stop_line:
+                return line_index
+            tokens, state = self.parse_line(line, state)
+            token_lines[line_index] = tokens
+            previous_state = self.line_states[line_index]
+            self.line_states[line_index] = state
+            line_index += 1
+            if state == previous_state:
                 break
-        if text or is_end:
-            tokens.append(BufferToken(text, COMMENT_COLOR, is_new_line=is_new_line))
-        return tokens, is_end
+        return None
+
+    def parse_lines(self, lines, state):
+        """Lexes the lines that follow each other, the first one starting in the state. Returns their token lines
+        and the states they end in"""
+        if not self.LEXER:
+            # Every character is a token of its own, the lines of the same length share their token line
+            line_lengths = list(map(len, lines))
+            token_lines = {line_length: TokenLine.plain(line_length) for line_length in set(line_lengths)}
+            return list(map(token_lines.__getitem__, line_lengths)), [None] * len(lines)
+        return self.LEXER.parse_lines(lines, state)
+
+    def parse_line(self, line, state):
+        if not self.LEXER:
+            return TokenLine.plain(len(line)), None
+        return self.LEXER.parse_line(line, state)
 
 
 def get_syntax_highlighter_for_filename(filename: str):
@@ -125,5 +383,5 @@ def get_syntax_highlighter_for_filename(filename: str):
         if filename.endswith(".h") or filename.endswith(".hpp"):
             file_type = "C/C++ Header file"
         return CSyntaxHighlighter(), file_type
-    
+
     return BaseSyntaxHighlighter(), "text file"
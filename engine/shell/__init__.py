@@ -1,6 +1,7 @@
 
 from .editor_component import EditorViewportComponent
 from .terminal_component import TerminalViewportComponent
-from .buffer_component import BufferViewportComponent, BufferToken
+from .buffer_component import BufferViewportComponent
+from .token_line import TokenLine, TokenView, get_token_style
 from .buffer_mode import BufferMode
 from .status_bar import Statusbar
@@ -1,28 +1,27 @@
 import pygame
 
+from itertools import chain, islice, repeat
 from typing import List
 
 from utils import *
-from component import Component
+from component import Component, get_earliest_timeout
+from engine.document import DocumentType, create_document
 
 from .buffer_mode import BufferMode
+from .line_cache import LineSurfaceCache
+from .row_layer import RowLayer
+from .token_line import TOKEN_STYLES, TokenLine, is_space_token
 
 
-class BufferToken:
-    def __init__(self, value, color, background=(0, 0, 0), is_new_line=False):
-        self.value = value
-        self.color = color
-        self.background = background
-        self.is_new_line = is_new_line
-
-    def __repr__(self):
-        return f"Token[{self.value}, {self.color}, {self.background}, {self.is_new_line}]"
+class BufferViewportComponent(Component):
+    TRACKS_DAMAGE = True
 
+    # The amount of memory taken by the rendered lines
+    LINE_CACHE_SIZE = 32 * 1024 * 1024
 
-class BufferViewportComponent(Component):
     def __init__(self, app, enable_line_indicator=False):
         super().__init__(app)
-        self.base_lines = [""]
+        self.base_lines = self.create_document()
         self.token_lines = []
         self.text_scale = self.application.get_text_scale()
         self.scroll_offset = 5
@@ -32,10 +31,17 @@ class BufferViewportComponent(Component):
         self.previous_mode = None
         self.enable_line_indicator = enable_line_indicator
 
-        self.previous_lines_to_draw = None
-        self.cache_lines_surface = pygame.Surface((self.surface.get_width(), self.surface.get_height()), pygame.SRCALPHA)
-        # Amount of frames that needs to be forcefully drawn by the buffer without caching
-        self.forcefully_update_buffer = 4
+        # The rendered lines, so only the lines that have changed are drawn again every frame
+        self.line_surfaces = LineSurfaceCache(BufferViewportComponent.LINE_CACHE_SIZE)
+        # The visible lines and their numbers, composed onto the surface at lines_surface_x and 0
+        self.lines_layer = RowLayer(self.application.get_render_backend())
+        self.gutter_layer = RowLayer(self.application.get_render_backend())
+        self.lines_surface_x = 0
+        # The surface the layers were composed onto
+        self.composed_surface = None
+        self.previous_caret_rect = None
+        self.selection_overlay = None
+        self.previous_view_state = None
 
         self.selection = None
 
@@ -51,7 +57,45 @@ class BufferViewportComponent(Component):
 
         self.command_executor = self.application.get_command_executor()
 
-    def generate_tokens(self) -> List[List[BufferToken]]: ...
+    def get_memory_parts(self):
+        return {
+            "document": self.base_lines,
+            "tokens": [self.token_lines, self.syntax_highlighter],
+            **super().get_memory_parts(),
+            "render caches": [
+                self.line_surfaces, self.lines_layer, self.gutter_layer, self.composed_surface, self.selection_overlay
+            ],
+        }
+
+    def generate_tokens(self) -> List[TokenLine]:
+        # Only the lines touched by the edits since the previous call are lexed again
+        edited_range = self.base_lines.take_edited_range()
+        if edited_range is None:
+            return self.token_lines
+        with self.application.get_profiler().measure(f"lex {type(self.syntax_highlighter).__name__}"):
+            return self.syntax_highlighter.update_code(self.base_lines, self.token_lines, *edited_range)
+
+    def parse_document(self) -> List[TokenLine]:
+        # Lexes the whole document, e.g. when it has been replaced
+        self.base_lines.take_edited_range()
+        with self.application.get_profiler().measure(f"lex {type(self.syntax_highlighter).__name__}"):
+            return self.syntax_highlighter.parse_code(self.base_lines)
+
+    def get_token_lines(self, start, count):
+        # Returns the (text, tokens) pairs of the lines, the lines that weren't tokenized (yet) are plain text
+        text_lines = islice(self.base_lines.iter_lines(start), count)
+        token_lines = chain(self.token_lines[start:start + count], repeat(None))
+        return [
+            (text, TokenLine.plain(len(text)) if tokens is None else tokens)
+            for text, tokens in zip(text_lines, token_lines)
+        ]
+
+    def get_token_line(self, index):
+        return self.get_token_lines(index, 1)[0]
+
+    def create_document(self, text=""):
+        document_type = self.application.get_config_value("editor", "document_type", default=DocumentType.PIECE_TABLE.value)
+        return create_document(DocumentType(document_type), text)
 
     def start_selection(self, selection_to=None):
         self.set_mode(BufferMode.VISUAL)
@@ -72,6 +116,13 @@ class BufferViewportComponent(Component):
         if self.selection:
             self.selection[1] = selection_to
 
+    def get_selection_range(self):
+        # The selection spans from where it was started to the caret, returns its (start, end) in the document order
+        start_selection = tuple(self.selection[0][::-1])
+        end_selection = tuple(self.caret_position[::-1])
+        start_selection, end_selection = sorted((start_selection, end_selection))
+        return start_selection[::-1], end_selection[::-1]
+
     def get_status_bar(self):
         return self.application.status_bar
 
@@ -79,7 +130,7 @@ class BufferViewportComponent(Component):
         self.caret_height = self.application.get_font_driver().get_font_size()[1]
 
         self.caret_position[1] = max(min(self.caret_position[1], len(self.base_lines) - 1), 0)
-        self.caret_position[0] = max(min(self.caret_position[0], len(self.base_lines[self.caret_position[1]])), 0)
+        self.caret_position[0] = max(min(self.caret_position[0], self.base_lines.get_line_length(self.caret_position[1])), 0)
         
         if self.previous_mode is None:
             self.previous_mode = self.get_mode()
@@ -91,7 +142,7 @@ class BufferViewportComponent(Component):
 
         # Save current caret position in config
         if self.buffer_id:
-            self.application.store_config_value("last_caret_position", self.buffer_id, self.caret_position)
+            self.application.store_config_value("last_caret_position", self.buffer_id, self.caret_position.copy())
 
         # Also the scroll offset
         if self.buffer_id:
@@ -102,12 +153,27 @@ class BufferViewportComponent(Component):
                 self.last_x_caret_position]
             )
 
-        current_size = (self.surface.get_width(), self.surface.get_height())
-        if current_size != (self.cache_lines_surface.get_width(), self.cache_lines_surface.get_height()):
-            self.cache_lines_surface = pygame.Surface(current_size, pygame.SRCALPHA)
+        # The viewport is drawn again only when something it shows has changed, e.g. the text or the caret.
+        # The changes made by the input are handled by the application, which invalidates the components on the events
+        view_state = (
+            id(self.base_lines), self.base_lines.version, tuple(self.caret_position),
+            tuple(map(tuple, self.selection)) if self.selection else None,
+            self.is_focused, self.caret_blink_animation_flag,
+            self.text_scale, self.application.get_font_driver().font_type,
+        )
+        if view_state != self.previous_view_state:
+            self.previous_view_state = view_state
+            self.invalidate()
 
         return super().update(dt)
 
+    def get_update_timeout(self):
+        timeout = super().get_update_timeout()
+        if self.is_focused and self.caret_animation_speed > 0:
+            # The caret blinks once the animation goes over 2
+            timeout = get_earliest_timeout(timeout, max(2 - self.caret_blink_animation, 0) / self.caret_animation_speed)
+        return timeout
+
     def get_mode(self):
         return self.application.get_command_executor().get_mode()
 
@@ -116,12 +182,11 @@ class BufferViewportComponent(Component):
 
     def update_buffer(self, key, unicode, modifier, skip_letter_insert=False, is_text_updated=False):
         font_size = self.application.get_font_driver().get_font_size()
+        latency_tracker = self.application.get_latency_tracker()
         if self.previous_mode != self.get_mode():
             self.previous_mode = self.get_mode()
             return
 
-        if not self.base_lines:
-            self.base_lines.append("")
         self.caret_blink_animation = 0
         self.caret_blink_animation_flag = True
 
@@ -175,7 +240,7 @@ class BufferViewportComponent(Component):
                 self.caret_position[0] -= 1
                 if self.caret_position[0] < 0 and self.caret_position[1] > 0:
                     self.caret_position[1] = max(self.caret_position[1] - 1, 0)
-                    self.caret_position[0] = len(self.base_lines[self.caret_position[1]])
+                    self.caret_position[0] = self.base_lines.get_line_length(self.caret_position[1])
                 elif self.caret_position[0] < 0:
                     self.caret_position[0] = 0                    
                 self.last_x_caret_position = self.caret_position[0]
@@ -189,12 +254,15 @@ class BufferViewportComponent(Component):
                         self.caret_position[0] -= 1
                 self.last_x_caret_position = self.caret_position[0]
             elif key == pygame.K_UP:
+                latency_tracker.set_operation("scroll")
                 self.caret_position[1] -= 1
             elif key == pygame.K_DOWN:
+                latency_tracker.set_operation("scroll")
                 self.caret_position[1] += 1
           
         # Step further to the next line if in command mode (the same as pressing down arrow)
         if key == pygame.K_RETURN and self.get_mode() == BufferMode.COMMAND:
+            latency_tracker.set_operation("scroll")
             self.caret_position[1] += 1
         # Step further in the line if in command mode (the same as pressing right arrow)
 
@@ -202,12 +270,9 @@ class BufferViewportComponent(Component):
             # Remove the character after the caret if in insert mode
             is_text_updated = True
 
-            # If the caret is in the end of the line and we have a line below, connect it with the previous one
-            if self.caret_position[0] == len(line_text) and self.caret_position[1] < len(self.base_lines) - 1:
-                self.base_lines[self.caret_position[1]] += self.base_lines.pop(self.caret_position[1] + 1)
-            # If the caret is not in the end of the line, just remove a letter
-            else:
-                self.base_lines[self.caret_position[1]] = line_text[:self.caret_position[0]] + line_text[self.caret_position[0] + 1:]
+            # If the caret is in the end of the line and we have a line below, the line break is removed,
+            # so the line below gets connected with the current one. Otherwise just remove a letter
+            self.base_lines.delete(self.caret_position[1], self.caret_position[0], 1)
         elif key == pygame.K_BACKSPACE and self.get_mode() == BufferMode.INSERT:
             # Remove the character before the caret if in insert mode
             is_text_updated = True
@@ -215,32 +280,33 @@ class BufferViewportComponent(Component):
             # If the caret is not in the beginning of the line, just remove a letter
             if self.caret_position[0] > 0:
                 self.caret_position[0] -= 1
-                self.base_lines[self.caret_position[1]] = line_text[:self.caret_position[0]] + line_text[self.caret_position[0] + 1:]
+                self.base_lines.delete(self.caret_position[1], self.caret_position[0], 1)
             # Connect two lines otherwise
             elif self.caret_position[1] > 0:
-                self.caret_position[0] = len(self.base_lines[self.caret_position[1] - 1])
-                self.base_lines[self.caret_position[1] - 1] += self.base_lines[self.caret_position[1]]
-                self.base_lines.pop(self.caret_position[1])
+                self.caret_position[0] = self.base_lines.get_line_length(self.caret_position[1] - 1)
                 self.caret_position[1] -= 1
+                self.base_lines.delete(self.caret_position[1], self.caret_position[0], 1)
         elif key == pygame.K_DELETE and self.get_mode() == BufferMode.COMMAND:
             self.caret_position[0] += 1
-            self.caret_position[0] = max(min(self.caret_position[0], len(self.base_lines[self.caret_position[1]])), 0)
+            self.caret_position[0] = max(min(self.caret_position[0], self.base_lines.get_line_length(self.caret_position[1])), 0)
             self.last_x_caret_position = self.caret_position[0]
         elif key == pygame.K_BACKSPACE:
             # Step further in the line if in command mode (the same as pressing left arrow)
             if self.get_mode() == BufferMode.COMMAND:
                 self.caret_position[0] -= 1
-                self.caret_position[0] = max(min(self.caret_position[0], len(self.base_lines[self.caret_position[1]])), 0)
+                self.caret_position[0] = max(min(self.caret_position[0], self.base_lines.get_line_length(self.caret_position[1])), 0)
                 self.last_x_caret_position = self.caret_position[0]
         elif unicode.isalpha() or is_allowed_nonalpha_chars(unicode) and len(unicode) >= 1:
             if not skip_letter_insert:
                 if self.get_mode() == BufferMode.INSERT:
+                    latency_tracker.set_operation("insert")
                     is_text_updated = True
                     line_text = self.insert_at_current_caret(unicode)
         
         # If text was updated, parse it again
         if is_text_updated:
-            self.token_lines = self.generate_tokens()
+            with latency_tracker.measure("generate_tokens"):
+                self.token_lines = self.generate_tokens()
         
         # if currently in visual mode, set current visual position to current caret's position
         if self.get_mode() == BufferMode.VISUAL:
@@ -248,20 +314,12 @@ class BufferViewportComponent(Component):
         else:
             self.stop_selection()
 
-    def parse_token(self, token, color=(255, 255, 255), background=(0, 0, 0)):
-        result = token
-        if result.__class__ != str:
-            result = token.value
-            color = token.color
-            background = token.background
-        return result, color, background
-
     def step_next_literal(self):
+        text, tokens = self.get_token_line(self.caret_position[1])
         line_x_offset = 0
-        for token in self.token_lines[self.caret_position[1]]:
-            token, _, _ = self.parse_token(token)
-            line_x_offset += len(token)
-            if line_x_offset > self.caret_position[0] and token != " ":
+        for start, end, _ in tokens.iter_token_spans():
+            line_x_offset = end
+            if line_x_offset > self.caret_position[0] and not is_space_token(text, start, end):
                 self.caret_position[0] = line_x_offset
                 return
         
@@ -272,23 +330,22 @@ class BufferViewportComponent(Component):
             self.caret_position[1] = min(self.caret_position[1] + 1, len(self.base_lines) - 1)
 
     def step_previous_literal(self):
-        line_x_offset = len(self.base_lines[self.caret_position[1]])
-        for token in self.token_lines[self.caret_position[1]][::-1]:
-            token, _, _ = self.parse_token(token)
-            line_x_offset -= len(token)
-            if line_x_offset < self.caret_position[0] and token != " ":
-                self.caret_position[0] = line_x_offset
+        text, tokens = self.get_token_line(self.caret_position[1])
+        for start, end, _ in reversed(list(tokens.iter_token_spans())):
+            if start < self.caret_position[0] and not is_space_token(text, start, end):
+                self.caret_position[0] = start
                 return
 
         if self.caret_position[0] > 0:
             self.caret_position[0] = 0
         else:
             self.caret_position[1] = max(self.caret_position[1] - 1, 0)
-            self.caret_position[0] = len(self.base_lines[self.caret_position[1]])
+            self.caret_position[0] = self.base_lines.get_line_length(self.caret_position[1])
 
     def find_first_pattern(self, pattern):
         """Searches for first appearance in the code after current caret position"""
-        for idx, line in enumerate(self.base_lines[self.caret_position[1]:]):
+        self.application.get_latency_tracker().set_operation("search")
+        for idx, line in enumerate(self.base_lines.iter_lines(self.caret_position[1])):
             if (position := line.find(pattern)) != -1 and [position, idx + self.caret_position[1]] != self.caret_position:
                 self.caret_position[0] = position
                 self.caret_position[1] += idx
@@ -306,50 +363,36 @@ class BufferViewportComponent(Component):
         return False
 
     def insert_at_current_caret(self, text):
-        line_text = self.base_lines[self.caret_position[1]]
-        for char in text:
-            if char == "\n":
-                line_after_caret = self.base_lines[self.caret_position[1]][self.caret_position[0]:]
-                self.base_lines[self.caret_position[1]] = line_text = line_text[:self.caret_position[0]]
-                self.caret_position[0] = 0
-                self.caret_position[1] += 1
-                self.base_lines.insert(self.caret_position[1], line_after_caret)
-                continue
-
-            # Type the text into the buffer lines
-            self.base_lines[self.caret_position[1]] = line_text = line_text[:self.caret_position[0]] + char + line_text[self.caret_position[0]:]
-            self.caret_position[0] += 1
-        return line_text
+        # Type the text into the buffer and move the caret right after it
+        self.caret_position[1], self.caret_position[0] = self.base_lines.insert(self.caret_position[1], self.caret_position[0], text)
+        return self.base_lines[self.caret_position[1]]
     
     def set_caret_line(self, line):
         line -= 1
         if 0 <= line < len(self.base_lines):
             self.caret_position[1] = line
-            self.caret_position[0] = len(self.base_lines[self.caret_position[1]])
+            # The documents find the length from their line index, without building the line
+            self.caret_position[0] = self.base_lines.get_line_length(self.caret_position[1])
             self.center_caret_on_screen()
     
     def center_caret_on_screen(self):
         self.current_y_line_offset = max(self.caret_position[1] - self.get_amount_of_lines_surf_height() // 2, 0)
 
-    def propagate_event(self, event):
-        if event.type == pygame.VIDEORESIZE:
-            self.forcefully_update_buffer = 4
-
-        return super().propagate_event(event)
-    
     def key_down_event(self, key, unicode, modifier):
         self.key_pressed_event(key, unicode, modifier)
 
     def key_pressed_event(self, key, unicode, modifier):
-        self.update_buffer(key, unicode, modifier)
+        with self.application.get_latency_tracker().measure("update_buffer"):
+            self.update_buffer(key, unicode, modifier)
 
     def mouse_wheel_event(self, x, y):
+        self.application.get_latency_tracker().set_operation("scroll")
         # TODO: I need to reverse the scrolling direction.
         #       I dunno if that's because i am on mac or thats's how
         #       things needs to be done.
         scroll_direction = y * -1 + self.caret_position[1]
         self.caret_position[1] = max(min(scroll_direction, len(self.base_lines) - 1), 1)
-        self.caret_position[0] = len(self.base_lines[self.caret_position[1]])
+        self.caret_position[0] = self.base_lines.get_line_length(self.caret_position[1])
         return super().mouse_wheel_event(x, y)
 
     def mouse_down_event(self, button, x, y):
@@ -392,6 +435,46 @@ class BufferViewportComponent(Component):
     def get_cursor(self):
         return pygame.SYSTEM_CURSOR_IBEAM
 
+    def get_line_surface(self, text, tokens, line_x_offset):
+        font_size = self.application.get_font_driver().get_font_size()
+        char_width = font_size[0] * self.text_scale
+        visible_length = min(len(text) - line_x_offset, self.surface.get_width() // char_width + 1)
+        if visible_length <= 0:
+            return None
+
+        # Only the visible part of the line makes the key, so building it takes no longer than drawing that part.
+        # The runs of the neighbouring tokens of the same style are drawn at once
+        visible_end = line_x_offset + visible_length
+        runs = tuple(
+            (start - line_x_offset, end - line_x_offset, style)
+            for start, end, style in tokens.iter_runs(line_x_offset, visible_end)
+        )
+        key = (text[line_x_offset:visible_end], runs, self.text_scale, self.application.get_font_driver().font_type)
+        line_surface = self.line_surfaces.get(key)
+        if line_surface is None:
+            with self.application.get_profiler().measure("render line"):
+                line_surface = self.render_line(key[0], runs)
+            self.line_surfaces.put(key, line_surface)
+        return line_surface
+
+    def render_line(self, text, runs):
+        # Draws the visible part of the line onto a surface of its own
+        font_size = self.application.get_font_driver().get_font_size()
+        char_width = font_size[0] * self.text_scale
+        line_surface = self.application.get_render_backend().create_canvas(
+            (len(text) * char_width, font_size[1] * self.text_scale)
+        )
+        for start, end, style in runs:
+            color, background = TOKEN_STYLES[style]
+            self.application.font_driver.draw_text(
+                line_surface,
+                text[start:end],
+                color, background,
+                start * char_width, 0,
+                pixel_size=(self.text_scale, self.text_scale),
+            )
+        return line_surface
+
     def get_amount_of_lines_surf_height(self):
         font_size = self.application.get_font_driver().get_font_size()
         return round(self.surface.get_height() / (font_size[1] * self.text_scale))
@@ -424,140 +507,144 @@ class BufferViewportComponent(Component):
         self.previous_y_line_offset = y_line_offset
 
         # Get list of lines of texts relative to current caret position
-        lines_to_draw = self.token_lines[self.current_y_line_offset:self.current_y_line_offset + amount_of_lines_surf_height + 1]
-
-        # Draw the lines of text
-        new_lines_indicator_width = 1
-
-        # Draw line numbers indicator on the left
-        if self.enable_line_indicator:
-            for line_number, tokens in enumerate(lines_to_draw):
-                y_offset = line_number * font_size[1] * self.text_scale
-                line_number += self.current_y_line_offset
-                line_indicator_color = (170, 170, 170)
-
-                if line_number == self.caret_position[1]:
-                    line_indicator_color = (255, 255, 255)
-
-                # Draw the line indicator
-                line_indicator_len = ((self.lines_indicator_x_offset - 4) * self.text_scale) // font_size[0] * self.text_scale
-                line_indicator_text = str(line_number + 1)
-                line_indicator_text = " " * (line_indicator_len - len(line_indicator_text)) + line_indicator_text
-                line_indicator_width, _ = self.application.font_driver.draw_text(
-                    self.surface,
-                    line_indicator_text,
-                    line_indicator_color,
-                    (0, 0, 0),
-                    0, y_offset,
-                    pixel_size=(self.text_scale, self.text_scale)
-                )
-                pygame.draw.rect(
-                    self.surface,
-                    line_indicator_color,
-                    ((self.lines_indicator_x_offset - 4) * self.text_scale, y_offset,
-                    int(1.5 * self.text_scale), font_size[1] * self.text_scale)
-                )
-
-                # Dynamically update the lines indicator offset based on the width of the line number string
-                line_indicator_width += 5
-                if line_indicator_width > new_lines_indicator_width:
-                    new_lines_indicator_width = line_indicator_width
-                    if self.lines_indicator_x_offset == 0:
-                        self.lines_indicator_x_offset = new_lines_indicator_width
-
-        # Only redraw the lines if they has updated
+        rows = amount_of_lines_surf_height + 1
+        lines_to_draw = self.get_token_lines(self.current_y_line_offset, rows)
         line_x_offset = max(int(self.caret_position[0] - amount_of_lines_surf_width * 0.8), 0)
-        # TODO: fix the condition below, so we don't redraw the whole text every frame
-        if True or self.previous_lines_to_draw != lines_to_draw or self.forcefully_update_buffer > 0:
-            self.forcefully_update_buffer -= 1
-            self.forcefully_update_buffer = max(self.forcefully_update_buffer, 0)
-            self.cache_lines_surface.fill((0, 0, 0, 255))
-            self.previous_lines_to_draw = lines_to_draw
-            for line_number, tokens in enumerate(lines_to_draw):
-                total_line_length = 0
-                x_offset = 0
-                y_offset = line_number * font_size[1] * self.text_scale
-
-                for token in tokens:
-                    line, color, background = self.parse_token(token, (255, 255, 255), (0, 0, 0))
-                    line_length = len(line)
-                    if total_line_length < line_x_offset:
-                        line = line[line_x_offset - total_line_length:]
-                    offset = 0
-                    if line:
-                        # Draw the line
-                        offset, _ = self.application.font_driver.draw_text(
-                            self.cache_lines_surface,
-                            line,
-                            color, background,
-                            x_offset, y_offset,
-                            pixel_size=(self.text_scale, self.text_scale),
-                        )
-                    else:
-                        # Make the line not empty in case a selection is applied below
-                        line = " "
-                    
-                    # If the current token position is inside the selection, change background
-                    if self.selection:
-                        start_selection, end_selection = self.selection
-                        selection_y_offset = line_number + self.current_y_line_offset
-
-                        for idx_offset, _ in enumerate(line):
-                            selection_x_offset = total_line_length + idx_offset
-
-                            # The conditions below are madness, i don't wanna deal with that anymore...
-                            # For sure there's a more clever solution to that, but that's what i came
-                            # up with as of right now
-
-                            # Selection that goes below the start_selection line
-                            if start_selection[0] <= selection_x_offset or start_selection[1] < selection_y_offset:
-                                selection_x_offset += 1
-
-                                if (end_selection[0] >= selection_x_offset >= start_selection[0] and selection_y_offset == start_selection[1] == self.caret_position[1]) or \
-                                        (end_selection[0] >= selection_x_offset and selection_y_offset == self.caret_position[1] != start_selection[1]) or \
-                                        (selection_x_offset >= start_selection[0] and selection_y_offset == start_selection[1] < self.caret_position[1]) or \
-                                        (self.caret_position[1] > start_selection[1] and selection_y_offset < self.caret_position[1] and selection_y_offset > start_selection[1]):
-                                    draw_transparent_rect(
-                                        self.cache_lines_surface,
-                                        (255, 255, 255, 120),
-                                        (x_offset + idx_offset * font_size[0] * self.text_scale,
-                                        y_offset,
-                                        font_size[0] * self.text_scale,
-                                        font_size[1] * self.text_scale)
-                                    )
-                            # Selection that goes above the start_selection line
-                            elif (self.caret_position[0] < start_selection[0] and self.caret_position[1] == start_selection[1] == selection_y_offset) or \
-                                self.caret_position[1] < start_selection[1]:
-                                # if (end_selection[0] >= selection_x_offset >= start_selection[0] and selection_y_offset == start_selection[1] == self.caret_position[1]) or \
-                                #         (end_selection[0] >= selection_x_offset and selection_y_offset == self.caret_position[1] != start_selection[1]) or \
-                                #         (selection_x_offset >= start_selection[0] and selection_y_offset == start_selection[1] < self.caret_position[1]) or \
-                                #         (self.caret_position[1] > start_selection[1] and selection_y_offset < self.caret_position[1] and selection_y_offset > start_selection[1]):
-                                    draw_transparent_rect(
-                                        self.cache_lines_surface,
-                                        (255, 255, 255, 120),
-                                        (x_offset + idx_offset * font_size[0] * self.text_scale,
-                                        y_offset,
-                                        font_size[0] * self.text_scale,
-                                        font_size[1] * self.text_scale)
-                                    )
-                    total_line_length += line_length
-                    x_offset += offset * self.text_scale
-            self.lines_indicator_x_offset = new_lines_indicator_width
-
-        # Draw the lines
+        font_type = self.application.get_font_driver().font_type
+        row_height = font_size[1] * self.text_scale
+
+        # What is drawn on every row: the rendered line with the selected part of it, and the line number with its color
+        line_rows = [
+            (self.get_line_surface(text, tokens, line_x_offset), selection_span)
+            for (text, tokens), selection_span in zip(lines_to_draw, self.get_selection_spans(lines_to_draw, line_x_offset))
+        ]
+        line_rows += [None] * (rows - len(line_rows))
+        gutter_rows = [None] * rows
         if self.enable_line_indicator:
-            self.surface.blit(self.cache_lines_surface, (self.lines_indicator_x_offset * self.text_scale, 0))
-        else:
-            self.surface.blit(self.cache_lines_surface, (0, 0))
-
-        # Draw the caret at its current position
-        if self.caret_blink_animation_flag and self.is_focused:
-            pygame.draw.rect(
-                self.surface,
-                (255, 255, 255),
-                ((self.caret_position[0] - line_x_offset) * font_size[0] * self.text_scale + self.lines_indicator_x_offset * self.text_scale,
-                 self.caret_position[1] * font_size[1] * self.text_scale + font_size[1] * self.text_scale - self.caret_height * self.text_scale - self.current_y_line_offset * font_size[1] * self.text_scale,
-                self.caret_width * self.text_scale, self.caret_height * self.text_scale)
+            for row in range(len(lines_to_draw)):
+                line_number = row + self.current_y_line_offset
+                gutter_rows[row] = (line_number, (255, 255, 255) if line_number == self.caret_position[1] else (170, 170, 170))
+        self.lines_indicator_x_offset = self.get_lines_indicator_width(gutter_rows)
+        lines_surface_x = self.lines_indicator_x_offset * self.text_scale if self.enable_line_indicator else 0
+
+        # The lines and their numbers are drawn into the layers of their own, only the rows that have changed are drawn again
+        lines_damage = self.lines_layer.update(
+            self.surface.get_size(), (self.text_scale, font_type, line_x_offset),
+            self.current_y_line_offset, line_rows, row_height, self.draw_line_row
+        )
+        gutter_damage = []
+        if self.enable_line_indicator:
+            gutter_damage = self.gutter_layer.update(
+                (lines_surface_x, self.surface.get_height()), (self.text_scale, font_type),
+                self.current_y_line_offset, gutter_rows, row_height, self.draw_gutter_row
             )
 
+        render_backend = self.application.get_render_backend()
+        if self.surface is not self.composed_surface or lines_surface_x != self.lines_surface_x:
+            # Everything has moved, compose the layers from scratch
+            self.composed_surface = self.surface
+            self.lines_surface_x = lines_surface_x
+            render_backend.fill(self.surface, (0, 0, 0))
+            if self.enable_line_indicator:
+                render_backend.blit(self.surface, self.gutter_layer.surface, (0, 0))
+            render_backend.blit(self.surface, self.lines_layer.surface, (self.lines_surface_x, 0))
+            self.add_damage()
+            # The caret was erased along with everything else
+            self.previous_caret_rect = None
+        else:
+            for rect in gutter_damage:
+                render_backend.blit(self.surface, self.gutter_layer.surface, rect, rect)
+                self.add_damage(rect)
+            for rect in lines_damage:
+                render_backend.blit(self.surface, self.lines_layer.surface, rect.move(self.lines_surface_x, 0), rect)
+                self.add_damage(rect.move(self.lines_surface_x, 0))
+
+        self.draw_caret(self.get_caret_rect(line_x_offset) if self.caret_blink_animation_flag and self.is_focused else None)
+
         return super().draw()
+
+    def get_lines_indicator_width(self, gutter_rows):
+        # Wide enough for the longest of the line numbers and the bar next to them. It doesn't shrink back
+        # when scrolling up, so the lines don't jump sideways, until the offset is reset to 0
+        font_width = self.application.get_font_driver().get_font_size()[0]
+        digits = max((len(str(gutter_row[0] + 1)) for gutter_row in gutter_rows if gutter_row is not None), default=0)
+        if not digits:
+            return 1
+        digits = max(digits, (self.lines_indicator_x_offset - 5) // font_width)
+        return digits * font_width + 5
+
+    def draw_line_row(self, surface, row, line_row):
+        line_surface, selection_span = line_row
+        row_height = self.application.get_font_driver().get_font_size()[1] * self.text_scale
+        render_backend = self.application.get_render_backend()
+        if line_surface is not None:
+            render_backend.blit(surface, line_surface, (0, row * row_height))
+        if selection_span is not None:
+            x, selection_width = selection_span
+            # The overlay covers a whole row and is reused for all the selected parts of the rows
+            if self.selection_overlay is None or self.selection_overlay.get_size() != (surface.get_width(), row_height):
+                self.selection_overlay = render_backend.create_canvas((surface.get_width(), row_height))
+                render_backend.fill(self.selection_overlay, (255, 255, 255, 120))
+            render_backend.blit(surface, self.selection_overlay, (x, row * row_height), (0, 0, selection_width, row_height))
+
+    def draw_gutter_row(self, surface, row, gutter_row):
+        line_number, line_indicator_color = gutter_row
+        font_size = self.application.get_font_driver().get_font_size()
+        y_offset = row * font_size[1] * self.text_scale
+
+        # The line numbers are aligned to the right
+        line_indicator_len = (self.lines_indicator_x_offset - 5) // font_size[0]
+        self.application.font_driver.draw_text(
+            surface,
+            str(line_number + 1).rjust(line_indicator_len),
+            line_indicator_color,
+            (0, 0, 0),
+            0, y_offset,
+            pixel_size=(self.text_scale, self.text_scale)
+        )
+        self.application.get_render_backend().draw_rect(
+            surface,
+            line_indicator_color,
+            ((self.lines_indicator_x_offset - 4) * self.text_scale, y_offset,
+            int(1.5 * self.text_scale), font_size[1] * self.text_scale)
+        )
+
+    def get_selection_spans(self, lines_to_draw, line_x_offset):
+        # The (x, width) of the selected part of every line, in pixels of the lines layer
+        selection_spans = [None] * len(lines_to_draw)
+        if not self.selection:
+            return selection_spans
+
+        char_width = self.application.get_font_driver().get_font_size()[0] * self.text_scale
+        (start_column, start_line), (end_column, end_line) = self.get_selection_range()
+        for row, (text, _) in enumerate(lines_to_draw):
+            line_number = row + self.current_y_line_offset
+            if not start_line <= line_number <= end_line:
+                continue
+            start = max(start_column if line_number == start_line else 0, line_x_offset)
+            end = min(end_column if line_number == end_line else len(text), len(text))
+            if start < end:
+                selection_spans[row] = ((start - line_x_offset) * char_width, (end - start) * char_width)
+        return selection_spans
+
+    def get_caret_rect(self, line_x_offset):
+        font_size = self.application.get_font_driver().get_font_size()
+        return pygame.Rect(
+            (self.caret_position[0] - line_x_offset) * font_size[0] * self.text_scale + self.lines_indicator_x_offset * self.text_scale,
+            self.caret_position[1] * font_size[1] * self.text_scale + font_size[1] * self.text_scale - self.caret_height * self.text_scale - self.current_y_line_offset * font_size[1] * self.text_scale,
+            self.caret_width * self.text_scale, self.caret_height * self.text_scale
+        )
+
+    def draw_caret(self, caret_rect):
+        # Erases the caret drawn on the previous frame by restoring the lines under it, then draws it at its current position
+        render_backend = self.application.get_render_backend()
+        if self.previous_caret_rect:
+            render_backend.blit(
+                self.surface, self.lines_layer.surface,
+                self.previous_caret_rect, self.previous_caret_rect.move(-self.lines_surface_x, 0)
+            )
+            self.add_damage(self.previous_caret_rect)
+        if caret_rect:
+            render_backend.draw_rect(self.surface, (255, 255, 255), caret_rect)
+            self.add_damage(caret_rect)
+        self.previous_caret_rect = caret_rect
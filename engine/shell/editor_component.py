@@ -1,14 +1,26 @@
 import pygame
 import os
-import pyperclip
 
-from engine.lang import BaseSyntaxHighlighter, get_syntax_highlighter_for_filename
+from itertools import islice
+from queue import Empty
+
+from engine.lang import BaseSyntaxHighlighter, HighlightJob, UNKNOWN_STATE, get_syntax_highlighter_for_filename
+from engine.document import DocumentType, MappedFileDocument, create_document
 
 from .buffer_component import BufferViewportComponent
 from .buffer_mode import BufferMode
 
 
 class EditorViewportComponent(BufferViewportComponent):
+    # Files larger than that (in bytes) are loaded into a rope and aren't syntax highlighted
+    DEFAULT_ROPE_THRESHOLD = 32 * 1024 * 1024
+    # Files larger than that are memory mapped and loaded lazily
+    DEFAULT_LAZY_LOAD_THRESHOLD = 256 * 1024 * 1024
+    # Files with more lines than that are highlighted in the background
+    DEFAULT_BACKGROUND_HIGHLIGHT_THRESHOLD = 5000
+    # The lines of a large file lexed right away after an edit, the job lexes the rest
+    SYNC_HIGHLIGHT_LINES = 1000
+
     def __init__(self, app):
         super().__init__(app, enable_line_indicator=True)
         self.filename = "unnamed.txt"
@@ -16,16 +28,202 @@ class EditorViewportComponent(BufferViewportComponent):
         self.is_unsaved = False
         self.shortcut_count = {}
         self.syntax_highlighter = BaseSyntaxHighlighter()
-        self.token_lines = self.syntax_highlighter.parse_code(self.base_lines)
+        self.is_highlighting_enabled = True
+        self.highlight_job = None
+        # All the lines before that one are tokenized by the highlight job
+        self.highlight_frontier = 0
+        # The lines before that one have been fed to the job
+        self.highlight_fed_line = 0
+        # How many lines have been added (or removed) above the frontier since the job has started
+        self.highlight_line_shift = 0
+        # The lines past the frontier keep the states lexed before, up to the last of these lines. The states
+        # between two of them follow each other, so the job can stop at the next one once its states converge
+        self.highlight_resume_lines = []
+        self.is_highlight_job_edited = False
+        self.token_lines = self.parse_document()
 
         last_opened_file = app.get_config_value("editor", "last_opened_file")
         if last_opened_file and os.path.isfile(last_opened_file):
             self.open_file(last_opened_file)
 
+    def get_profile_name(self):
+        return f"Editor({os.path.basename(self.filename)})"
+
+    def get_memory_parts(self):
+        # The job keeps the lines fed to it until it has lexed them
+        return {**super().get_memory_parts(), "highlight job": self.highlight_job}
+
     def generate_tokens(self):
-        return self.syntax_highlighter.parse_code(self.base_lines)
+        if not self.is_highlighting_enabled:
+            # The lines are drawn as plain text straight from the document
+            self.base_lines.take_edited_range()
+            return []
+        if self.base_lines.edited_range and (self.highlight_job or len(self.base_lines) > self.get_background_highlight_threshold()):
+            self.update_highlighting(*self.base_lines.take_edited_range())
+            return self.token_lines
+        return super().generate_tokens()
+
+    def get_background_highlight_threshold(self):
+        return self.application.get_config_value("editor", "background_highlight_threshold", default=EditorViewportComponent.DEFAULT_BACKGROUND_HIGHLIGHT_THRESHOLD)
+
+    def update_highlighting(self, first_line, removed_count, added_count):
+        """Re-lexes the lines of a large document after the lines first_line...first_line + removed_count were replaced
+        by added_count lines. At most SYNC_HIGHLIGHT_LINES are lexed right away, if their states don't converge with
+        the ones lexed before by then, the job goes on from there"""
+        if self.highlight_job and first_line + removed_count > self.highlight_frontier:
+            # The job hasn't lexed the edited lines yet, it only has to start over if it has been fed them already
+            if first_line < self.highlight_job.visible_end + self.highlight_line_shift:
+                # The speculative tokens of the visible lines would land on the edited or the moved lines
+                self.is_highlight_job_edited = True
+            self.token_lines[first_line:first_line + removed_count] = [None] * added_count
+            self.syntax_highlighter.line_states[first_line:first_line + removed_count] = [UNKNOWN_STATE] * added_count
+            if self.highlight_resume_lines and first_line < self.highlight_resume_lines[-1]:
+                # The states past the edited lines don't follow the ones before them anymore
+                line_shift = added_count - removed_count
+                resume_lines = {
+                    i if i < first_line else max(i + line_shift, first_line) for i in self.highlight_resume_lines
+                }
+                self.highlight_resume_lines = sorted(resume_lines | {first_line})
+            if first_line < self.highlight_fed_line:
+                self.start_highlight_job(min(self.highlight_frontier, first_line), self.highlight_resume_lines)
+            return
+
+        if self.highlight_job:
+            # The edit is above the lines the job is lexing, they've only moved
+            line_shift = added_count - removed_count
+            self.highlight_frontier += line_shift
+            self.highlight_fed_line += line_shift
+            self.highlight_line_shift += line_shift
+            self.highlight_resume_lines = [i + line_shift for i in self.highlight_resume_lines]
+            self.is_highlight_job_edited = True
+        frontier = self.highlight_frontier if self.highlight_job else len(self.base_lines)
+        with self.application.get_profiler().measure(f"lex {type(self.syntax_highlighter).__name__}"):
+            stop_line = self.syntax_highlighter.update_lines(
+                self.base_lines, self.token_lines, first_line, removed_count, added_count,
+                min(frontier, first_line + added_count + EditorViewportComponent.SYNC_HIGHLIGHT_LINES),
+            )
+        if stop_line is None:
+            return
+        # The lines from stop_line on keep the states lexed before, until the new ones converge with them
+        resume_lines = self.highlight_resume_lines if self.highlight_job else []
+        if stop_line < frontier:
+            resume_lines = [frontier] + [i for i in resume_lines if i > frontier]
+        self.start_highlight_job(stop_line, resume_lines)
+
+    def highlight_document(self):
+        self.stop_highlight_job()
+        if not self.is_highlighting_enabled:
+            self.base_lines.take_edited_range()
+            self.token_lines = []
+            return
+
+        if len(self.base_lines) <= self.get_background_highlight_threshold():
+            self.token_lines = self.parse_document()
+            return
+
+        # Draw the lines as plain text until the job tokenizes them
+        self.base_lines.take_edited_range()
+        self.token_lines = [None] * len(self.base_lines)
+        self.syntax_highlighter.line_states = [UNKNOWN_STATE] * len(self.base_lines)
+        visible_lines = list(islice(self.base_lines.iter_lines(self.current_y_line_offset), self.get_amount_of_lines_surf_height()))
+        self.start_highlight_job(0, visible_lines=visible_lines)
+
+    def start_highlight_job(self, first_line, resume_lines=(), visible_lines=()):
+        """Starts lexing the document from first_line in the background. The lines up to the last of the resume lines
+        keep the states lexed before, the job stops as soon as its states converge with them"""
+        self.stop_highlight_job()
+        self.highlight_frontier = first_line
+        self.highlight_fed_line = first_line
+        self.highlight_line_shift = 0
+        self.highlight_resume_lines = list(resume_lines)
+        self.is_highlight_job_edited = False
+        self.highlight_job = HighlightJob(
+            self.syntax_highlighter,
+            first_line,
+            self.syntax_highlighter.line_states[first_line - 1] if first_line > 0 else None,
+            self.current_y_line_offset,
+            visible_lines,
+            on_result=self.application.wake_up,
+            profiler=self.application.get_profiler(),
+        )
+        self.feed_highlight_job()
+
+    def stop_highlight_job(self):
+        if self.highlight_job:
+            self.highlight_job.cancel()
+            self.highlight_job = None
+
+    def feed_highlight_job(self):
+        # The lines are copied a chunk at a time, a few chunks ahead of the lexing, so that
+        # an edit never copies the rest of the document
+        while not self.highlight_job.is_fed and self.highlight_fed_line - self.highlight_frontier < HighlightJob.FEED_AHEAD:
+            lines = list(islice(self.base_lines.iter_lines(self.highlight_fed_line), HighlightJob.CHUNK_SIZE))
+            if not lines:
+                self.highlight_job.finish_feeding()
+                break
+            self.highlight_job.feed(lines)
+            self.highlight_fed_line += len(lines)
+
+    def find_converged_line(self, first_line, line_states):
+        # Returns the first of the lines whose new state is the same as the one lexed before, if any
+        previous_states = self.syntax_highlighter.line_states
+        for line_index, state in enumerate(line_states, first_line):
+            while self.highlight_resume_lines and line_index >= self.highlight_resume_lines[0]:
+                # The states past it were lexed from the other ones
+                self.highlight_resume_lines.pop(0)
+            if not self.highlight_resume_lines:
+                # Nothing was lexed past the lines, the job goes on to the end
+                return None
+            if state == previous_states[line_index]:
+                return line_index
+        return None
+
+    def apply_highlight_results(self, wait=False):
+        # Applies the results the job has put so far, or all of them once the job is done if wait is set
+        while self.highlight_job:
+            self.feed_highlight_job()
+            try:
+                result = self.highlight_job.results.get(block=wait)
+            except Empty:
+                break
+            if result is None:
+                self.highlight_job = None
+                break
+            first_line, token_lines, line_states = result
+            # The lines might've moved since the job got them
+            first_line += self.highlight_line_shift
+            self.invalidate()
+            if line_states is None:
+                # The speculative tokens of the lines that have been edited since would be wrong
+                if not self.is_highlight_job_edited:
+                    self.token_lines[first_line:first_line + len(token_lines)] = token_lines
+                continue
+
+            converged_line = self.find_converged_line(first_line, line_states)
+            count = len(line_states) if converged_line is None else converged_line - first_line + 1
+            self.token_lines[first_line:first_line + count] = token_lines[:count]
+            self.syntax_highlighter.line_states[first_line:first_line + count] = line_states[:count]
+            self.highlight_frontier = first_line + count
+            if converged_line is not None:
+                # The lines up to the next resume line are the same as they were lexed before, go on from there
+                resume_line, *resume_lines = self.highlight_resume_lines
+                self.stop_highlight_job()
+                self.highlight_frontier = resume_line
+                if resume_line < len(self.base_lines):
+                    self.start_highlight_job(resume_line, resume_lines)
+
+    def update(self, dt):
+        # Apply the highlighting done in the background before the frame is drawn
+        self.apply_highlight_results(wait=self.application.is_waiting_for_background_jobs)
+        return super().update(dt)
+
+    def get_update_timeout(self):
+        if self.highlight_job and not self.highlight_job.results.empty():
+            return 0
+        return super().get_update_timeout()
 
     def open_file(self, filename):
+        self.base_lines.close()
         self.buffer_id = f"editor_{filename}"
         self.caret_position = self.application.get_config_value("last_caret_position", self.buffer_id, default=[0, 0])
         self.current_y_line_offset, \
@@ -36,8 +234,9 @@ class EditorViewportComponent(BufferViewportComponent):
 
         if not os.path.isfile(filename):
             # Open it as a new file
-            self.base_lines = [""]
-            self.token_lines = self.syntax_highlighter.parse_code(self.base_lines)
+            self.base_lines = self.create_document()
+            self.is_highlighting_enabled = True
+            self.highlight_document()
             self.application.remove_config_value("editor", "last_opened_file")
             return
 
@@ -45,13 +244,47 @@ class EditorViewportComponent(BufferViewportComponent):
         self.load_file()
 
     def load_file(self):
-        with open(self.filename, "r") as file:
-            self.base_lines = file.read().split("\n")
-            self.token_lines = self.syntax_highlighter.parse_code(self.base_lines)
+        file_size = os.path.getsize(self.filename)
+        rope_threshold = self.application.get_config_value("editor", "rope_threshold", default=EditorViewportComponent.DEFAULT_ROPE_THRESHOLD)
+        lazy_load_threshold = self.application.get_config_value("editor", "lazy_load_threshold", default=EditorViewportComponent.DEFAULT_LAZY_LOAD_THRESHOLD)
+
+        if file_size > lazy_load_threshold:
+            self.base_lines = MappedFileDocument(self.filename)
+        else:
+            with open(self.filename, "r") as file:
+                if file_size > rope_threshold:
+                    self.base_lines = create_document(DocumentType.ROPE, file.read())
+                else:
+                    self.base_lines = self.create_document(file.read())
+        # Tokenizing the whole file upfront would take too long for the large ones
+        self.is_highlighting_enabled = file_size <= rope_threshold
+        self.highlight_document()
 
     def save_file(self):
-        with open(self.filename, "w") as file:
-            file.write('\n'.join(self.base_lines))
+        if isinstance(self.base_lines, MappedFileDocument):
+            # The document reads the unchanged lines from the mapped file while it's being written,
+            # so write it to a temporary file first and then replace the original one
+            temporary_filename = f"{self.filename}.save"
+            try:
+                with open(temporary_filename, "w", encoding=self.base_lines.encoding) as file:
+                    self.base_lines.write_to(file)
+            except OSError:
+                # The original file is left as it was, the document still reads from it
+                if os.path.exists(temporary_filename):
+                    os.remove(temporary_filename)
+                raise
+            # Windows doesn't allow replacing a file that is mapped or open, so the document is closed first,
+            # then it's opened again below from the saved file
+            self.base_lines.close()
+            try:
+                os.replace(temporary_filename, self.filename)
+            except OSError:
+                # The text is kept in the temporary file, the original file is opened again as it was
+                self.open_file(self.filename)
+                raise
+        else:
+            with open(self.filename, "w") as file:
+                self.base_lines.write_to(file)
         self.is_unsaved = False
 
         # Re-open the file, because we might have saved a new file.
@@ -69,8 +302,9 @@ class EditorViewportComponent(BufferViewportComponent):
         return whitespaces_count
 
     def update_buffer(self, key, unicode, modifier):
+        latency_tracker = self.application.get_latency_tracker()
         self.caret_position[1] = max(min(self.caret_position[1], len(self.base_lines) - 1), 0)
-        self.caret_position[0] = max(min(self.caret_position[0], len(self.base_lines[self.caret_position[1]])), 0)
+        self.caret_position[0] = max(min(self.caret_position[0], self.base_lines.get_line_length(self.caret_position[1])), 0)
         should_rerender = False
         is_text_updated = False
         skip_letter_insert = False
@@ -84,9 +318,10 @@ class EditorViewportComponent(BufferViewportComponent):
         # Paste from clipboard if the 'v' letter is pressed and a modifier is pressed
         # or if just 'p' is pressed in COMMAND mode
         if (key == pygame.K_v and self.get_mode() == BufferMode.INSERT and (modifier & pygame.KMOD_CTRL or modifier & pygame.KMOD_LMETA)) or (key == pygame.K_p and self.get_mode() == BufferMode.COMMAND):
+            latency_tracker.set_operation("paste")
             is_text_updated = True
             skip_letter_insert = True
-            text = pyperclip.paste()
+            text = self.application.get_clipboard().paste()
             self.insert_at_current_caret(text)
             self.get_status_bar().display_text("Pasted text")
         
@@ -94,12 +329,14 @@ class EditorViewportComponent(BufferViewportComponent):
         if key == pygame.K_o and self.get_mode() == BufferMode.COMMAND:
             # Add the same amount of whitespaces to the new line
             whitespaces = EditorViewportComponent.__get_whitespaces_count(self.base_lines[self.caret_position[1]])
+            latency_tracker.set_operation("newline")
             skip_letter_insert = True
             is_text_updated = True
-            self.caret_position[1] += 1
-            self.base_lines.insert(self.caret_position[1], "")
-            self.base_lines[self.caret_position[1]] += " " * whitespaces
-            self.caret_position[0] = len(self.base_lines[self.caret_position[1]])
+            self.caret_position[1], self.caret_position[0] = self.base_lines.insert(
+                self.caret_position[1],
+                self.base_lines.get_line_length(self.caret_position[1]),
+                "\n" + " " * whitespaces
+            )
             self.set_mode(BufferMode.INSERT)
         
         # If double 'd' letter is pressed and in command mode, cut current line and put it in clipboard.
@@ -109,9 +346,9 @@ class EditorViewportComponent(BufferViewportComponent):
             if key == pygame.K_x or self.shortcut_count.get('cut', 0) >= 1:
                 skip_letter_insert = True
                 is_text_updated = True
-                cut_text = self.base_lines.pop(self.caret_position[1]) + "\n"
+                cut_text = self.base_lines.pop_line(self.caret_position[1]) + "\n"
                 self.get_status_bar().display_text(f"Cut line at {self.caret_position[1]}")
-                pyperclip.copy(cut_text)
+                self.application.get_clipboard().copy(cut_text)
                 self.caret_position[1] = min(self.caret_position[1], len(self.base_lines) - 1)
                 self.caret_position[0] = 0
                 self.shortcut_count['cut'] = 0
@@ -121,6 +358,7 @@ class EditorViewportComponent(BufferViewportComponent):
         # When double G is pressed or HOME button, move the caret to the beginning of the file
         if (key == pygame.K_g and self.get_mode() == BufferMode.COMMAND) or key == pygame.K_HOME:
             if key == pygame.K_HOME or self.shortcut_count.get('jump_to_beginning', 0) >= 1:
+                latency_tracker.set_operation("scroll")
                 should_rerender = True
                 skip_letter_insert = True
                 self.caret_position[0] = 0
@@ -135,32 +373,36 @@ class EditorViewportComponent(BufferViewportComponent):
         
         # When shift + G is pressed or END button, move the caret to the end of the file
         if (key == pygame.K_g and modifier & pygame.KMOD_SHIFT and self.get_mode() == BufferMode.COMMAND) or key == pygame.K_END:
+            latency_tracker.set_operation("scroll")
             should_rerender = True
             skip_letter_insert = True
             self.caret_position[1] = len(self.base_lines) - 1
-            self.caret_position[0] = len(self.base_lines[self.caret_position[1]])
+            self.caret_position[0] = self.base_lines.get_line_length(self.caret_position[1])
         
         if key == pygame.K_RETURN and self.get_mode() == BufferMode.INSERT:
             # Insert a new line below the caret if in insert mode
+            latency_tracker.set_operation("newline")
             is_text_updated = True
 
             # Add the same amount of whitespaces as on the previous line
             whitespaces = EditorViewportComponent.__get_whitespaces_count(self.base_lines[self.caret_position[1]])
 
-            # Extract part of the line that we'd need to place on a new line.
-            # Also remove it from the line we were on
-            line_part = self.base_lines[self.caret_position[1]][self.caret_position[0]:]
-            self.base_lines[self.caret_position[1]] = self.base_lines[self.caret_position[1]][:self.caret_position[0]]
-
-            # Add a new line with the splitted part
-            self.base_lines.insert(self.caret_position[1] + 1, whitespaces * " " + line_part)
-
-            self.caret_position[0] = whitespaces
-            self.caret_position[1] += 1
+            # Split the line at the caret, the part after the caret goes to the new line
+            self.caret_position[1], self.caret_position[0] = self.base_lines.insert(
+                self.caret_position[1],
+                self.caret_position[0],
+                "\n" + whitespaces * " "
+            )
         
         if is_text_updated or should_rerender:
             if is_text_updated:
                 self.is_unsaved = True
-            self.token_lines = self.generate_tokens()
+            with latency_tracker.measure("generate_tokens"):
+                self.token_lines = self.generate_tokens()
 
         return super().update_buffer(key, unicode, modifier, skip_letter_insert, is_text_updated)
+
+    def cleanup(self):
+        self.stop_highlight_job()
+        self.base_lines.close()
+        return super().cleanup()
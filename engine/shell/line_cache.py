@@ -0,0 +1,45 @@
+import sys
+
+from collections import OrderedDict
+
+
+class LineSurfaceCache:
+    # LRU of the rendered line surfaces, bounded by the amount of memory taken by their pixels and their keys
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.surfaces = OrderedDict()
+
+    @staticmethod
+    def get_surface_size(surface):
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+    @staticmethod
+    def get_key_size(key):
+        # The keys hold the text of the lines along with their runs of tokens
+        return sys.getsizeof(key) + sum(
+            sys.getsizeof(part) + (sum(map(sys.getsizeof, part)) if isinstance(part, tuple) else 0) for part in key
+        )
+
+    def get_entry_size(self, key, surface):
+        return self.get_surface_size(surface) + self.get_key_size(key)
+
+    def get(self, key):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def put(self, key, surface):
+        if key in self.surfaces:
+            self.size -= self.get_entry_size(key, self.surfaces.pop(key))
+        self.surfaces[key] = surface
+        self.size += self.get_entry_size(key, surface)
+        while self.size > self.max_size and len(self.surfaces) > 1:
+            evicted_key, evicted = self.surfaces.popitem(last=False)
+            self.size -= self.get_entry_size(evicted_key, evicted)
+
+    def clear(self):
+        self.surfaces.clear()
+        self.size = 0
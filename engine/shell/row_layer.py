@@ -0,0 +1,56 @@
+import pygame
+
+
+class RowLayer:
+    # A surface made of the rows of the same height, e.g. the lines of a viewport or their numbers.
+    # What is drawn on a row is described by its key, so a row is drawn again only when its key
+    # changes, and the rows that are still visible after scrolling are moved instead of drawn again
+
+    def __init__(self, render_backend):
+        self.render_backend = render_backend
+        self.surface = None
+        # Everything that affects all the rows (e.g. the scale), the layer is drawn from scratch when it changes
+        self.state = None
+        self.keys = []
+        self.y_offset = 0
+
+    def update(self, size, state, y_offset, keys, row_height, draw_row):
+        """Draws the rows whose keys have changed since the previous update, the first key is of the row y_offset.
+        draw_row(surface, row, key) draws the content of a row onto the cleared row. Returns the areas that have changed"""
+        if self.surface is None or self.surface.get_size() != size:
+            self.surface = self.render_backend.create_canvas(size)
+            self.state = None
+
+        # Whether all the rows have been moved or cleared
+        is_layer_changed = False
+        previous_keys = self.keys
+        if state != self.state or len(keys) != len(previous_keys):
+            self.render_backend.fill(self.surface, (0, 0, 0, 255))
+            previous_keys = [None] * len(keys)
+            is_layer_changed = True
+        elif y_offset != self.y_offset:
+            shift = y_offset - self.y_offset
+            if abs(shift) < len(keys):
+                self.render_backend.scroll(self.surface, 0, -shift * row_height)
+                # The rows scrolled below the last one
+                self.render_backend.fill(self.surface, (0, 0, 0, 255), (0, len(keys) * row_height, size[0], size[1]))
+            is_layer_changed = True
+            # The last row can be cut off by the bottom of the surface, so only the rows that were drawn whole are reused
+            whole_rows = min(size[1] // row_height, len(keys))
+            previous_keys = [
+                previous_keys[row + shift] if 0 <= row + shift < whole_rows else False for row in range(len(keys))
+            ]
+
+        damage = []
+        for row, key in enumerate(keys):
+            if key != previous_keys[row]:
+                row_rect = pygame.Rect(0, row * row_height, size[0], row_height)
+                self.render_backend.fill(self.surface, (0, 0, 0, 255), row_rect)
+                if key is not None:
+                    draw_row(self.surface, row, key)
+                damage.append(row_rect)
+
+        self.state = state
+        self.y_offset = y_offset
+        self.keys = keys
+        return [self.surface.get_rect()] if is_layer_changed else damage
@@ -1,12 +1,14 @@
 import pygame
 
-from component import Component
+from component import Component, get_earliest_timeout
 
 from .editor_component import EditorViewportComponent
 from .buffer_mode import BufferMode
 
 
 class Statusbar(Component):
+    TRACKS_DAMAGE = True
+
     MODE_SIGNS = {
         BufferMode.COMMAND: 'C',
         BufferMode.INSERT: 'I',
@@ -20,12 +22,16 @@ class Statusbar(Component):
         self.status_bar_text_color = (255, 255, 255)
         self.status_bar_text_background = (0, 0, 0)
         self.status_bar_text_timeout = 0
+        self.previous_render_state = None
 
     def propagate_event(self, event):
         font_size = self.application.get_font_driver().get_font_size()
         if event.type == pygame.VIDEORESIZE:
-            self.surface = pygame.Surface((self.application.get_width(), font_size[1] * self.application.get_text_scale()), pygame.SRCALPHA)
+            self.surface = self.application.get_render_backend().create_canvas(
+                (self.application.get_width(), font_size[1] * self.application.get_text_scale())
+            )
             self.y = self.application.get_height() - font_size[1] * self.application.get_text_scale()
+            self.previous_render_state = None
     
     def display_text(self, text, color=(255, 255, 255), background=(0, 0, 0)):
         self.status_bar_text = text
@@ -38,19 +44,25 @@ class Statusbar(Component):
         if self.status_bar_text_timeout <= 0:
             self.status_bar_text_timeout = 0
             self.status_bar_text = ""
+        if self.application.get_command_executor().get_mode() == BufferMode.COMMAND_INSERT:
+            self.status_bar_text_timeout = 0
+
+        # The status bar shows the state of the other components, so it's drawn again when that changes
+        if self.get_render_state() != self.previous_render_state:
+            self.invalidate()
         
         return super().update(dt)
-    
-    def draw(self):
-        font_size = self.application.get_font_driver().get_font_size()
-        self.update_dimensions(
-            (self.application.get_width(), font_size[1] * self.application.get_text_scale()),
-            (0, self.application.get_height() - font_size[1] * self.application.get_text_scale())
-        )
 
+    def get_update_timeout(self):
+        # The text is hidden once its timeout runs out
+        if self.status_bar_text:
+            return get_earliest_timeout(super().get_update_timeout(), self.status_bar_text_timeout)
+        return super().get_update_timeout()
+
+    def get_render_state(self):
+        # Everything shown on the status bar
         command_executor = self.application.get_command_executor()
         current_buffer = self.application.get_focused_buffer_viewport()
-        text_scale = self.application.get_text_scale()
 
         status_bar_background_color = (0, 0, 0)
         status_bar_color = (255, 255, 255)
@@ -62,7 +74,6 @@ class Statusbar(Component):
         status_bar_text += f"{current_buffer.caret_position[1] + 1} line at {current_buffer.caret_position[0]}"
         if command_executor.get_mode() == BufferMode.COMMAND_INSERT:
             status_bar_text = f":{command_executor.command_insert_value}"
-            self.status_bar_text_timeout = 0
         elif self.status_bar_text_timeout > 0:
             status_bar_text = self.status_bar_text
             status_bar_color = self.status_bar_text_color
@@ -73,6 +84,33 @@ class Statusbar(Component):
         if command_executor.get_mode() == BufferMode.VISUAL:
             status_bar_background_color = (50, 130, 50)
 
+        return (
+            self.surface.get_size(), self.application.get_font_driver().font_type, self.application.get_text_scale(),
+            command_executor.get_mode(), current_buffer.lines_indicator_x_offset,
+            status_bar_text, status_bar_color, status_bar_background_color
+        )
+    
+    def draw(self):
+        font_size = self.application.get_font_driver().get_font_size()
+        self.update_dimensions(
+            (self.application.get_width(), font_size[1] * self.application.get_text_scale()),
+            (0, self.application.get_height() - font_size[1] * self.application.get_text_scale())
+        )
+
+        command_executor = self.application.get_command_executor()
+        current_buffer = self.application.get_focused_buffer_viewport()
+        text_scale = self.application.get_text_scale()
+
+        # Only redraw the status bar when something on it has changed
+        render_state = self.get_render_state()
+        if render_state == self.previous_render_state:
+            return super().draw()
+        self.previous_render_state = render_state
+        status_bar_text, status_bar_color, status_bar_background_color = render_state[-3:]
+        render_backend = self.application.get_render_backend()
+        render_backend.fill(self.surface, (0, 0, 0))
+        self.add_damage()
+
         # Draw current buffer mode with a separator
         self.application.font_driver.draw_text(
             self.surface,
@@ -82,7 +120,7 @@ class Statusbar(Component):
             (max(current_buffer.lines_indicator_x_offset, (font_size[0] * 2 + 2) * text_scale) - 4) * text_scale - (font_size[0] + 2) * text_scale, 0,
             pixel_size=(text_scale, text_scale)
         )
-        pygame.draw.rect(
+        render_backend.draw_rect(
             self.surface,
             (255, 255, 255),
             ((max(current_buffer.lines_indicator_x_offset, (font_size[0] * 2 + 2) * text_scale) - 4) * text_scale, 0,
@@ -98,7 +136,7 @@ class Statusbar(Component):
             (text_scale, text_scale)
         )
         
-        pygame.draw.rect(
+        render_backend.draw_rect(
             self.surface,
             (170, 170, 170),
             (0, 0, self.get_width(), 1)
@@ -5,12 +5,16 @@ from threading import Thread
 from subprocess import Popen, PIPE
 from queue import Queue, Empty
 
+from component import get_earliest_timeout
 from engine.lang import BaseSyntaxHighlighter
 from .buffer_component import BufferViewportComponent
 from .buffer_mode import BufferMode
 
 
 class TerminalViewportComponent(BufferViewportComponent):
+    # How often (in seconds) the process is checked for having finished
+    EXIT_POLL_TIME = 0.1
+
     def __init__(self, app, shell_arguments):
         super().__init__(app)
         print(shell_arguments)
@@ -38,23 +42,45 @@ class TerminalViewportComponent(BufferViewportComponent):
             thread.start()
 
         self.syntax_highlighter = BaseSyntaxHighlighter()
+        self.token_lines = self.parse_document()
+        # The document version right after the output was added to it
+        self.output_version = self.base_lines.version
+
+    def get_profile_name(self):
+        return f"Terminal({' '.join(self.shell_arguments)})"
+
+    def get_memory_parts(self):
+        return {**super().get_memory_parts(), "terminal output": [self.output, self.read_queue]}
 
     def __enqueue_output(self, out):
         for c in iter(lambda: out.read1(), b""):
             self.read_queue.put(c)
+            self.application.wake_up()
         out.close()
+        self.application.wake_up()
 
     def cleanup(self):
         print(f"Terminating process {self.pipe.pid}...")
         self.pipe.terminate()
         return super().cleanup()
 
+    def append_output(self, text):
+        self.output += text
+        if self.base_lines.version != self.output_version:
+            # The text was edited in the viewport, start over from the process output
+            self.base_lines = self.create_document(self.output)
+            self.token_lines = self.parse_document()
+        else:
+            last_line = len(self.base_lines) - 1
+            self.base_lines.insert(last_line, self.base_lines.get_line_length(last_line), text)
+            self.token_lines = self.generate_tokens()
+        self.output_version = self.base_lines.version
+
     def update(self, dt):
         try:
-            self.output += self.read_queue.get_nowait().decode("utf-8")
-
-            self.base_lines = self.output.split("\n")
-            self.token_lines = self.generate_tokens()
+            output = self.read_queue.get_nowait()
+            with self.application.get_profiler().measure("terminal drain"):
+                self.append_output(output.decode("utf-8"))
         except Empty:
             # Hasn't got any output yet
             ...
@@ -63,9 +89,7 @@ class TerminalViewportComponent(BufferViewportComponent):
             code = self.pipe.wait(0)
             if self.exit_code == -1 and self.read_queue.empty():
                 self.exit_code = code
-                self.output += f"\n\nProcess finished with exit code {self.exit_code}"
-                self.base_lines = self.output.split("\n")
-                self.token_lines = self.generate_tokens()
+                self.append_output(f"\n\nProcess finished with exit code {self.exit_code}")
         except:
             # The process hasn't finished yet
             ...
@@ -77,6 +101,15 @@ class TerminalViewportComponent(BufferViewportComponent):
 
         return super().update(dt)
 
+    def get_update_timeout(self):
+        if not self.read_queue.empty():
+            # The output is appended a chunk per update
+            return 0
+        timeout = super().get_update_timeout()
+        if self.exit_code == -1:
+            timeout = get_earliest_timeout(timeout, TerminalViewportComponent.EXIT_POLL_TIME)
+        return timeout
+
     def update_buffer(self, key, unicode, modifier, skip_letter_insert=False, is_text_updated=False):
         if self.base_lines and key == pygame.K_RETURN and self.get_mode() == BufferMode.INSERT:
             self.output += "\n"
@@ -90,5 +123,3 @@ class TerminalViewportComponent(BufferViewportComponent):
         if self.get_mode() != BufferMode.INSERT and key != pygame.K_BACKSPACE and allow_input:
             return super().update_buffer(key, unicode, modifier, skip_letter_insert, is_text_updated)
 
-    def generate_tokens(self):
-        return self.syntax_highlighter.parse_code(self.base_lines)
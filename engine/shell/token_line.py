@@ -0,0 +1,124 @@
+from array import array
+from bisect import bisect_right
+
+# The (color, background) pairs of the tokens, the tokens only keep the index of their style
+TOKEN_STYLES = [((255, 255, 255), (0, 0, 0))]
+TOKEN_STYLE_INDICES = {TOKEN_STYLES[0]: 0}
+
+# The columns hold the token boundaries as unsigned shorts, longer lines need wider columns
+MAX_SHORT_LINE_LENGTH = 0xFFFF
+# The token lines are never changed once built, so the ones of the plain lines are shared by their length and style
+PLAIN_TOKEN_LINES = {}
+# Set in the style of a run of characters that are tokens of their own, e.g. the ones no lexer rule has matched.
+# The run is stored as a single span, the tokens it's made of are only told apart when they're stepped through
+CHARACTER_RUN = 0x8000
+
+
+def get_token_style(color, background=(0, 0, 0)):
+    style = (color, background)
+    if style not in TOKEN_STYLE_INDICES:
+        TOKEN_STYLE_INDICES[style] = len(TOKEN_STYLES)
+        TOKEN_STYLES.append(style)
+    return TOKEN_STYLE_INDICES[style]
+
+
+def is_space_token(text, start, end):
+    return end - start == 1 and text[start] == " "
+
+
+class TokenView:
+    __slots__ = ("value", "color", "background")
+
+    def __init__(self, value, color, background):
+        self.value = value
+        self.color = color
+        self.background = background
+
+    def __repr__(self):
+        return f"Token[{self.value}, {self.color}, {self.background}]"
+
+
+class TokenLine:
+    # The tokens of a single line, stored as columns instead of an object per token: the column of
+    # the line every token ends at and the index of its style. The text itself stays in the document,
+    # so the token values are the slices of the line between the boundaries. The runs of the single
+    # character tokens take a single span.
+    __slots__ = ("ends", "styles")
+
+    def __init__(self, line_length=0):
+        self.ends = array('H' if line_length <= MAX_SHORT_LINE_LENGTH else 'I')
+        self.styles = array('H')
+
+    @staticmethod
+    def plain(line_length, style=0):
+        # Every character is a token of its own
+        token_line = PLAIN_TOKEN_LINES.get((line_length, style))
+        if token_line is None:
+            token_line = PLAIN_TOKEN_LINES[line_length, style] = TokenLine(line_length)
+            token_line.add_characters(0, line_length, style)
+        return token_line
+
+    @staticmethod
+    def from_columns(line_length, ends, styles):
+        # Builds the token line out of the iterables of the token ends and styles
+        token_line = TokenLine.__new__(TokenLine)
+        token_line.ends = array('H' if line_length <= MAX_SHORT_LINE_LENGTH else 'I', ends)
+        token_line.styles = array('H', styles)
+        return token_line
+
+    def __len__(self):
+        return len(self.ends)
+
+    def add(self, end, style):
+        self.ends.append(end)
+        self.styles.append(style)
+
+    def add_characters(self, start, end, style):
+        # Adds every character between the columns as a token of its own
+        if start < end:
+            self.ends.append(end)
+            self.styles.append(style | CHARACTER_RUN)
+
+    def iter_spans(self):
+        # Yields (start, end, style) of every span, a run of characters is a single span
+        start = 0
+        for end, style in zip(self.ends, self.styles):
+            yield start, end, style & ~CHARACTER_RUN
+            start = end
+
+    def iter_token_spans(self):
+        # Yields (start, end, style) of every token, the runs of characters one character at a time
+        start = 0
+        for end, style in zip(self.ends, self.styles):
+            if style & CHARACTER_RUN:
+                style &= ~CHARACTER_RUN
+                for column in range(start, end):
+                    yield column, column + 1, style
+            else:
+                yield start, end, style
+            start = end
+
+    def iter_runs(self, start=0, end=None):
+        # Yields (start, end, style) of the runs of the neighbouring tokens that have the same style,
+        # cut to the columns between start and end. The tokens before start aren't iterated over
+        if end is None:
+            end = self.ends[-1] if self.ends else 0
+        run_start = run_end = start
+        run_style = None
+        for index in range(bisect_right(self.ends, start), len(self.ends)):
+            style = self.styles[index] & ~CHARACTER_RUN
+            if style != run_style:
+                if run_end > run_start:
+                    yield run_start, run_end, run_style
+                run_start = run_end
+                run_style = style
+            run_end = min(self.ends[index], end)
+            if run_end >= end:
+                break
+        if run_end > run_start:
+            yield run_start, run_end, run_style
+
+    def iter_tokens(self, text):
+        for start, end, style in self.iter_token_spans():
+            color, background = TOKEN_STYLES[style]
+            yield TokenView(text[start:end], color, background)
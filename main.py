@@ -7,14 +7,33 @@ import builtins
 import logging
 import pyperclip
 
+from enum import Enum
 from importlib import reload
-from component import VStackComponent
+from component import VStackComponent, get_earliest_timeout
 from engine.command import CommandExecutor
 from engine.shell import EditorViewportComponent, Statusbar, BufferMode
-from utils import FontDriver, FontType
+from utils import FontDriver, FontType, RenderBackendType, HeadlessBackend, create_render_backend
+from utils import WindowEventSource, InjectedEventSource, SystemClipboard, MemoryClipboard, FrameProfiler, LatencyTracker, TraceRecorder
+from utils import InputRecorder
 
 pygame.init()
 
+# Posted by the background threads to wake the main loop up while it's waiting for the events
+WAKE_UP_EVENT = pygame.event.custom_type()
+
+# The events that make the application draw the frames at the input rate for a while
+INPUT_EVENTS = (
+    pygame.KEYDOWN, pygame.KEYUP, pygame.TEXTINPUT,
+    pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION, pygame.MOUSEWHEEL,
+)
+
+
+class SchedulerMode(Enum):
+    # Draws the frames at a fixed rate
+    FIXED_RATE: str = 'fixed_rate'
+    # Sleeps until an event comes or a component has to be updated
+    EVENT_DRIVEN: str = 'event_driven'
+
 
 class HotreloadWatchdog:
     def __init__(self, *hotreload_modules):
@@ -72,7 +91,30 @@ class LoggerHandler(logging.Handler):
 
 
 class EditorApplication:
-    def __init__(self, caption: str = "thee-editor", config_path: str = "config.json"):
+    # For how long (in seconds) after the last input the frames are drawn at the input rate
+    INPUT_ACTIVE_TIME = 0.5
+    # How often (in seconds) the profiler report in the debug overlay is refreshed, and how many sections it shows
+    PROFILER_OVERLAY_INTERVAL = 0.25
+    PROFILER_OVERLAY_SECTIONS = 16
+
+    def __init__(self, caption: str = "thee-editor", config_path: str = "config.json", headless=False, event_source=None):
+        """In the headless mode the frames are drawn off-screen with no window (e.g. for the automated runs), the events
+        come from the event_source, an InjectedEventSource by default, and the clipboard is kept in memory"""
+        self.is_headless = headless
+        self.event_source = event_source or (InjectedEventSource() if headless else WindowEventSource())
+        self.clipboard = MemoryClipboard() if headless else SystemClipboard()
+        # Times the frames and the components, enabled along with the debug overlay or by the "profile" command
+        self.profiler = FrameProfiler()
+        self.profiler_overlay_lines = []
+        self.profiler_overlay_time = 0
+        # Records the spans of the profiler for chrome://tracing, enabled by the "trace" command
+        self.trace_recorder = TraceRecorder()
+        # Follows the inputs until the frames showing them are presented, enabled by the "latency" command
+        self.latency_tracker = LatencyTracker()
+        # Set while a recording is replayed: the components wait for the work of their background jobs in every
+        # frame, so what the frames show doesn't depend on how fast the jobs have run
+        self.is_waiting_for_background_jobs = False
+
         self.logger_handler = LoggerHandler(self)
 
         self.logger = logging.getLogger()
@@ -83,14 +125,31 @@ class EditorApplication:
 
         self.config = {}
         self.config_last_save = time.time()
+        self.is_config_changed = False
         self.config_path = config_path
         self.load_config()
+
+        # Records the input of the whole session to replay it later, see replay_recording()
+        self.input_recorder = InputRecorder()
+        if self.get_config_value("main", "record_file"):
+            self.input_recorder.start(self.config)
         
         size = self.get_config_value("main", "window_dimensions", default=[900, 560])
-        self.window_flags = pygame.RESIZABLE | pygame.SRCALPHA  # | pygame.SCALED | pygame.FULLSCREEN
-        self.window = pygame.display.set_mode(size, self.window_flags)
+        # Everything is drawn through the backend, either onto the pygame surfaces or into the SDL2 textures
+        if headless:
+            self.render_backend = HeadlessBackend()
+        else:
+            self.render_backend = create_render_backend(
+                RenderBackendType(self.get_config_value("main", "render_backend", default=RenderBackendType.SURFACE.value)),
+                accelerated=self.get_config_value("main", "render_accelerated", default=False)
+            )
+        self.window = self.render_backend.open_window(size, caption)
+        self.store_config_value("main", "window_dimensions", [self.window.get_width(), self.window.get_height()])
         self.timer = pygame.time.Clock()
-        self.font_driver = FontDriver(FontType(self.get_config_value("main", "font_type", default=FontType.BITMAP.value)))
+        self.font_driver = FontDriver(
+            FontType(self.get_config_value("main", "font_type", default=FontType.BITMAP.value)),
+            self.render_backend, self.profiler
+        )
         self.running = True
         self.is_restarting = False
         self.is_focused = True
@@ -100,6 +159,15 @@ class EditorApplication:
         self.key_down_timeout = 0
         self.key_down = [None, None, None]
         self.fps = 30
+        self.scheduler_mode = SchedulerMode(self.get_config_value("main", "scheduler_mode", default=SchedulerMode.EVENT_DRIVEN.value))
+        # The rate of the frames while the user is typing, scrolling, etc. in the event driven mode
+        self.input_fps = self.get_config_value("main", "input_fps", default=60)
+        self.last_input_time = 0
+        # The event that woke the loop up, it's processed along with the rest of the events
+        self.pending_events = []
+        # The whole window has to be drawn and presented on the next frame
+        self.is_window_damaged = True
+        self.previous_layout = None
 
         self.status_bar = Statusbar(self)
         self.add_component(self.status_bar)
@@ -118,6 +186,27 @@ class EditorApplication:
     def get_font_driver(self):
         return self.font_driver
 
+    def get_render_backend(self):
+        return self.render_backend
+
+    def get_profiler(self):
+        return self.profiler
+
+    def get_trace_recorder(self):
+        return self.trace_recorder
+
+    def get_input_recorder(self):
+        return self.input_recorder
+
+    def get_latency_tracker(self):
+        return self.latency_tracker
+
+    def get_event_source(self):
+        return self.event_source
+
+    def get_clipboard(self):
+        return self.clipboard
+
     def get_focused_buffer_viewport(self):
         return self.buffers_stack.get_mouse_focused_component()
 
@@ -150,8 +239,11 @@ class EditorApplication:
         self.logger.info("Successfully reloaded!")
 
     def save_config(self):
-        with open(self.config_path, "w") as file:
-            json.dump(self.config, file)
+        # The headless runs don't change the config of the user
+        if not self.is_headless:
+            with open(self.config_path, "w") as file:
+                json.dump(self.config, file)
+        self.is_config_changed = False
 
     def load_config(self):
         if os.path.isfile(self.config_path):
@@ -162,7 +254,9 @@ class EditorApplication:
     def store_config_value(self, key, param, value):
         if key not in self.config:
             self.config[key] = {}
-        self.config[key][param] = value
+        if self.config[key].get(param) != value:
+            self.config[key][param] = value
+            self.is_config_changed = True
     
     def get_config_value(self, key, param, default=None):
         if value := self.config.get(key):
@@ -174,6 +268,7 @@ class EditorApplication:
         if key in self.config:
             if param in self.config[key]:
                 del self.config[key][param]
+                self.is_config_changed = True
 
     def get_width(self):
         return self.window.get_width()
@@ -195,20 +290,42 @@ class EditorApplication:
         self.key_down_timeout -= dt
         if self.key_down_timeout <= 0 and self.key_down[0]:
             self.key_down_timeout = 0.02
+            # The repeats of the held key are typed the same as the key itself
+            self.latency_tracker.begin_input()
             for i in self.components:
                 i.key_pressed_event(*self.key_down)
+                i.invalidate()
 
         for i in self.components:
-            i.update(dt)
+            with self.profiler.measure_component("update", i):
+                i.update(dt)
 
     def update_frame(self):
+        """Draws the components onto the window. Returns the areas of the window that have changed"""
         font_size = self.get_font_driver().get_font_size()
 
-        self.window.fill((0, 0, 0))
+        # The components might have been moved over each other, so they all have to be drawn again
+        layout = [(i.position, i.get_width(), i.get_height()) for i in self.components]
+        if layout != self.previous_layout:
+            self.previous_layout = layout
+            self.is_window_damaged = True
+
+        damage = []
+        if self.is_window_damaged:
+            # Everything has to be presented again, e.g. after the window was resized
+            self.is_window_damaged = False
+            self.render_backend.fill(self.window, (0, 0, 0))
+            damage.append(self.window.get_rect())
+            for i in self.components:
+                i.add_damage()
         for i in self.components:
-            i.draw_frame(self.window)
+            with self.profiler.measure_component("draw", i):
+                damage += i.draw_frame(self.window)
 
         if self.get_config_value("main", "debug", default=False):
+            # The debug text is drawn over the components, so the whole window is drawn again on the next frame
+            self.is_window_damaged = True
+            damage.append(self.window.get_rect())
             text_scale = self.get_config_value("main", "text_scale", default=1)
             # debug_text = f"FPS: {round(self.timer.get_fps(), 1)}\n" + \
             #              f"W: {self.get_width()}; H: {self.get_height()}\n" + \
@@ -217,6 +334,13 @@ class EditorApplication:
             #              f"Mode: {self.buffer_component.mode.value}"
             debug_text = f"FPS: {round(self.timer.get_fps(), 1)}\n" + \
                          f"W: {self.get_width()}; H: {self.get_height()}\n"
+            # The slowest sections of the frames, the percentiles are only computed a few times a second
+            if self.profiler_overlay_time < time.time():
+                self.profiler_overlay_time = time.time() + EditorApplication.PROFILER_OVERLAY_INTERVAL
+                self.profiler_overlay_lines = self.profiler.format_report(EditorApplication.PROFILER_OVERLAY_SECTIONS)
+                if self.latency_tracker.is_enabled:
+                    self.profiler_overlay_lines += [""] + self.latency_tracker.format_report(with_stages=False)
+            debug_text += "\n" + "\n".join(self.profiler_overlay_lines)
             # Draw debug text
             self.font_driver.draw_text(
                 self.window,
@@ -248,69 +372,144 @@ class EditorApplication:
                 pixel_size=(text_scale, text_scale)
             )
 
+        return damage
+
     def process_events(self):
         font_size = self.get_font_driver().get_font_size()
-        mouse_position = pygame.mouse.get_pos()
-        
-        for event in pygame.event.get():
+        events = self.pending_events + self.event_source.get()
+        # The events of pygame don't carry the time they were queued at, so the inputs are timed from here
+        events_time = time.perf_counter()
+        mouse_position = self.event_source.get_mouse_position()
+        self.pending_events = []
+        self.input_recorder.record_events(events, mouse_position)
+        for event in events:
+            if event.type in INPUT_EVENTS:
+                self.last_input_time = time.time()
+            if event.type in INPUT_EVENTS or event.type in (pygame.VIDEORESIZE, pygame.ACTIVEEVENT):
+                # Any of the components might have changed, e.g. the status bar shows the mode changed by a key
+                for component in self.components:
+                    component.invalidate()
+            if event.type in (pygame.KEYDOWN, pygame.MOUSEWHEEL):
+                self.latency_tracker.begin_input(events_time)
             if event.type == pygame.QUIT:
                 self.running = False
             if event.type == pygame.VIDEORESIZE:
                 text_scale = self.get_config_value("main", "text_scale", default=1)
                 char_w = font_size[0] * text_scale
                 char_h = font_size[1] * text_scale
-                self.window = pygame.display.set_mode((event.w // char_w * char_w, event.h // char_h * char_h), self.window_flags)
+                self.window = self.render_backend.resize_window((event.w // char_w * char_w, event.h // char_h * char_h))
+                self.is_window_damaged = True
+                self.store_config_value("main", "window_dimensions", [self.window.get_width(), self.window.get_height()])
+            if event.type == pygame.VIDEOEXPOSE:
+                # The content of the window might have been lost, e.g. the renderer doesn't keep it
+                self.is_window_damaged = True
 
             for component in self.components:
-                relative_mpos = [mouse_position[0] - component.position[0],
-                                 mouse_position[1] - component.position[1]]
-                if event.type == pygame.ACTIVEEVENT:
-                    if event.state & pygame.APPMOUSEFOCUS or event.state & pygame.APPINPUTFOCUS:
-                        self.is_focused = event.gain
-                elif event.type == pygame.KEYDOWN:
-                    component.key_down_event(*self.key_down)
-                    self.key_down_timeout = 0.2
-                    self.key_down = [event.key, "    " if event.key == pygame.K_TAB else event.unicode, pygame.key.get_mods()]
-                elif event.type == pygame.KEYUP:
-                    component.key_up_event(*self.key_down)
-                    self.key_down_timeout = 0
-                    self.key_down = [None, None, None]
-                elif event.type == pygame.MOUSEWHEEL:
-                    component.mouse_wheel_event(event.x, event.y)
-                if component.get_width() >= relative_mpos[0] >= 0 and component.get_height() >= relative_mpos[1] >= 0:
-                    if event.type == pygame.MOUSEBUTTONDOWN:
-                        component.mouse_down_event(event.button, *relative_mpos)
-                    if event.type == pygame.MOUSEBUTTONUP:
-                        component.mouse_up_event(event.button, *relative_mpos)
-                    if event.type == pygame.MOUSEMOTION:
-                        component.mouse_motion_event(*relative_mpos)
+                with self.profiler.measure_component("events", component):
+                    relative_mpos = [mouse_position[0] - component.position[0],
+                                     mouse_position[1] - component.position[1]]
+                    if event.type == pygame.ACTIVEEVENT:
+                        if event.state & pygame.APPMOUSEFOCUS or event.state & pygame.APPINPUTFOCUS:
+                            self.is_focused = event.gain
+                    elif event.type == pygame.KEYDOWN:
+                        component.key_down_event(*self.key_down)
+                        self.key_down_timeout = 0.2
+                        self.key_down = [event.key, "    " if event.key == pygame.K_TAB else event.unicode, event.mod]
+                    elif event.type == pygame.KEYUP:
+                        component.key_up_event(*self.key_down)
+                        self.key_down_timeout = 0
+                        self.key_down = [None, None, None]
+                    elif event.type == pygame.MOUSEWHEEL:
+                        component.mouse_wheel_event(event.x, event.y)
+                    if component.get_width() >= relative_mpos[0] >= 0 and component.get_height() >= relative_mpos[1] >= 0:
+                        if event.type == pygame.MOUSEBUTTONDOWN:
+                            component.mouse_down_event(event.button, *relative_mpos)
+                        if event.type == pygame.MOUSEBUTTONUP:
+                            component.mouse_up_event(event.button, *relative_mpos)
+                        if event.type == pygame.MOUSEMOTION:
+                            component.mouse_motion_event(*relative_mpos)
                     
-                    focused_component = component.get_mouse_focused_component()
-                    if focused_component:
-                        self.current_mouse_cursor = focused_component.get_cursor()
-                component.propagate_event(event)
+                        focused_component = component.get_mouse_focused_component()
+                        if focused_component:
+                            self.current_mouse_cursor = focused_component.get_cursor()
+                    component.propagate_event(event)
 
-        if self.is_focused:
+        if self.is_focused and not self.is_headless:
             pygame.mouse.set_cursor(self.current_mouse_cursor)
     
-    def run_loop(self):
-        while self.running:
-            self.process_events()
-            self.update(1 / self.fps)
-            self.update_frame()
-
-            self.store_config_value("main", "window_dimensions", [self.window.get_width(), self.window.get_height()])
-            
-            # Save config every second
-            if self.config_last_save < time.time():
+    def wake_up(self):
+        # Can be called from any thread
+        try:
+            pygame.event.post(pygame.event.Event(WAKE_UP_EVENT))
+        except pygame.error:
+            # The application has already quit
+            ...
+
+    def is_input_active(self):
+        return self.key_down[0] is not None or time.time() - self.last_input_time < EditorApplication.INPUT_ACTIVE_TIME
+
+    def wait_for_next_frame(self):
+        """Waits until the next frame has to be drawn. Returns the time (in seconds) passed since the previous frame"""
+        if self.scheduler_mode == SchedulerMode.FIXED_RATE:
+            return self.timer.tick(self.fps) / 1000
+        if self.is_input_active() or self.get_config_value("main", "debug", default=False):
+            return self.timer.tick(self.input_fps) / 1000
+
+        timeout = get_earliest_timeout(*(i.get_update_timeout() for i in self.components))
+        if self.is_config_changed:
+            timeout = get_earliest_timeout(timeout, self.config_last_save - time.time())
+        if timeout is not None and timeout <= 0:
+            # Something is still being streamed into the components
+            return self.timer.tick(self.input_fps) / 1000
+
+        # Sleep until an event comes (e.g. the input, the output of a terminal or the results of a job),
+        # or until a component has to be updated (e.g. to blink the caret)
+        event = self.event_source.wait(timeout)
+        if event.type != pygame.NOEVENT:
+            self.pending_events.append(event)
+        return self.timer.tick() / 1000
+
+    def run_frame(self, dt):
+        """Processes the events and draws the frame, dt is the time (in seconds) passed since the previous one.
+        Returns the areas of the window that have changed"""
+        self.profiler.is_enabled = self.get_config_value("main", "debug", default=False) \
+            or self.get_config_value("main", "profiler", default=False)
+        self.profiler.trace_recorder = self.trace_recorder if self.get_config_value("main", "tracing", default=False) else None
+        self.latency_tracker.is_enabled = self.get_config_value("main", "latency_tracing", default=False)
+        self.input_recorder.start_frame(dt)
+        with self.profiler.measure("frame"):
+            with self.profiler.measure("frame process_events"):
+                self.process_events()
+            with self.profiler.measure("frame update"), self.latency_tracker.measure("update"):
+                self.update(dt)
+            with self.profiler.measure("frame draw"), self.latency_tracker.measure("draw"):
+                damage = self.update_frame()
+
+            # Save config at most once a second, when it has changed
+            if self.is_config_changed and self.config_last_save < time.time():
                 self.config_last_save = time.time() + 1
-                self.save_config()
+                with self.profiler.measure("frame save_config"):
+                    self.save_config()
 
-            pygame.display.flip()
-            pygame.display.set_caption(self.caption)
-            self.timer.tick(self.fps)
-        pygame.quit()
+            # Only present the areas of the window that have changed
+            if damage:
+                with self.profiler.measure("frame present"), self.latency_tracker.measure("present"):
+                    self.render_backend.present(damage)
+        # Even the inputs that have changed nothing are shown by now
+        self.latency_tracker.end_frame()
+        return damage
 
+    def run_loop(self):
+        dt = 1 / self.fps
+        while self.running:
+            self.run_frame(dt)
+            dt = self.wait_for_next_frame()
+        # The trace of the whole session, e.g. of the hitch that's hard to catch with the "trace save" command
+        if trace_file := self.get_config_value("main", "trace_file"):
+            self.trace_recorder.save(trace_file)
+        if recording := self.input_recorder.stop():
+            recording.save(self.get_config_value("main", "record_file"))
+        pygame.quit()
 
 if __name__ == "__main__":
     # Call the method once, so the pyperclip module initializes
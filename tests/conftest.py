@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The tests import the editor from the root of the repository, the same as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Nothing is shown, the surfaces are only drawn in memory
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
@@ -0,0 +1,115 @@
+import io
+import random
+
+import pytest
+
+from engine.document import MappedFileDocument, PieceTableDocument, RopeDocument
+
+# The characters of the random texts, the line breaks are frequent so the edits join and split many lines
+ALPHABET = "ab \né\n"
+EDITS = 300
+
+
+def random_text(rng, max_length):
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_length)))
+
+
+def get_offset(text, line, column):
+    lines = text.split("\n")
+    return sum(len(i) + 1 for i in lines[:line]) + column
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Tiny chunks and blocks, so a few hundred characters already take many of them
+    monkeypatch.setattr(PieceTableDocument, "APPEND_BLOCK_SIZE", 8)
+    monkeypatch.setattr(RopeDocument, "CHUNK_SIZE", 8)
+    monkeypatch.setattr(RopeDocument, "MAX_CHILDREN", 4)
+    monkeypatch.setattr(MappedFileDocument, "BLOCK_SIZE", 3)
+    monkeypatch.setattr(MappedFileDocument, "CACHED_BLOCKS", 2)
+    monkeypatch.setattr(MappedFileDocument, "INDEX_STEP", 16)
+
+
+def open_mapped_file(tmp_path, text):
+    filename = tmp_path / "document.txt"
+    filename.write_text(text, encoding="utf-8")
+    return MappedFileDocument(str(filename))
+
+
+DOCUMENT_FACTORIES = {
+    "piece_table": lambda tmp_path, text: PieceTableDocument(text),
+    "rope": lambda tmp_path, text: RopeDocument(text),
+    "mapped_file": open_mapped_file,
+}
+
+
+def assert_same_text(document, text):
+    lines = text.split("\n")
+    assert len(document) == len(lines)
+    assert document.get_text() == text
+    assert list(document) == lines
+    for index in range(0, len(lines), 5):
+        assert document[index] == lines[index]
+        assert document.get_line_length(index) == len(lines[index])
+        assert list(document.iter_lines(index)) == lines[index:]
+    file = io.StringIO()
+    document.write_to(file)
+    assert file.getvalue() == text
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("document_type", DOCUMENT_FACTORIES)
+def test_random_edits_match_plain_string(small_blocks, tmp_path, document_type, seed):
+    rng = random.Random(seed)
+    text = random_text(rng, 500)
+    document = DOCUMENT_FACTORIES[document_type](tmp_path, text)
+    try:
+        for _ in range(EDITS):
+            # The mapped file might still be indexed, only the lines it has already found can be edited
+            lines = text.split("\n")
+            line = rng.randrange(len(document))
+            column = rng.randint(0, len(lines[line]))
+            offset = get_offset(text, line, column)
+            if rng.random() < 0.5:
+                inserted = random_text(rng, 8)
+                end_line, end_column = document.insert(line, column, inserted)
+                text = text[:offset] + inserted + text[offset:]
+                # The position right after the inserted text
+                assert get_offset(text, end_line, end_column) == offset + len(inserted)
+            else:
+                length = rng.randint(0, 12)
+                assert document.delete(line, column, length) == text[offset:offset + length]
+                text = text[:offset] + text[offset + length:]
+        if document_type == "mapped_file":
+            document.index_thread.join()
+        assert_same_text(document, text)
+    finally:
+        document.close()
+
+
+@pytest.mark.parametrize("document_type", DOCUMENT_FACTORIES)
+def test_edited_range_covers_the_changed_lines(small_blocks, tmp_path, document_type):
+    document = DOCUMENT_FACTORIES[document_type](tmp_path, "a\nb\nc\nd")
+    try:
+        document.insert(1, 1, "x\ny\nz")
+        # The line "b" became three lines
+        assert document.take_edited_range() == (1, 1, 3)
+        document.delete(0, 1, 1)
+        assert document.take_edited_range() == (0, 2, 1)
+        assert document.take_edited_range() is None
+        assert document.get_text() == "abx\ny\nz\nc\nd"
+    finally:
+        document.close()
+
+
+@pytest.mark.parametrize("document_type", DOCUMENT_FACTORIES)
+def test_pop_line(small_blocks, tmp_path, document_type):
+    document = DOCUMENT_FACTORIES[document_type](tmp_path, "first\nsecond\nlast")
+    try:
+        assert document.pop_line(2) == "last"
+        assert document.pop_line(0) == "first"
+        assert document.get_text() == "second"
+        assert document.pop_line(0) == "second"
+        assert document.get_text() == ""
+    finally:
+        document.close()
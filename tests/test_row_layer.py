@@ -0,0 +1,129 @@
+import pygame
+
+from engine.shell.row_layer import RowLayer
+from utils.render_backend import SurfaceBackend
+
+ROW_HEIGHT = 10
+WIDTH = 40
+# Five whole rows and the top half of the sixth one
+SIZE = (WIDTH, 55)
+
+
+def key_color(key):
+    return (key * 40 % 256, 100, 200, 255)
+
+
+class RowRecorder:
+    # Fills every drawn row with the color of its key and remembers which rows were drawn
+
+    def __init__(self):
+        self.rows = []
+
+    def __call__(self, surface, row, key):
+        self.rows.append(row)
+        surface.fill(key_color(key), (0, row * ROW_HEIGHT, WIDTH, ROW_HEIGHT))
+
+
+def update(layer, keys, y_offset=0, size=SIZE, state="state"):
+    recorder = RowRecorder()
+    damage = layer.update(size, state, y_offset, keys, ROW_HEIGHT, recorder)
+    return damage, recorder.rows
+
+
+def row_rect(row):
+    return pygame.Rect(0, row * ROW_HEIGHT, WIDTH, ROW_HEIGHT)
+
+
+def assert_rows_drawn(layer, keys):
+    # The layer looks the same as if all the rows were drawn from scratch
+    for row, key in enumerate(keys):
+        y = min(row * ROW_HEIGHT + ROW_HEIGHT // 2, layer.surface.get_height() - 1)
+        expected = key_color(key) if key is not None else (0, 0, 0, 255)
+        assert tuple(layer.surface.get_at((WIDTH // 2, y))) == expected
+
+
+def test_first_update_draws_every_row():
+    layer = RowLayer(SurfaceBackend())
+    keys = [1, 2, 3, 4, 5, 6]
+    damage, rows = update(layer, keys)
+    assert damage == [pygame.Rect(0, 0, *SIZE)]
+    assert rows == [0, 1, 2, 3, 4, 5]
+    assert_rows_drawn(layer, keys)
+
+
+def test_unchanged_keys_draw_nothing():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [1, 2, 3, 4, 5, 6])
+    assert update(layer, [1, 2, 3, 4, 5, 6]) == ([], [])
+
+
+def test_changed_keys_damage_only_their_rows():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [1, 2, 3, 4, 5, 6])
+    keys = [1, 7, 3, 4, None, 6]
+    damage, rows = update(layer, keys)
+    assert damage == [row_rect(1), row_rect(4)]
+    # The row without a key is only cleared
+    assert rows == [1]
+    assert_rows_drawn(layer, keys)
+
+
+def test_scroll_down_moves_the_visible_rows():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [1, 2, 3, 4, 5, 6])
+    keys = [3, 4, 5, 6, 7, 8]
+    damage, rows = update(layer, keys, y_offset=2)
+    assert damage == [pygame.Rect(0, 0, *SIZE)]
+    # The row 6 was cut off by the bottom of the surface, so it's drawn again along with the new rows
+    assert rows == [3, 4, 5]
+    assert_rows_drawn(layer, keys)
+
+
+def test_scroll_up_moves_the_visible_rows():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [3, 4, 5, 6, 7, 8], y_offset=2)
+    keys = [1, 2, 3, 4, 5, 6]
+    damage, rows = update(layer, keys, y_offset=0)
+    assert damage == [pygame.Rect(0, 0, *SIZE)]
+    assert rows == [0, 1]
+    assert_rows_drawn(layer, keys)
+
+
+def test_scroll_past_all_rows_draws_every_row():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [1, 2, 3, 4, 5, 6])
+    keys = [11, 12, 13, 14, 15, 16]
+    damage, rows = update(layer, keys, y_offset=10)
+    assert damage == [pygame.Rect(0, 0, *SIZE)]
+    assert rows == [0, 1, 2, 3, 4, 5]
+    assert_rows_drawn(layer, keys)
+
+
+def test_scroll_with_changed_key_draws_it_as_well():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [1, 2, 3, 4, 5, 6])
+    keys = [2, 9, 4, 5, 6, 7]
+    damage, rows = update(layer, keys, y_offset=1)
+    assert damage == [pygame.Rect(0, 0, *SIZE)]
+    assert rows == [1, 4, 5]
+    assert_rows_drawn(layer, keys)
+
+
+def test_resize_draws_every_row():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [1, 2, 3, 4, 5, 6])
+    keys = [1, 2, 3, 4, 5, 6, 7]
+    size = (WIDTH, 70)
+    damage, rows = update(layer, keys, size=size)
+    assert damage == [pygame.Rect(0, 0, *size)]
+    assert rows == [0, 1, 2, 3, 4, 5, 6]
+    assert layer.surface.get_size() == size
+    assert_rows_drawn(layer, keys)
+
+
+def test_state_change_draws_every_row():
+    layer = RowLayer(SurfaceBackend())
+    update(layer, [1, 2, 3, 4, 5, 6])
+    damage, rows = update(layer, [1, 2, 3, 4, 5, 6], state="scaled")
+    assert damage == [pygame.Rect(0, 0, *SIZE)]
+    assert rows == [0, 1, 2, 3, 4, 5]
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+# The shell is imported first, the highlighters import its token lines while it imports them
+from engine.shell.token_line import TokenLine
+from engine.lang import get_syntax_highlighter_for_filename
+from engine.lang.syntax_highlighter import BaseSyntaxHighlighter
+from engine.document import PieceTableDocument
+
+# The pieces of the random lines: the words, the numbers, the strings left open and closed on other lines,
+# the comments of every language, the characters no rule matches and the empty and the blank lines
+FRAGMENTS = [
+    "word", "if", "true", "null", "__init__", "x1", "42", "7.5", "²", "é", " ", "    ", "\t", '"', "'", '"str"',
+    "'c'", "# note", "// note", "@decorator", "#include", "[link]", "-", "!", "(", ")", "{", "}", ":", ",", "=",
+]
+EXTENSIONS = [".txt", ".py", ".c", ".json", ".md"]
+EDITS = 100
+
+
+def random_line(rng):
+    if rng.random() < 0.1:
+        return rng.choice(["", " ", "   "])
+    return "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 8)))
+
+
+def columns(token_lines):
+    return [(list(token_line.ends), list(token_line.styles)) for token_line in token_lines]
+
+
+def assert_tokens_make_up_lines(lines, token_lines):
+    for line, token_line in zip(lines, token_lines):
+        assert isinstance(token_line, TokenLine)
+        ends = list(token_line.ends)
+        assert ends == sorted(set(ends))
+        assert (ends[-1] if ends else 0) == len(line)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("extension", EXTENSIONS)
+def test_update_code_matches_parse_code(monkeypatch, extension, seed):
+    # Small batches, so the added lines take a few of them
+    monkeypatch.setattr(BaseSyntaxHighlighter, "BATCH_LINES", 4)
+    rng = random.Random(seed)
+    document = PieceTableDocument("\n".join(random_line(rng) for _ in range(60)))
+    highlighter, _ = get_syntax_highlighter_for_filename(f"test{extension}")
+    token_lines = highlighter.parse_code(document)
+
+    for _ in range(EDITS):
+        line = rng.randrange(len(document))
+        if rng.random() < 0.5:
+            added_lines = [random_line(rng) for _ in range(rng.randint(0, 12))]
+            document.insert(line, rng.randint(0, document.get_line_length(line)), "\n".join(added_lines))
+        else:
+            document.delete(line, rng.randint(0, document.get_line_length(line)), rng.randint(0, 30))
+        edited_range = document.take_edited_range()
+        if edited_range is None:
+            continue
+        token_lines = highlighter.update_code(document, token_lines, *edited_range)
+
+        expected_highlighter, _ = get_syntax_highlighter_for_filename(f"test{extension}")
+        expected_token_lines = expected_highlighter.parse_code(document)
+        assert columns(token_lines) == columns(expected_token_lines)
+        assert highlighter.line_states == expected_highlighter.line_states
+    assert_tokens_make_up_lines(list(document), token_lines)
+
+
+@pytest.mark.parametrize("extension", EXTENSIONS)
+def test_parse_lines_matches_parse_line(extension):
+    # Lexing the lines together gives the same tokens as lexing them one at a time
+    rng = random.Random(extension)
+    lines = [random_line(rng) for _ in range(200)]
+    highlighter, _ = get_syntax_highlighter_for_filename(f"test{extension}")
+    token_lines, states = highlighter.parse_lines(lines, None)
+
+    state = None
+    for line, token_line, line_state in zip(lines, token_lines, states):
+        expected_token_line, state = highlighter.parse_line(line, state)
+        assert columns([token_line]) == columns([expected_token_line])
+        assert line_state == state
+    assert_tokens_make_up_lines(lines, token_lines)
+
+
+def test_unterminated_string_continues_on_next_lines():
+    highlighter, _ = get_syntax_highlighter_for_filename("test.py")
+    lines = ['x = "open', "", "inside", 'closed" + y']
+    token_lines = highlighter.parse_code(lines)
+    assert highlighter.line_states == ['"', '"', '"', None]
+    string_style = token_lines[0].styles[-1]
+    # The whole line is inside of the string, then the string ends at the quote
+    assert list(token_lines[2].styles) == [string_style]
+    assert token_lines[3].ends[0] == len('closed"')
+    assert token_lines[3].styles[0] == string_style
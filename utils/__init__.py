@@ -3,3 +3,11 @@ from .font_driver import *
 from .keys import *
 from .draw import *
 from .strings import *
+from .render_backend import *
+from .event_source import *
+from .clipboard import *
+from .profiler import *
+from .latency import *
+from .tracing import *
+from .memory import *
+from .input_recording import *
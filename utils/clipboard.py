@@ -0,0 +1,22 @@
+import pyperclip
+
+
+class SystemClipboard:
+    # The clipboard of the desktop, shared with the other applications
+    def copy(self, text):
+        pyperclip.copy(text)
+
+    def paste(self):
+        return pyperclip.paste()
+
+
+class MemoryClipboard:
+    # Keeps the copied text inside of the application, e.g. where there's no desktop to share it with
+    def __init__(self, text=""):
+        self.text = text
+
+    def copy(self, text):
+        self.text = text
+
+    def paste(self):
+        return self.text
@@ -0,0 +1,82 @@
+import pygame
+
+from collections import deque
+
+
+class WindowEventSource:
+    # The events of the window, as they come from pygame
+
+    def get(self):
+        return pygame.event.get()
+
+    def wait(self, timeout=None):
+        """Waits for the next event, returns NOEVENT if none has come in the timeout (in seconds)"""
+        return pygame.event.wait() if timeout is None else pygame.event.wait(int(timeout * 1000) + 1)
+
+    def get_mouse_position(self):
+        return pygame.mouse.get_pos()
+
+
+class InjectedEventSource:
+    # The events posted by the caller (e.g. a benchmark) instead of the window. The events posted by the
+    # application itself (e.g. the wake up by a background thread) still come through the queue of pygame
+
+    def __init__(self):
+        self.events = deque()
+        self.mouse_position = (0, 0)
+        # Where the mouse is once the next events are taken, regardless of their positions
+        self.moved_mouse_position = None
+
+    def post(self, event):
+        self.events.append(event)
+
+    def post_key(self, key, unicode="", mod=pygame.KMOD_NONE):
+        # A key pressed and released at once
+        self.post(pygame.event.Event(pygame.KEYDOWN, key=key, unicode=unicode, mod=mod, scancode=0))
+        self.post(pygame.event.Event(pygame.KEYUP, key=key, unicode=unicode, mod=mod, scancode=0))
+
+    def post_text(self, text):
+        # Types the text key by key, as typed on a US keyboard
+        for letter in text:
+            if letter == "\n":
+                self.post_key(pygame.K_RETURN, "\r")
+            elif letter == "\t":
+                self.post_key(pygame.K_TAB, "\t")
+            else:
+                key = ord(letter.lower()) if letter.isascii() else pygame.K_UNKNOWN
+                self.post_key(key, letter, pygame.KMOD_SHIFT if letter.isupper() else pygame.KMOD_NONE)
+
+    def post_mouse_button(self, button, position):
+        self.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=button, pos=position))
+        self.post(pygame.event.Event(pygame.MOUSEBUTTONUP, button=button, pos=position))
+
+    def post_resize(self, size):
+        self.post(pygame.event.Event(pygame.VIDEORESIZE, w=size[0], h=size[1], size=size))
+
+    def move_mouse(self, position):
+        self.moved_mouse_position = position
+
+    def update_mouse_position(self, events):
+        for event in events:
+            if hasattr(event, "pos"):
+                self.mouse_position = event.pos
+        if self.moved_mouse_position is not None:
+            self.mouse_position = self.moved_mouse_position
+            self.moved_mouse_position = None
+
+    def get(self):
+        events = list(self.events) + pygame.event.get()
+        self.events.clear()
+        self.update_mouse_position(events)
+        return events
+
+    def wait(self, timeout=None):
+        if self.events:
+            event = self.events.popleft()
+            self.update_mouse_position([event])
+            return event
+        # Nothing more is going to be injected while waiting, so only the application can wake itself up
+        return pygame.event.wait() if timeout is None else pygame.event.wait(int(timeout * 1000) + 1)
+
+    def get_mouse_position(self):
+        return self.mouse_position
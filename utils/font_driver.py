@@ -1,11 +1,12 @@
+import numpy as np
 import pygame
 import string
 
+from collections import OrderedDict
+from contextlib import nullcontext
 from enum import Enum
-from functools import lru_cache
 
 from .font_bitmap import *
-from .strings import is_allowed_alpha_chars
 
 
 class FontType(Enum):
@@ -13,54 +14,126 @@ class FontType(Enum):
     TRUETYPE_MONOSPACE = 'tt_monospace'
 
 
+class GlyphAtlas:
+    # All the glyphs of a font rendered once for a single style and scale, next to each other
+    # in one image. A text is drawn by blitting the areas of its letters out of the atlas
+    def __init__(self, image, areas, default_area=None):
+        self.image = image
+        self.areas = areas
+        # The area drawn for the letters that the font doesn't have
+        self.default_area = default_area
+
+    def get_area(self, letter):
+        return self.areas.get(letter, self.default_area)
+
+
 class FontDriver:
-    def __init__(self, font_type):
+    # The amount of (style, scale) atlases kept around
+    CACHED_ATLASES = 64
+
+    def __init__(self, font_type, render_backend, profiler=None):
         self.font_type = font_type
+        # Times the rasterization of the atlases, if given
+        self.profiler = profiler
+        # The atlases are uploaded as the images of the backend, e.g. into the textures
+        self.render_backend = render_backend
         self.current_font_name = "CozetteVector"
         self.font_cache = {}
+        self.atlases = OrderedDict()
+        # Set pixels of all the glyphs of the bitmap font, next to each other in the order of the atlas
+        self.bitmap_letters_mask = None
 
     def change_font_type(self, type):
+        if type != self.font_type:
+            self.atlases.clear()
         self.font_type = type
 
+    def get_memory_parts(self):
+        return {
+            "glyph atlases": self.atlases,
+            "fonts": self.font_cache,
+            "bitmap glyphs": self.bitmap_letters_mask,
+        }
+
     def get_font_size(self):
         if self.font_type == FontType.TRUETYPE_MONOSPACE:
             return 9, 20
         return 8, 16
 
-    @lru_cache(maxsize=128)
-    def draw_bitmap(
-        self,
-        color,
-        background,
-        bitmap,
-        pixel_size: int = (1, 1),
-    ):
+    def get_atlas(self, color, background, pixel_size):
+        key = (color, background, pixel_size)
+        if key in self.atlases:
+            self.atlases.move_to_end(key)
+            return self.atlases[key]
+
+        with self.profiler.measure("rasterize glyph atlas") if self.profiler else nullcontext():
+            if self.font_type == FontType.TRUETYPE_MONOSPACE:
+                atlas = self.build_truetype_monospace_atlas(color, background, pixel_size)
+            else:
+                atlas = self.build_bitmap_atlas(color, background, pixel_size)
+        self.atlases[key] = atlas
+        if len(self.atlases) > FontDriver.CACHED_ATLASES:
+            self.atlases.popitem(last=False)
+        return atlas
+
+    def get_bitmap_letters_mask(self):
+        if self.bitmap_letters_mask is None:
+            width, height = self.get_font_size()
+            glyphs = np.array(list(BITMAP_LETTERS_FONT.values()), dtype=bool).reshape(-1, height, width)
+            # (letters, y, x) -> (x, y), the axis order of surfarray
+            self.bitmap_letters_mask = glyphs.transpose(0, 2, 1).reshape(-1, height)
+        return self.bitmap_letters_mask
+
+    def build_bitmap_atlas(self, color, background, pixel_size=(1, 1)):
         width, height = self.get_font_size()
-        surface = pygame.Surface((width * pixel_size[0], height * pixel_size[1]), pygame.SRCALPHA)
-        for index_x in range(width):
-            for index_y in range(height):
-                index = (index_y) * width + index_x
-                if bitmap[index]:
-                    pygame.draw.rect(surface, color, (index_x * pixel_size[1], index_y * pixel_size[1], *pixel_size))
-                else:
-                    pygame.draw.rect(surface, background, (index_x * pixel_size[1], index_y * pixel_size[1], *pixel_size))
-        return surface
-
-    @lru_cache(maxsize=128)
-    def draw_truetype_monospace(
-        self,
-        color,
-        background,
-        letter,
-        pixel_size: int = (1, 1),
-    ):
+        letters = list(BITMAP_LETTERS_FONT)
+
+        # Color the glyphs in their original size, then scale them up by repeating every pixel
+        mask = self.get_bitmap_letters_mask()
+        surface = pygame.Surface((mask.shape[0] * pixel_size[0], mask.shape[1] * pixel_size[1]), pygame.SRCALPHA)
+        pixels = np.where(mask, surface.map_rgb(color), surface.map_rgb(background)).astype(np.uint32)
+        pygame.surfarray.blit_array(surface, pixels.repeat(pixel_size[0], axis=0).repeat(pixel_size[1], axis=1))
+
+        glyph_width, glyph_height = width * pixel_size[0], height * pixel_size[1]
+        areas = {
+            letter: pygame.Rect(index * glyph_width, 0, glyph_width, glyph_height)
+            for index, letter in enumerate(letters)
+        }
+        return GlyphAtlas(self.render_backend.create_image(surface), areas, areas[None])
+
+    def build_truetype_monospace_atlas(self, color, background, pixel_size=(1, 1)):
         font_name = self.current_font_name
         if font_name not in self.font_cache:
             self.font_cache[font_name] = pygame.font.Font(f"assets/font/{font_name}.ttf", self.get_font_size()[1])
-        surf = self.font_cache[font_name].render(letter, False, color, background)
-        # if pixel_size != (1, 1):
-        #     surf = pygame.transform.scale(surf, pixel_size)
-        return surf
+        font = self.font_cache[font_name]
+
+        glyphs = [
+            (letter, font.render(letter, False, color, background))
+            for letter in string.ascii_letters + string.digits + "_" + string.punctuation + " "
+        ]
+        surface = pygame.Surface(
+            (sum(glyph.get_width() for _, glyph in glyphs), max(glyph.get_height() for _, glyph in glyphs)),
+            pygame.SRCALPHA
+        )
+        areas = {}
+        x = 0
+        for letter, glyph in glyphs:
+            areas[letter] = surface.blit(glyph, (x, 0))
+            x += glyph.get_width()
+
+        # The glyphs aren't antialiased, so they're scaled up by repeating every pixel like the bitmap ones
+        if pixel_size != (1, 1):
+            surface = pygame.transform.scale(
+                surface, (surface.get_width() * pixel_size[0], surface.get_height() * pixel_size[1])
+            )
+            areas = {
+                letter: pygame.Rect(
+                    area.x * pixel_size[0], area.y * pixel_size[1],
+                    area.width * pixel_size[0], area.height * pixel_size[1]
+                )
+                for letter, area in areas.items()
+            }
+        return GlyphAtlas(self.render_backend.create_image(surface), areas)
 
     def draw_text(
         self,
@@ -72,6 +145,8 @@ class FontDriver:
         pixel_size=(5, 5),
     ):
         font_size = self.get_font_size()
+        atlas = self.get_atlas(color, background, pixel_size)
+        blits = []
         largest_x = 0
         x_offset = 0
         y_offset = 0
@@ -82,27 +157,13 @@ class FontDriver:
                 x_offset = 0
                 y_offset += font_size[1] * pixel_size[1]
                 continue
-            
-            result_surface = None
-            if self.font_type == FontType.BITMAP:
-                if bitmap := BITMAP_LETTERS_FONT.get(letter, BITMAP_LETTERS_FONT[None]):
-                    result_surface = self.draw_bitmap(
-                        color, background,
-                        bitmap,
-                        pixel_size=pixel_size
-                    )
-            elif self.font_type == FontType.TRUETYPE_MONOSPACE:
-                if is_allowed_alpha_chars(letter, additional=string.punctuation + " "):
-                    result_surface = self.draw_truetype_monospace(
-                        color, background,
-                        letter,
-                        pixel_size=pixel_size
-                    )
-            
-            if result_surface:
-                surface.blit(result_surface, (x + x_offset, y + y_offset))
+
+            area = atlas.get_area(letter)
+            if area:
+                blits.append((atlas.image, (x + x_offset, y + y_offset), area))
             x_offset += font_size[0] * pixel_size[0]
-        
+
+        self.render_backend.blits(surface, blits)
         if largest_x < x_offset:
             largest_x = x_offset
         return int(largest_x / pixel_size[0]), int(y_offset / pixel_size[1])
@@ -0,0 +1,137 @@
+import copy
+import json
+import time
+
+import pygame
+
+# The events that are recorded, by their short names in the file and the attributes kept of them
+RECORDED_EVENTS = {
+    pygame.KEYDOWN: ("kd", ("key", "unicode", "mod", "scancode")),
+    pygame.KEYUP: ("ku", ("key", "unicode", "mod", "scancode")),
+    pygame.TEXTINPUT: ("ti", ("text",)),
+    pygame.MOUSEBUTTONDOWN: ("md", ("button", "pos")),
+    pygame.MOUSEBUTTONUP: ("mu", ("button", "pos")),
+    pygame.MOUSEMOTION: ("mm", ("pos", "rel", "buttons")),
+    pygame.MOUSEWHEEL: ("mw", ("x", "y")),
+    pygame.VIDEORESIZE: ("rs", ("w", "h", "size")),
+    pygame.ACTIVEEVENT: ("ae", ("gain", "state")),
+}
+EVENT_TYPES = {name: (event_type, fields) for event_type, (name, fields) in RECORDED_EVENTS.items()}
+
+# The config values that aren't replayed, the replay is neither recorded nor traced itself
+NOT_REPLAYED_CONFIG = (("main", "record_file"), ("main", "trace_file"))
+
+
+def encode_event(event):
+    name, fields = RECORDED_EVENTS[event.type]
+    return [name] + [getattr(event, i, None) for i in fields]
+
+
+def decode_event(values):
+    event_type, fields = EVENT_TYPES[values[0]]
+    # JSON has no tuples, the positions and sizes come back as lists
+    return pygame.event.Event(event_type, {
+        field: tuple(value) if isinstance(value, list) else value for field, value in zip(fields, values[1:])
+    })
+
+
+class InputRecording:
+    """The input of a session, frame by frame. Every frame is the time (in milliseconds) passed since the previous
+    one, the position of the mouse (if it has moved) and the events processed in it. Along with the config the
+    session started with, that's all it takes to replay it deterministically, as long as the files it opens are
+    the same. It's saved as JSON lines, the config first and then a line per frame"""
+    VERSION = 1
+
+    def __init__(self, config=None, frames=None):
+        self.config = config or {}
+        self.frames = frames or []
+
+    def save(self, path):
+        with open(path, "w") as file:
+            file.write(json.dumps({"version": InputRecording.VERSION, "config": self.config}) + "\n")
+            for frame in self.frames:
+                file.write(json.dumps(frame, separators=(",", ":")) + "\n")
+
+    @staticmethod
+    def load(path):
+        with open(path, "r") as file:
+            header = json.loads(file.readline())
+            if header.get("version") != InputRecording.VERSION:
+                raise ValueError(f"Unsupported version of the input recording: {header.get('version')}")
+            return InputRecording(header["config"], [json.loads(line) for line in file if line.strip()])
+
+    def get_duration(self):
+        return sum(frame[0] for frame in self.frames) / 1000
+
+
+class InputRecorder:
+    # Records the input of the frames processed by the application, while it's started
+
+    def __init__(self):
+        self.recording = None
+        self.mouse_position = None
+
+    def start(self, config):
+        config = copy.deepcopy(config)
+        for key, param in NOT_REPLAYED_CONFIG:
+            config.get(key, {}).pop(param, None)
+        self.recording = InputRecording(config)
+        self.mouse_position = None
+
+    def stop(self):
+        recording = self.recording
+        self.recording = None
+        return recording
+
+    def start_frame(self, dt):
+        if self.recording is not None:
+            self.recording.frames.append([round(dt * 1000, 3)])
+
+    def record_events(self, events, mouse_position):
+        if self.recording is None:
+            return
+        frame = self.recording.frames[-1]
+        events = [i for i in events if i.type in RECORDED_EVENTS]
+        mouse_position = list(mouse_position)
+        # The position stays the same between most of the frames, it's only kept when it has changed
+        # or when the events might've been handled by it
+        if mouse_position != self.mouse_position or any(hasattr(i, "pos") for i in events):
+            self.mouse_position = mouse_position
+            frame.append(mouse_position)
+        frame += [encode_event(i) for i in events]
+
+
+def replay_recording(application, recording, realtime=False, on_frame=None):
+    """Replays the frames of the recording in the application, its event source has to be an InjectedEventSource.
+    The frames are run as fast as possible, or at the recorded speed if realtime is set. The recorded time passed
+    between the frames is given to the application either way, so the animations and the held keys come out the same.
+    The background jobs (e.g. the highlighting of a large file) are waited for in every frame, otherwise their results
+    would show up in whichever frame they happened to be done by. on_frame(index, damage) is called after every frame,
+    if given. Returns the seconds every frame took to run"""
+    event_source = application.get_event_source()
+    start = time.perf_counter()
+    frame_time = 0
+    frame_seconds = []
+    application.is_waiting_for_background_jobs = True
+    try:
+        for index, (dt, *items) in enumerate(recording.frames):
+            frame_time += dt / 1000
+            if realtime:
+                delay = start + frame_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            for item in items:
+                if isinstance(item[0], str):
+                    event_source.post(decode_event(item))
+                else:
+                    event_source.move_mouse(tuple(item))
+            frame_start = time.perf_counter()
+            damage = application.run_frame(dt / 1000)
+            frame_seconds.append(time.perf_counter() - frame_start)
+            if on_frame:
+                on_frame(index, damage)
+            if not application.running:
+                break
+    finally:
+        application.is_waiting_for_background_jobs = False
+    return frame_seconds
@@ -0,0 +1,129 @@
+import time
+
+from bisect import bisect_left
+from collections import deque
+
+from .profiler import FrameProfiler, percentile
+
+
+class InputLatency:
+    # An input waiting for the frame that shows its result, with the time spent in every stage meanwhile
+    __slots__ = ("operation", "start", "stages")
+
+    def __init__(self, start):
+        self.operation = None
+        self.start = start
+        self.stages = {}
+
+
+class LatencySpan:
+    # Adds the time spent inside of the with statement to the stage of every pending input
+    __slots__ = ("tracker", "stage", "start")
+
+    def __init__(self, tracker, stage):
+        self.tracker = tracker
+        self.stage = stage
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        seconds = time.perf_counter() - self.start
+        for i in self.tracker.pending:
+            # The inputs that came in the middle of the stage (e.g. the repeats of a held key) didn't wait for it
+            if i.start <= self.start:
+                i.stages[self.stage] = i.stages.get(self.stage, 0) + seconds
+
+
+class LatencyTracker:
+    # Keystroke to photon latency: every input is timestamped when it's taken from the queue and followed through
+    # the stages of the frames (e.g. update_buffer, generate_tokens, draw and present) until the frame that shows
+    # it is presented. The latencies are kept by the operation the input turned out to be, the one it's classified
+    # as by the component that handled it, "other" if none did
+    OPERATIONS = ("insert", "newline", "paste", "scroll", "search", "other")
+    STAGES = ("update_buffer", "generate_tokens", "update", "draw", "present")
+    # The upper bounds (in milliseconds) of the buckets of the histograms, the last bucket takes the rest
+    BUCKETS = (1, 2, 4, 8, 16, 33, 66, 100, 250, 500, 1000)
+    # Only the last SAMPLES of every operation are kept for the percentiles, the histograms count all of them
+    SAMPLES = 1000
+
+    def __init__(self):
+        self.is_enabled = False
+        self.pending = []
+        self.reset()
+
+    def begin_input(self, timestamp=None):
+        if self.is_enabled:
+            self.pending.append(InputLatency(timestamp or time.perf_counter()))
+
+    def set_operation(self, operation):
+        # Classifies the last input, the first component to classify it wins
+        if self.pending and self.pending[-1].operation is None:
+            self.pending[-1].operation = operation
+
+    def measure(self, stage):
+        if not self.pending:
+            return FrameProfiler.NULL_SPAN
+        return LatencySpan(self, stage)
+
+    def end_frame(self):
+        """Called once the frame is presented, the pending inputs are shown by it"""
+        if not self.pending:
+            return
+        end = time.perf_counter()
+        for i in self.pending:
+            operation = i.operation or "other"
+            seconds = end - i.start
+            self.histograms[operation][bisect_left(LatencyTracker.BUCKETS, seconds * 1000)] += 1
+            self.samples[operation].append(seconds)
+            stages = self.stages[operation]
+            for stage, stage_seconds in i.stages.items():
+                stages[stage] = stages.get(stage, 0) + stage_seconds
+        self.pending = []
+
+    def reset(self):
+        self.pending = []
+        self.histograms = {i: [0] * (len(LatencyTracker.BUCKETS) + 1) for i in LatencyTracker.OPERATIONS}
+        self.samples = {i: deque(maxlen=LatencyTracker.SAMPLES) for i in LatencyTracker.OPERATIONS}
+        # The total time spent in every stage by the inputs of the operation
+        self.stages = {i: {} for i in LatencyTracker.OPERATIONS}
+
+    def get_report(self):
+        """Returns the latencies (in seconds) by the operation, along with the histogram and the mean time spent in
+        every stage. Only the operations with any inputs are reported"""
+        report = {}
+        for operation in LatencyTracker.OPERATIONS:
+            histogram = self.histograms[operation]
+            count = sum(histogram)
+            if not count:
+                continue
+            samples = list(self.samples[operation])
+            report[operation] = {
+                "inputs": count,
+                "p50": percentile(samples, 0.5),
+                "p95": percentile(samples, 0.95),
+                "p99": percentile(samples, 0.99),
+                "max": max(samples),
+                "histogram": {
+                    f"<={bound}ms" if bound else f">{LatencyTracker.BUCKETS[-1]}ms": bucket_count
+                    for bound, bucket_count in zip(LatencyTracker.BUCKETS + (None,), histogram)
+                },
+                "stages": {stage: seconds / count for stage, seconds in self.stages[operation].items()},
+            }
+        return report
+
+    def format_report(self, with_stages=True):
+        lines = [f"{'input'.ljust(10)} count    p50    p95    p99    max ms"]
+        for operation, entry in self.get_report().items():
+            lines.append(
+                operation.ljust(10) + f"{entry['inputs']:6}" +
+                "".join(f"{entry[i] * 1000:7.2f}" for i in ("p50", "p95", "p99", "max"))
+            )
+            if with_stages:
+                lines.append("  " + "  ".join(
+                    f"{stage} {entry['stages'][stage] * 1000:.2f}"
+                    for stage in LatencyTracker.STAGES if stage in entry["stages"]
+                ))
+        return lines
@@ -0,0 +1,85 @@
+import sys
+import tracemalloc
+import types
+
+from array import array
+from collections import deque
+from mmap import mmap
+
+import pygame
+
+from .render_backend import TextureCanvas
+
+# The objects that aren't owned by whatever refers to them, e.g. the methods refer to the components
+NOT_OWNED_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType)
+# The objects that don't refer to any other objects, their size is all there's to them
+LEAF_TYPES = (str, bytes, bytearray, int, float, complex, bool, array, range)
+
+
+def get_pixels_size(canvas):
+    # The pixels are allocated by SDL (or by the GPU for the textures), so sys.getsizeof doesn't see them
+    return canvas.get_width() * canvas.get_height() * canvas.get_bytesize()
+
+
+def get_deep_size(root, seen):
+    """Returns the bytes taken by the object along with everything it refers to, except for the objects in seen.
+    The objects measured are added to seen (by their ids), so the ones shared by several roots are only counted once.
+    The objects are kept in seen, so their ids aren't reused by the new objects while it's in use"""
+    size = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if obj is None or id(obj) in seen or isinstance(obj, NOT_OWNED_TYPES):
+            continue
+        seen[id(obj)] = obj
+        size += sys.getsizeof(obj)
+
+        if isinstance(obj, LEAF_TYPES):
+            continue
+        if isinstance(obj, mmap):
+            # The mapped file is paged in and out by the system, it's not taken from the memory of the process
+            continue
+        if isinstance(obj, (pygame.Surface, TextureCanvas)):
+            size += get_pixels_size(obj)
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                slots = cls.__dict__.get("__slots__", ())
+                for slot in (slots,) if isinstance(slots, str) else slots:
+                    if slot != "__dict__":
+                        stack.append(getattr(obj, slot, None))
+    return size
+
+
+def get_parts_sizes(parts, seen):
+    # The sizes of the parts returned by get_memory_parts() of e.g. a component, in the order of the parts
+    return {name: get_deep_size(part, seen) for name, part in parts.items()}
+
+
+def get_top_allocations(limit=10):
+    """Returns the (file:line, size, count) of the lines that have allocated the most of the memory still in use.
+    Only the allocations made since the tracemalloc has started are known"""
+    if not tracemalloc.is_tracing():
+        return []
+    statistics = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ]).statistics("lineno")
+    return [
+        (f"{i.traceback[0].filename}:{i.traceback[0].lineno}", i.size, i.count)
+        for i in statistics[:limit]
+    ]
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
@@ -0,0 +1,91 @@
+import time
+
+from collections import deque
+from contextlib import nullcontext
+
+
+def percentile(values, fraction):
+    # Nearest rank percentile of the values
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class ProfilerSpan:
+    # Times the code inside of the with statement
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.profiler.add_span(self.name, self.start, time.perf_counter() - self.start)
+
+
+class FrameProfiler:
+    # Rolling timings of the sections of the frames, e.g. the updates and the drawing of every component,
+    # the lexing or the rasterization of the glyphs. Only the last SAMPLES of every section are kept, so the
+    # percentiles follow what the editor is doing now. The sections can be measured from any thread
+    SAMPLES = 300
+    PERCENTILES = (0.5, 0.95, 0.99)
+
+    # Measures nothing, while the profiler is disabled
+    NULL_SPAN = nullcontext()
+
+    def __init__(self):
+        self.is_enabled = False
+        self.sections = {}
+        # The TraceRecorder the spans are also recorded by, while the tracing is on
+        self.trace_recorder = None
+
+    def measure(self, name):
+        """Returns the context manager that adds the time spent inside of it to the section"""
+        if not self.is_enabled and self.trace_recorder is None:
+            return FrameProfiler.NULL_SPAN
+        return ProfilerSpan(self, name)
+
+    def measure_component(self, kind, component):
+        # The components are told apart by their profile names, e.g. by the files they show
+        if not self.is_enabled and self.trace_recorder is None:
+            return FrameProfiler.NULL_SPAN
+        return ProfilerSpan(self, f"{kind} {component.get_profile_name()}")
+
+    def add_span(self, name, start, seconds):
+        if self.is_enabled:
+            self.add_sample(name, seconds)
+        # Read once, the tracing might be stopped from the main thread meanwhile
+        trace_recorder = self.trace_recorder
+        if trace_recorder is not None:
+            trace_recorder.add_span(name, start, seconds)
+
+    def add_sample(self, name, seconds):
+        samples = self.sections.get(name)
+        if samples is None:
+            samples = self.sections.setdefault(name, deque(maxlen=FrameProfiler.SAMPLES))
+        samples.append(seconds)
+
+    def reset(self):
+        self.sections = {}
+
+    def get_report(self):
+        """Returns the (name, samples, p50, p95, p99) of every section in seconds, the slowest by p95 first"""
+        report = []
+        for name, samples in list(self.sections.items()):
+            samples = list(samples)
+            if samples:
+                report.append((name, len(samples), *(percentile(samples, i) for i in FrameProfiler.PERCENTILES)))
+        report.sort(key=lambda section: section[3], reverse=True)
+        return report
+
+    def format_report(self, limit=None, name_width=32):
+        lines = [f"{'section'.ljust(name_width)}    p50    p95    p99 ms"]
+        for name, _, *section_percentiles in self.get_report()[:limit]:
+            if len(name) > name_width:
+                name = name[:name_width - 3] + "..."
+            lines.append(name.ljust(name_width) + "".join(f"{i * 1000:7.2f}" for i in section_percentiles))
+        return lines
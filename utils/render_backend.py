@@ -0,0 +1,212 @@
+import os
+import pygame
+
+from enum import Enum
+from pygame._sdl2 import video
+
+
+class RenderBackendType(Enum):
+    # Blits of the pygame surfaces on the CPU
+    SURFACE: str = 'surface'
+    # Textures drawn by the SDL2 renderer, by the software one unless the acceleration is enabled
+    SDL2_RENDERER: str = 'sdl2_renderer'
+
+
+class SurfaceBackend:
+    # Draws everything onto the pygame surfaces, the canvases and the images are plain surfaces
+    WINDOW_FLAGS = pygame.RESIZABLE | pygame.SRCALPHA  # | pygame.SCALED | pygame.FULLSCREEN
+
+    def open_window(self, size, caption):
+        """Creates the window, returns the canvas the frames are drawn onto"""
+        pygame.display.set_caption(caption)
+        return self.resize_window(size)
+
+    def resize_window(self, size):
+        return pygame.display.set_mode(size, SurfaceBackend.WINDOW_FLAGS)
+
+    def create_canvas(self, size):
+        # A transparent surface to draw onto
+        return pygame.Surface(size, pygame.SRCALPHA)
+
+    def create_image(self, surface):
+        # The image that can be drawn onto the canvases, out of a surface drawn by pygame
+        return surface
+
+    def fill(self, canvas, color, rect=None):
+        canvas.fill(color, rect)
+
+    def draw_rect(self, canvas, color, rect, width=0):
+        pygame.draw.rect(canvas, color, rect, width)
+
+    def blit(self, canvas, image, position, area=None):
+        canvas.blit(image, position, area)
+
+    def blits(self, canvas, blits):
+        # blits is a list of (image, position, area)
+        canvas.blits(blits, doreturn=False)
+
+    def scroll(self, canvas, dx, dy):
+        # Moves the content of the canvas, the uncovered area keeps its previous content
+        canvas.scroll(dx, dy)
+
+    def present(self, damage):
+        pygame.display.update(damage)
+
+
+class HeadlessBackend(SurfaceBackend):
+    # Draws the frames onto an off-screen surface, there's no window to present them in
+
+    def open_window(self, size, caption):
+        # The events and the pixel formats still need the video of SDL, the dummy driver doesn't need a display
+        if not pygame.display.get_init() or pygame.display.get_driver() != "dummy":
+            pygame.display.quit()
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            pygame.display.init()
+        return self.resize_window(size)
+
+    def resize_window(self, size):
+        return pygame.Surface(size)
+
+    def present(self, damage):
+        ...
+
+
+class TextureCanvas:
+    # A texture with the size queries of a surface, so the components don't have to know which backend draws them
+    __slots__ = ("texture",)
+
+    def __init__(self, texture):
+        self.texture = texture
+
+    def get_size(self):
+        return self.texture.width, self.texture.height
+
+    def get_width(self):
+        return self.texture.width
+
+    def get_height(self):
+        return self.texture.height
+
+    def get_rect(self):
+        return pygame.Rect(0, 0, self.texture.width, self.texture.height)
+
+    def get_bytesize(self):
+        return 4
+
+
+class TextureBackend:
+    # Draws everything with the SDL2 renderer: the canvases are the render target textures and the images
+    # (e.g. the glyph atlases) are uploaded into the textures once. The software renderer doesn't need a GPU,
+    # the accelerated one moves the blending off the CPU
+
+    def __init__(self, accelerated=False):
+        self.accelerated = accelerated
+        self.window = None
+        self.renderer = None
+        # The canvas the frames are composed onto, it's copied into the window when presented
+        self.frame = None
+        # The copy of a canvas while it's scrolled, the texture can't be copied onto itself
+        self.scroll_buffer = None
+
+    def open_window(self, size, caption):
+        self.window = video.Window(caption, size=size, resizable=True)
+        self.renderer = video.Renderer(self.window, accelerated=1 if self.accelerated else 0, target_texture=True)
+        return self.resize_window(size)
+
+    def resize_window(self, size):
+        self.window.size = size
+        self.frame = self.create_canvas(size)
+        # The window is overwritten by the frame
+        self.frame.texture.blend_mode = pygame.BLENDMODE_NONE
+        self.fill(self.frame, (0, 0, 0))
+        return self.frame
+
+    def create_canvas(self, size):
+        texture = video.Texture(self.renderer, size, target=True)
+        texture.blend_mode = pygame.BLENDMODE_BLEND
+        canvas = TextureCanvas(texture)
+        # The content of a new target texture is undefined, while a new surface is transparent
+        self.fill(canvas, (0, 0, 0, 0))
+        return canvas
+
+    def create_image(self, surface):
+        texture = video.Texture.from_surface(self.renderer, surface)
+        texture.blend_mode = pygame.BLENDMODE_BLEND
+        return TextureCanvas(texture)
+
+    def set_target(self, canvas):
+        texture = canvas.texture if canvas is not None else None
+        if self.renderer.target is not texture:
+            self.renderer.target = texture
+
+    def fill(self, canvas, color, rect=None):
+        # Replaces the pixels along with their alpha, as the fill of a surface does
+        self.set_target(canvas)
+        self.renderer.draw_blend_mode = pygame.BLENDMODE_NONE
+        self.renderer.draw_color = color if len(color) == 4 else (*color, 255)
+        if rect is None:
+            self.renderer.clear()
+        else:
+            self.renderer.fill_rect(rect)
+
+    def draw_rect(self, canvas, color, rect, width=0):
+        if not width:
+            self.fill(canvas, color, rect)
+            return
+        self.set_target(canvas)
+        self.renderer.draw_blend_mode = pygame.BLENDMODE_NONE
+        self.renderer.draw_color = color if len(color) == 4 else (*color, 255)
+        rect = pygame.Rect(rect)
+        for i in range(width):
+            self.renderer.draw_rect(rect.inflate(-2 * i, -2 * i))
+
+    def blit(self, canvas, image, position, area=None):
+        self.set_target(canvas)
+        self.draw_image(image, position, area)
+
+    def blits(self, canvas, blits):
+        self.set_target(canvas)
+        for image, position, area in blits:
+            self.draw_image(image, position, area)
+
+    def draw_image(self, image, position, area):
+        image_rect = image.get_rect()
+        if area is None:
+            area = image_rect
+        else:
+            # The renderer stretches the clipped area over the whole destination, while a blit only draws
+            # the part of the area inside of the image, moved along with the clipped edges
+            area = pygame.Rect(area)
+            clipped_area = area.clip(image_rect)
+            position = (position[0] + clipped_area.x - area.x, position[1] + clipped_area.y - area.y)
+            area = clipped_area
+            if not area:
+                return
+        image.texture.draw(srcrect=area, dstrect=(position[0], position[1], area.width, area.height))
+
+    def scroll(self, canvas, dx, dy):
+        size = canvas.get_size()
+        if self.scroll_buffer is None or self.scroll_buffer.get_size() != size:
+            self.scroll_buffer = TextureCanvas(video.Texture(self.renderer, size, target=True))
+            self.scroll_buffer.texture.blend_mode = pygame.BLENDMODE_NONE
+        canvas.texture.blend_mode = pygame.BLENDMODE_NONE
+        self.set_target(self.scroll_buffer)
+        canvas.texture.draw()
+        canvas.texture.blend_mode = pygame.BLENDMODE_BLEND
+        self.set_target(canvas)
+        self.scroll_buffer.texture.draw(dstrect=(dx, dy, *size))
+
+    def present(self, damage):
+        # The back buffer of the renderer isn't kept between the frames, so the whole frame is copied into it
+        self.set_target(None)
+        self.frame.texture.draw()
+        self.renderer.present()
+
+
+def create_render_backend(backend_type: RenderBackendType = RenderBackendType.SURFACE, accelerated: bool = False):
+    if backend_type == RenderBackendType.SURFACE:
+        return SurfaceBackend()
+    elif backend_type == RenderBackendType.SDL2_RENDERER:
+        return TextureBackend(accelerated)
+
+    raise ValueError(f"Unknown render backend: {backend_type}")
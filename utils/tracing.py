@@ -0,0 +1,53 @@
+import json
+import os
+import threading
+import time
+
+from collections import deque
+
+
+class TraceRecorder:
+    # Records the spans measured by the profiler as the trace events of Chrome, the trace can be opened
+    # in chrome://tracing or in https://ui.perfetto.dev. Only the last MAX_EVENTS are kept, so the tracing
+    # can be left on for as long as it takes the hitch to happen
+    MAX_EVENTS = 500_000
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        # The (name, start, seconds, thread id) of the spans, turned into the events when the trace is saved
+        self.spans = deque(maxlen=TraceRecorder.MAX_EVENTS)
+        self.thread_names = {}
+
+    def add_span(self, name, start, seconds):
+        # Can be called from any thread
+        thread_id = threading.get_ident()
+        if thread_id not in self.thread_names:
+            self.thread_names[thread_id] = threading.current_thread().name
+        self.spans.append((name, start, seconds, thread_id))
+
+    def reset(self):
+        self.spans.clear()
+
+    def get_trace(self):
+        """Returns the trace in the JSON object format of the trace events"""
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": name}}
+            for thread_id, name in list(self.thread_names.items())
+        ]
+        for name, start, seconds, thread_id in list(self.spans):
+            events.append({
+                "name": name,
+                # The sections are named by what they are first, e.g. "lex PythonSyntaxHighlighter"
+                "cat": name.split(" ", 1)[0],
+                "ph": "X",
+                "ts": (start - self.origin) * 1_000_000,
+                "dur": seconds * 1_000_000,
+                "pid": pid,
+                "tid": thread_id,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        with open(path, "w") as file:
+            json.dump(self.get_trace(), file)